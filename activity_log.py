@@ -0,0 +1,168 @@
+import atexit
+import queue
+import threading
+
+from db import get_pool, is_connection_error
+
+LOG_CONFIG = {
+    "max_queue": 10000,     # сверх этого события отбрасываются, а не копятся в памяти
+    "batch_size": 100,      # строк в одном INSERT
+    "flush_interval": 2.0   # секунд между сбросами, даже если пачка не набралась
+}
+
+
+class ActivityLogWriter:
+    def __init__(self, pool, max_queue=None, batch_size=None, flush_interval=None):
+        self._pool = pool
+        self.batch_size = batch_size or LOG_CONFIG["batch_size"]
+        self.flush_interval = flush_interval or LOG_CONFIG["flush_interval"]
+        self._queue = queue.Queue(maxsize=max_queue or LOG_CONFIG["max_queue"])
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._retry = []      # пачка, не записанная из-за обрыва связи: уходит первой
+        self._offline = False
+        self._stats_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, user_id, action, details=""):
+        # время ставит сервер (DEFAULT столбца): часы касс расходятся, а порядок записей
+        # в журнале должен совпадать с порядком на сервере. Продажи, проведённые без связи,
+        # пишет в журнал перенос из офлайн-журнала, со временем продажи
+        if self._stopped:
+            with self._stats_lock:
+                self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait((user_id, action, details))
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _drain(self):
+        events = []
+        while len(events) < self.batch_size:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _insert(self, events):
+        placeholders = ", ".join(["(?, ?, ?)"] * len(events))
+        params = [value for event in events for value in event]
+        with self._pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"INSERT INTO activity_logs (user_id, action, details) VALUES {placeholders}",
+                params
+            )
+            conn.commit()
+
+    def _insert_each(self, events):
+        # ошибка в данных: по одной строке, чтобы из-за одного события не пропала вся пачка;
+        # возвращает события, которые не записаны из-за обрыва связи
+        for index, event in enumerate(events):
+            try:
+                self._insert([event])
+            except Exception as e:
+                if is_connection_error(e):
+                    return events[index:]
+                with self._stats_lock:
+                    self.failed += 1
+                print(f"⚠️ Ошибка логирования «{event[1]}»: {e}")
+            else:
+                with self._stats_lock:
+                    self.written += 1
+        return []
+
+    def flush(self):
+        with self._flush_lock:
+            while True:
+                events, self._retry = self._retry or self._drain(), []
+                if not events:
+                    return
+                try:
+                    self._insert(events)
+                    with self._stats_lock:
+                        self.written += len(events)
+                    events = []
+                except Exception as e:
+                    if not is_connection_error(e):
+                        events = self._insert_each(events)
+                    elif not self._offline:
+                        print(f"⚠️ Журнал действий: нет связи с сервером, события ждут в очереди: {e}")
+                self._offline = bool(events)
+                if events:
+                    # сервер недоступен: пачка ждёт следующего сброса, новые события копятся
+                    # в очереди до max_queue, лишние считаются в dropped
+                    self._retry = events
+                    return
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queued": self._queue.qsize() + len(self._retry),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed
+            }
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        # связи так и не появилось: оставшиеся события уже не записать
+        lost = len(self._retry)
+        self._retry = []
+        while True:
+            events = self._drain()
+            if not events:
+                break
+            lost += len(events)
+        with self._stats_lock:
+            self.failed += lost
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(host):
+    with _writers_lock:
+        writer = _writers.get(host)
+        if writer is None:
+            writer = ActivityLogWriter(get_pool(host))
+            _writers[host] = writer
+        return writer
+
+
+def close_log_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+        stats = writer.stats()
+        if stats["dropped"] or stats["failed"]:
+            print(f"⚠️ Журнал действий: потеряно {stats['dropped']}, не записано {stats['failed']}")
+
+
+# db регистрирует close_pools раньше, поэтому журнал сбрасывается до закрытия пулов
+atexit.register(close_log_writers)
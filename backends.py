@@ -0,0 +1,195 @@
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+# Драйверы БД за одним интерфейсом. Весь SQL в проекте пишется с плейсхолдерами «?»
+# и в диалекте PostgreSQL; бэкенд подключается и при необходимости переводит запросы.
+#   pyodbc   — исходный вариант, нужен ODBC-драйвер PostgreSQL
+#   psycopg  — нативный протокол PostgreSQL (psycopg 3): серверные prepared statements
+#              и бинарная передача, без ODBC-прослойки
+#   sqlite   — локальный файл для офлайн-работы и тестов
+# DB_CONFIG["backend"] = "auto" выбирает самый быстрый из установленных PostgreSQL-драйверов.
+
+BACKEND_CONFIG = {
+    "auto_order": ("psycopg", "pyodbc"),
+    "prepare_threshold": 2,     # после стольких выполнений psycopg готовит запрос на сервере
+    "binary": True,
+    "sqlite_timeout": 30
+}
+
+
+class Backend:
+    name = None
+    dialect = "postgresql"
+
+    def available(self):
+        raise NotImplementedError
+
+    def connect(self, config, host, user, password):
+        raise NotImplementedError
+
+    def run_ddl(self, cur, sql):
+        cur.execute(sql)
+
+
+class PyodbcBackend(Backend):
+    name = "pyodbc"
+
+    def available(self):
+        try:
+            import pyodbc  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def connect(self, config, host, user, password):
+        conn_str = (
+            f"DRIVER={{{config['driver']}}};"
+            f"SERVER={host};"
+            f"PORT={config['port']};"
+            f"DATABASE={config['database']};"
+            f"UID={user};"
+            f"PWD={password};"
+        )
+        import pyodbc
+        return pyodbc.connect(conn_str)
+
+
+_QMARK_TOKENS = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|\$\$.*?\$\$|\?|%", re.S)
+
+
+@lru_cache(maxsize=1024)
+def qmark_to_format(sql):
+    # «?» -> «%s» и «%» -> «%%» вне строковых литералов и $$-тел функций
+    def replace(match):
+        token = match.group(0)
+        if token == "?":
+            return "%s"
+        if token == "%":
+            return "%%"
+        return token
+    return _QMARK_TOKENS.sub(replace, sql)
+
+
+class _FormatCursor:
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
+
+    def execute(self, sql, params=None):
+        if params is None:
+            self._cursor.execute(sql)
+        else:
+            self._cursor.execute(qmark_to_format(sql), params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(qmark_to_format(sql), seq_of_params)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+class _FormatConnection:
+    def __init__(self, conn, binary):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_binary", binary)
+
+    def cursor(self):
+        return _FormatCursor(self._conn.cursor(binary=self._binary))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+
+class PsycopgBackend(Backend):
+    name = "psycopg"
+
+    def available(self):
+        try:
+            import psycopg  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def connect(self, config, host, user, password):
+        import psycopg
+        conn = psycopg.connect(
+            host=host,
+            port=config["port"],
+            dbname=config["database"],
+            user=user,
+            password=password,
+            prepare_threshold=BACKEND_CONFIG["prepare_threshold"]
+        )
+        return _FormatConnection(conn, BACKEND_CONFIG["binary"])
+
+
+class SqliteBackend(Backend):
+    name = "sqlite"
+    dialect = "sqlite"
+
+    _ADD_COLUMN = re.compile(r"ALTER TABLE (\w+) ADD COLUMN IF NOT EXISTS (\w+)(.*)", re.I | re.S)
+    _SKIP = re.compile(r"^\s*(GRANT|REVOKE|ALTER DEFAULT PRIVILEGES|CREATE EXTENSION)\b", re.I)
+
+    def available(self):
+        return True
+
+    def connect(self, config, host, user, password):
+        # host и учётные данные не нужны: база — локальный файл
+        import sqlite3
+        # цены приходят Decimal; в NUMERIC-столбце SQLite текст снова становится числом
+        sqlite3.register_adapter(Decimal, str)
+        conn = sqlite3.connect(config["sqlite_path"], timeout=BACKEND_CONFIG["sqlite_timeout"],
+                               check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def translate(self, sql):
+        if self._SKIP.match(sql):
+            return None
+        sql = re.sub(r"\bSERIAL PRIMARY KEY\b", "INTEGER PRIMARY KEY AUTOINCREMENT", sql)
+        return re.sub(r"\bBYTEA\b", "BLOB", sql)
+
+    def run_ddl(self, cur, sql):
+        sql = self.translate(sql)
+        if sql is None:
+            return
+        match = self._ADD_COLUMN.match(sql.strip())
+        if match:
+            # в SQLite нет ADD COLUMN IF NOT EXISTS
+            table, column, rest = match.groups()
+            cur.execute(f"PRAGMA table_info({table})")
+            if any(row[1] == column for row in cur.fetchall()):
+                return
+            sql = f"ALTER TABLE {table} ADD COLUMN {column}{rest}"
+        cur.execute(sql)
+
+
+BACKENDS = {backend.name: backend for backend in (PyodbcBackend(), PsycopgBackend(), SqliteBackend())}
+
+
+@lru_cache(maxsize=None)
+def _auto_backend():
+    for name in BACKEND_CONFIG["auto_order"]:
+        if BACKENDS[name].available():
+            return BACKENDS[name]
+    raise RuntimeError("Не установлен ни один драйвер PostgreSQL (psycopg или pyodbc)")
+
+
+def get_backend(name="auto"):
+    if name == "auto":
+        return _auto_backend()
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд БД '{name}', допустимы: auto, {', '.join(BACKENDS)}")
+    return BACKENDS[name]
@@ -0,0 +1,189 @@
+import argparse
+import os
+import shutil
+import subprocess
+import time
+from datetime import datetime
+
+from backends import get_backend
+from db import DB_CONFIG, split_host
+
+
+def _find_tool(name):
+    windows_path = rf"C:\Program Files\PostgreSQL\16\bin\{name}.exe"
+    return (os.environ.get(f"{name.upper()}_PATH")
+            or shutil.which(name)
+            or (windows_path if os.path.exists(windows_path) else name))
+
+
+BACKUP_CONFIG = {
+    "backup_dir": "backups",
+    "pg_dump_path": _find_tool("pg_dump"),
+    "pg_restore_path": _find_tool("pg_restore"),
+    "jobs": max(1, min(4, os.cpu_count() or 1)),  # параллельные потоки pg_dump -F d
+    "compress": 6,
+    "keep_last": 7,      # сколько последних копий хранить всегда
+    "keep_days": 30      # более старые удаляются, если сверх keep_last
+}
+
+
+def _env():
+    # весь окружающий env нужен, иначе на Windows pg_dump не найдёт системные библиотеки
+    return {**os.environ, "PGPASSWORD": DB_CONFIG["admin_password"]}
+
+
+def _connection_args(host):
+    host, port = split_host(host or DB_CONFIG["server"])
+    return [
+        "-h", host,
+        "-p", port,
+        "-U", DB_CONFIG["admin_user"],
+    ]
+
+
+def list_backups(backup_dir=None):
+    # только проверенные копии: не прошедшие проверку лежат с префиксом failed_ и в
+    # ротации не участвуют — иначе битая копия вытеснила бы хорошую из keep_last
+    backup_dir = backup_dir or BACKUP_CONFIG["backup_dir"]
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [name for name in os.listdir(backup_dir)
+             if name.startswith("backup_") and not name.endswith(".partial")]
+    return sorted(os.path.join(backup_dir, name) for name in names)
+
+
+def verify_backup(path):
+    # pg_restore --list читает только оглавление (toc.dat): битый файл данных таблицы
+    # его не испортит, поэтому дальше архив целиком проигрывается в пустоту —
+    # pg_restore распаковывает каждый файл данных и споткнётся о повреждённый
+    result = subprocess.run(
+        [BACKUP_CONFIG["pg_restore_path"], "--list", path],
+        capture_output=True, text=True, env=_env()
+    )
+    if result.returncode != 0:
+        return False, result.stderr.strip()
+    tables = sum(1 for line in result.stdout.splitlines() if " TABLE DATA " in line)
+    if not tables:
+        return False, "в архиве нет данных таблиц"
+
+    result = subprocess.run(
+        [BACKUP_CONFIG["pg_restore_path"], "-f", os.devnull, path],
+        capture_output=True, text=True, env=_env()
+    )
+    if result.returncode != 0:
+        return False, result.stderr.strip() or "архив не читается целиком"
+    return True, f"таблиц с данными: {tables}, все файлы прочитаны"
+
+
+def rotate_backups(backup_dir=None):
+    backups = list_backups(backup_dir)
+    keep_last = BACKUP_CONFIG["keep_last"]
+    cutoff = time.time() - BACKUP_CONFIG["keep_days"] * 86400
+    removed = []
+    for path in backups[:-keep_last] if keep_last else backups:
+        if os.path.getmtime(path) < cutoff:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+            removed.append(path)
+    return removed
+
+
+def _backup_sqlite(backup_path):
+    # встроенный online backup: копия согласована, даже если кассы пишут в этот момент
+    import sqlite3
+    source = sqlite3.connect(DB_CONFIG["sqlite_path"])
+    target = sqlite3.connect(backup_path + ".partial")
+    try:
+        source.backup(target)
+        ok = target.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    finally:
+        target.close()
+        source.close()
+    if not ok:
+        os.remove(backup_path + ".partial")
+        raise RuntimeError(f"Копия {backup_path} не прошла PRAGMA integrity_check")
+    os.replace(backup_path + ".partial", backup_path)
+
+
+def run_backup(host=None, progress=None):
+    def report(message):
+        if progress:
+            progress(message)
+
+    backup_dir = BACKUP_CONFIG["backup_dir"]
+    os.makedirs(backup_dir, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_path = os.path.join(backup_dir, f"backup_{timestamp}")
+    partial_path = backup_path + ".partial"
+
+    if get_backend(DB_CONFIG["backend"]).dialect == "sqlite":
+        _backup_sqlite(backup_path + ".sqlite3")
+        removed = rotate_backups(backup_dir)
+        report(f"Бэкап создан: {backup_path}.sqlite3")
+        return {"path": backup_path + ".sqlite3", "verified": "integrity_check ok", "removed": removed}
+
+    # сжатый каталог, выгружаемый в несколько потоков
+    process = subprocess.Popen(
+        [BACKUP_CONFIG["pg_dump_path"], *_connection_args(host),
+         "-d", DB_CONFIG["database"],
+         "-F", "d",
+         "-j", str(BACKUP_CONFIG["jobs"]),
+         "-Z", str(BACKUP_CONFIG["compress"]),
+         "--verbose",
+         "-f", partial_path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=_env()
+    )
+    errors = []
+    dumped = 0
+    for line in process.stderr:
+        line = line.strip()
+        if "dumping contents of table" in line or "finished item" in line:
+            dumped += 1
+            report(f"Бэкап: выгружено объектов {dumped}")
+        elif "error" in line.lower():
+            errors.append(line)
+    process.wait()
+
+    if process.returncode != 0:
+        shutil.rmtree(partial_path, ignore_errors=True)
+        raise RuntimeError("\n".join(errors) or f"pg_dump завершился с кодом {process.returncode}")
+
+    report("Бэкап: проверка архива")
+    ok, details = verify_backup(partial_path)
+    if not ok:
+        # остаётся для разбора, но под другим именем
+        failed_path = os.path.join(backup_dir, f"failed_{timestamp}")
+        os.rename(partial_path, failed_path)
+        raise RuntimeError(f"Бэкап {failed_path} не прошёл проверку: {details}")
+    os.rename(partial_path, backup_path)
+
+    removed = rotate_backups(backup_dir)
+    report(f"Бэкап создан: {backup_path}")
+    return {"path": backup_path, "verified": details, "removed": removed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Резервное копирование БД магазина")
+    parser.add_argument("--host", default=DB_CONFIG["server"])
+    parser.add_argument("--verify", metavar="ПУТЬ", help="только проверить существующую копию")
+    args = parser.parse_args()
+
+    if args.verify:
+        ok, details = verify_backup(args.verify)
+        print(f"{'✅' if ok else '❌'} {args.verify}: {details}")
+        return 0 if ok else 1
+
+    try:
+        result = run_backup(args.host, progress=print)
+    except Exception as e:
+        print(f"❌ Ошибка бэкапа: {e}")
+        return 1
+    print(f"✅ Проверено: {result['verified']}, удалено старых копий: {len(result['removed'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,282 @@
+import argparse
+import getpass
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import sales
+import store
+from activity_log import ActivityLogWriter
+from backends import get_backend
+from db import DB_CONFIG, ConnectionPool, connect_db
+from migrations import apply_migrations, migrate
+from passwords import PASSWORD_CONFIG, hash_password
+
+# Замеры основных операций без GUI: та же логика из store/sales/activity_log. По умолчанию —
+# временная SQLite-база со схемой из migrations.py: абсолютные числа с боевым сервером не
+# сравнить, но регрессии в самом коде (лишние запросы, лишняя работа на Python) видны.
+# С --host те же операции идут в PostgreSQL (тестовую базу: товары и продажи заводятся
+# настоящие и удаляются в конце) — там работает SQL-путь продажи, а не запасной SQLite-путь.
+#   python bench.py -o before.json
+#   python bench.py -o after.json --compare before.json
+#   python bench.py --host 192.168.1.10 --login worker1 -o pg.json
+
+BENCH_CONFIG = {
+    "products": 2000,
+    "iterations": 300,
+    "warmup": 20,
+    "bcrypt_rounds": 4,     # минимальная стоимость: мерим наш код, а не bcrypt
+    "log_batch": 100
+}
+
+BRANDS = ["Nike", "Adidas", "Puma", "Reebok", "Asics", "New Balance", "Vans", "Converse"]
+MODELS = ["Air", "Runner", "Classic", "Street", "Trail", "Court", "Racer", "Flex"]
+
+# без адаптера sqlite3 в Python 3.12+ предупреждает о datetime в параметрах
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+
+def sqlite_connect(path):
+    # тот же бэкенд, что у приложения: внешние ключи, WAL, перевод DDL
+    return get_backend("sqlite").connect({**DB_CONFIG, "sqlite_path": path}, None, None, None)
+
+
+def seed_products(conn, user_id, count, stock, prefix=""):
+    # id заведённых товаров; prefix отличает их от настоящих в PostgreSQL
+    rng = random.Random(42)
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO products (name, brand, size, price, stock, added_by) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"{prefix}{rng.choice(MODELS)} {i}", rng.choice(BRANDS), str(rng.randint(36, 46)),
+          round(rng.uniform(20, 200), 2), stock, user_id)
+         for i in range(count)]
+    )
+    cur.execute("SELECT id FROM products WHERE name LIKE ? ORDER BY id", (f"{prefix}%",))
+    product_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return product_ids
+
+
+def create_database(path, products, password, stock=1_000_000):
+    # схема — теми же миграциями, что и у приложения, а не своей копией
+    conn = sqlite_connect(path)
+    apply_migrations(conn, get_backend("sqlite"))
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+        ("bench", hash_password(password), "worker")
+    )
+    user_id = cur.lastrowid
+    conn.commit()
+    seed_products(conn, user_id, products, stock)
+    conn.close()
+    return user_id
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "ops_per_sec": iterations / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": percentile(samples, 0.50),
+        "p95_ms": percentile(samples, 0.95),
+        "p99_ms": percentile(samples, 0.99),
+        "max_ms": samples[-1]
+    }
+
+
+def build_cases(pool, user, password, product_ids, customer, prefix=""):
+    rng = random.Random(7)
+    user_id = user["id"]
+    since = datetime.now().replace(microsecond=0)
+    added = itertools.count()
+    queries = ["nike", "air 1", "ru", "classic 4", "new bal", "vans 42"]
+
+    def with_conn(fn):
+        def case():
+            with pool.connection() as conn:
+                fn(conn)
+        return case
+
+    log_writer = ActivityLogWriter(pool, flush_interval=3600)
+
+    def log_batch():
+        for _ in range(BENCH_CONFIG["log_batch"]):
+            log_writer.log(user_id, "BENCH", "benchmark event")
+        log_writer.flush()
+
+    cases = {
+        "authenticate": with_conn(lambda conn: store.authenticate(conn, user["username"], password)),
+        "sell_product": with_conn(lambda conn: sales.sell_product(
+            conn, user_id, rng.choice(product_ids), 1, customer)),
+        "sell_cart_3": with_conn(lambda conn: sales.sell_cart(
+            conn, user_id, [(rng.choice(product_ids), 1) for _ in range(3)], customer)),
+        # товар уникален по (название, бренд, размер), поэтому названия не повторяются
+        "add_product": with_conn(lambda conn: store.add_product(
+            conn, user_id, f"{prefix}Bench {next(added)}", rng.choice(BRANDS), "42", 99.9, 10)),
+        "refresh_products": with_conn(lambda conn: store.list_products(conn, 0, 200)),
+        "product_changes": with_conn(lambda conn: store.product_changes(conn, since)),
+        "search_products": with_conn(lambda conn: store.search_products(conn, rng.choice(queries))),
+        f"log_activity_x{BENCH_CONFIG['log_batch']}": log_batch,
+    }
+    return cases, log_writer
+
+
+def measure_cases(pool, user, password, product_ids, selected, iterations, customer, prefix=""):
+    cases, log_writer = build_cases(pool, user, password, product_ids, customer, prefix)
+    results = {}
+    try:
+        for name, fn in cases.items():
+            if selected and name not in selected:
+                continue
+            results[name] = measure(fn, iterations, BENCH_CONFIG["warmup"])
+            print(format_result(name, results[name]))
+    finally:
+        log_writer.close()
+    return results
+
+
+def run_sqlite(selected, iterations, products):
+    PASSWORD_CONFIG["rounds"] = BENCH_CONFIG["bcrypt_rounds"]
+    password = "bench-password"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        user_id = create_database(path, products, password)
+        pool = ConnectionPool(lambda: sqlite_connect(path), min_size=0)
+        try:
+            return measure_cases(pool, {"id": user_id, "username": "bench"}, password,
+                                 list(range(1, products + 1)), selected, iterations, "bench")
+        finally:
+            pool.close()
+
+
+def cleanup(pool, user_id, prefix, customer):
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM sales WHERE customer_name = ?", (customer,))
+        cur.execute("DELETE FROM products WHERE name LIKE ?", (f"{prefix}%",))
+        cur.execute("DELETE FROM activity_logs WHERE user_id = ? AND action = 'BENCH'", (user_id,))
+        conn.commit()
+
+
+def run_postgresql(host, login, password, selected, iterations, products):
+    # на PostgreSQL: схема — обычной миграцией, вход — настоящим пользователем (bcrypt
+    # с его стоимостью), товары и продажи помечены и удаляются в конце
+    migrate(host)
+    tag = datetime.now().strftime("%Y%m%d%H%M%S")
+    prefix, customer = f"BENCH {tag} ", f"bench-{tag}"
+    pool = ConnectionPool(lambda: connect_db(host), min_size=0)
+    try:
+        with pool.connection() as conn:
+            user = store.authenticate(conn, login, password)
+            if not user:
+                raise ValueError("Неверный логин или пароль")
+            product_ids = seed_products(conn, user["id"], products, 1_000_000, prefix)
+        try:
+            return measure_cases(pool, user, password, product_ids, selected, iterations, customer, prefix)
+        finally:
+            cleanup(pool, user["id"], prefix, customer)
+    finally:
+        pool.close()
+
+
+def run(selected=None, iterations=None, products=None, host=None, login=None, password=None):
+    iterations = iterations or BENCH_CONFIG["iterations"]
+    products = products or BENCH_CONFIG["products"]
+    if host:
+        results = run_postgresql(host, login, password, selected, iterations, products)
+    else:
+        results = run_sqlite(selected, iterations, products)
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "backend": DB_CONFIG["backend"] if host else "sqlite",
+            "host": host,
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "products": products,
+            "iterations": iterations,
+            "bcrypt_rounds": None if host else BENCH_CONFIG["bcrypt_rounds"]
+        },
+        "results": results
+    }
+
+
+def format_result(name, result):
+    return (f"{name:<22} {result['ops_per_sec']:>10.1f} оп/с   "
+            f"p50 {result['p50_ms']:>7.3f}  p95 {result['p95_ms']:>7.3f}  "
+            f"p99 {result['p99_ms']:>7.3f} мс")
+
+
+def compare(current, baseline):
+    print(f"\nСравнение с {baseline['meta'].get('created_at', '?')}:")
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            print(f"{name:<22} нет в базовом прогоне")
+            continue
+        ops = (result["ops_per_sec"] / old["ops_per_sec"] - 1) * 100 if old["ops_per_sec"] else 0.0
+        p95 = (result["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        print(f"{name:<22} оп/с {ops:+7.1f}%   p95 {p95:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки операций магазина")
+    parser.add_argument("-o", "--output", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", metavar="JSON", help="сравнить с прошлым прогоном")
+    parser.add_argument("-n", "--iterations", type=int)
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--only", nargs="+", metavar="ОПЕРАЦИЯ")
+    parser.add_argument("--host", help="PostgreSQL-сервер с тестовой базой; без него — временная SQLite-база")
+    parser.add_argument("--backend", choices=["auto", "psycopg", "pyodbc"], default=DB_CONFIG["backend"],
+                        help="драйвер PostgreSQL, см. backends.py")
+    parser.add_argument("--login", help="пользователь тестовой базы, от имени которого идут операции")
+    args = parser.parse_args()
+
+    password = None
+    if args.host:
+        if not args.login:
+            parser.error("для PostgreSQL нужен --login")
+        DB_CONFIG["backend"] = args.backend
+        password = getpass.getpass("Пароль: ")
+
+    report = run(args.only, args.iterations, args.products, args.host, args.login, password)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Результаты: {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+from ui_loader import UI_MODULES
+
+# Компилирует .ui в Python-модули, чтобы приложение не разбирало XML при запуске.
+# Запускать после каждого изменения форм в Qt Designer.
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for ui_name, (module_name, _) in UI_MODULES.items():
+        ui_path = os.path.join(base_dir, ui_name)
+        py_path = os.path.join(base_dir, f"{module_name}.py")
+        result = subprocess.run(["pyside6-uic", ui_path, "-o", py_path], capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"❌ {ui_name}: {result.stderr.strip()}")
+            return 1
+        print(f"✅ {ui_name} -> {module_name}.py")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+import argparse
+import csv
+import getpass
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from activity_log import get_log_writer
+from db import DB_CONFIG, dialect_of, get_pool
+from store import authenticate
+
+IMPORT_CONFIG = {
+    "chunk_size": 1000   # строк в одной транзакции
+}
+
+# поставки грузим во временную таблицу пачкой, а в products переносим двумя запросами:
+# сначала добавляем остаток к совпавшим по (name, brand, size), потом вставляем новые.
+# Пустой бренд или размер и NULL — один товар: сравнение идёт через coalesce, как в
+# уникальном индексе products_identity_key (миграция 12)
+STAGING_SQL = {
+    "postgresql": """
+    CREATE TEMP TABLE IF NOT EXISTS import_products (
+        name VARCHAR(100),
+        brand VARCHAR(50),
+        size VARCHAR(10),
+        price DECIMAL(10, 2),
+        stock INTEGER
+    ) ON COMMIT DELETE ROWS
+    """,
+    # в SQLite нет ON COMMIT: таблица живёт до закрытия соединения и чистится перед пачкой
+    "sqlite": """
+    CREATE TEMP TABLE IF NOT EXISTS import_products (
+        name VARCHAR(100),
+        brand VARCHAR(50),
+        size VARCHAR(10),
+        price DECIMAL(10, 2),
+        stock INTEGER
+    )
+    """,
+}
+
+UPDATE_EXISTING_SQL = """
+    UPDATE products AS p
+    SET stock = p.stock + s.stock, price = s.price
+    FROM (
+        SELECT name, coalesce(brand, '') AS brand, coalesce(size, '') AS size,
+               MAX(price) AS price, SUM(stock) AS stock
+        FROM import_products
+        GROUP BY name, coalesce(brand, ''), coalesce(size, '')
+    ) s
+    WHERE p.name = s.name AND coalesce(p.brand, '') = s.brand AND coalesce(p.size, '') = s.size
+"""
+
+# ON CONFLICT — на случай, если тот же товар вставила параллельная пачка или касса
+INSERT_NEW_SQL = """
+    INSERT INTO products (name, brand, size, price, stock, added_by)
+    SELECT s.name, coalesce(s.brand, ''), coalesce(s.size, ''), MAX(s.price), SUM(s.stock), ?
+    FROM import_products s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM products p
+        WHERE p.name = s.name AND coalesce(p.brand, '') = coalesce(s.brand, '')
+          AND coalesce(p.size, '') = coalesce(s.size, '')
+    )
+    GROUP BY s.name, coalesce(s.brand, ''), coalesce(s.size, '')
+    ON CONFLICT (name, coalesce(brand, ''), coalesce(size, '')) DO UPDATE
+    SET stock = products.stock + excluded.stock, price = excluded.price
+"""
+
+
+def read_rows(path):
+    # отдаёт (номер строки, словарь), не читая файл целиком, кроме обычного .json
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            for line_no, row in enumerate(csv.DictReader(f, dialect=dialect), start=2):
+                yield line_no, row
+    elif ext in (".jsonl", ".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+    elif ext == ".json":
+        with open(path, encoding="utf-8") as f:
+            for line_no, row in enumerate(json.load(f), start=1):
+                yield line_no, row
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {ext}")
+
+
+def _text(row, key, max_length):
+    value = str(row.get(key) or "").strip()
+    if len(value) > max_length:
+        raise ValueError(f"поле {key} длиннее {max_length} символов")
+    return value
+
+
+def validate_row(row):
+    name = _text(row, "name", 100)
+    if not name:
+        raise ValueError("не указано название")
+    brand = _text(row, "brand", 50)
+    size = _text(row, "size", 10)
+
+    try:
+        price = Decimal(str(row.get("price", "")).replace(" ", "").replace(",", "."))
+    except InvalidOperation:
+        raise ValueError("цена должна быть числом")
+    if not price.is_finite() or price <= 0:
+        raise ValueError("цена должна быть больше нуля")
+
+    try:
+        stock = int(str(row.get("stock") or 0).strip())
+    except ValueError:
+        raise ValueError("количество должно быть целым числом")
+    if stock < 0:
+        raise ValueError("количество не может быть отрицательным")
+
+    return (name, brand, size, price.quantize(Decimal("0.01")), stock)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_chunk(conn, user_id, rows):
+    cur = conn.cursor()
+    if hasattr(cur, "fast_executemany"):
+        cur.fast_executemany = True
+    dialect = dialect_of(conn)
+    cur.execute(STAGING_SQL[dialect])
+    if dialect == "sqlite":
+        cur.execute("DELETE FROM import_products")
+    cur.executemany(
+        "INSERT INTO import_products (name, brand, size, price, stock) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    cur.execute(UPDATE_EXISTING_SQL)
+    updated = cur.rowcount
+    cur.execute(INSERT_NEW_SQL, (user_id,))
+    inserted = cur.rowcount
+    conn.commit()
+    return inserted, updated
+
+
+def import_products(pool, path, user_id, on_progress=None, chunk_size=None):
+    summary = {"rows": 0, "inserted": 0, "updated": 0, "errors": []}
+
+    for chunk in _chunks(read_rows(path), chunk_size or IMPORT_CONFIG["chunk_size"]):
+        valid = []
+        for line_no, raw in chunk:
+            try:
+                valid.append(validate_row(raw))
+            except ValueError as e:
+                summary["errors"].append((line_no, str(e)))
+        summary["rows"] += len(chunk)
+
+        if valid:
+            with pool.connection() as conn:
+                inserted, updated = import_chunk(conn, user_id, valid)
+            summary["inserted"] += inserted
+            summary["updated"] += updated
+
+        if on_progress:
+            on_progress(summary)
+
+    return summary
+
+
+def describe(path, summary):
+    return (f"{os.path.basename(path)}: строк {summary['rows']}, добавлено {summary['inserted']}, "
+            f"обновлено {summary['updated']}, ошибок {len(summary['errors'])}")
+
+
+def run_import(host, path, user_id):
+    summary = import_products(get_pool(host), path, user_id)
+    get_log_writer(host).log(user_id, "Импорт товаров", describe(path, summary))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт товаров из CSV/JSON")
+    parser.add_argument("path", help="файл .csv, .json или .jsonl с полями name, brand, size, price, stock")
+    parser.add_argument("--host", default=DB_CONFIG["server"])
+    parser.add_argument("--login", required=True, help="пользователь, от имени которого идёт импорт")
+    args = parser.parse_args()
+
+    with get_pool(args.host).connection() as conn:
+        user = authenticate(conn, args.login, getpass.getpass("Пароль: "))
+    if not user:
+        print("❌ Неверный логин или пароль")
+        return 1
+
+    summary = run_import(args.host, args.path, user["id"])
+    for line_no, error in summary["errors"][:50]:
+        print(f"⚠️ Строка {line_no}: {error}")
+    print(f"✅ {describe(args.path, summary)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
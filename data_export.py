@@ -0,0 +1,269 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from activity_log import get_log_writer
+from db import DB_CONFIG, committed_high_id, dialect_of, get_pool
+from replicas import read_pool
+
+# Выгрузки продаж и журнала действий для бухгалтерии: за период или только новые строки.
+# Строки идут из серверного курсора (DECLARE ... CURSOR / FETCH) пачками по chunk_size
+# и сразу пишутся в сжатый CSV или Parquet — память не зависит от объёма выгрузки.
+#   python data_export.py sales --from 2026-01-01 --to 2026-01-31
+#   python data_export.py activity_logs --incremental --format parquet
+
+EXPORT_CONFIG = {
+    "export_dir": "exports",
+    "chunk_size": 5000,
+    "format": "csv",                 # csv (gzip) | parquet (нужен pyarrow)
+    "csv_compresslevel": 6,
+    "parquet_compression": "zstd",
+    "settle_timeout": 60             # при --incremental: сколько ждать транзакции, которые ещё
+                                     # могут записать строку ниже границы выгрузки
+}
+
+STATE_FILE = "export_state.json"     # в папке выгрузок: id, до которого уже выгружено
+
+# (имя, тип) — тип нужен Parquet: int, text, money, timestamp
+EXPORTS = {
+    "sales": {
+        "sql": """SELECT s.id, s.sale_date, s.product_id, s.product_name, s.brand, s.size,
+                         s.quantity, s.unit_price, s.total_price, s.sold_by, u.username, s.customer_name
+                  FROM sales_compat s
+                  LEFT JOIN users u ON u.id = s.sold_by""",
+        "table": "sales",
+        "id_column": "s.id",
+        "time_column": "s.sale_date",
+        "columns": [("id", "int"), ("sale_date", "timestamp"), ("product_id", "int"),
+                    ("product_name", "text"), ("brand", "text"), ("size", "text"),
+                    ("quantity", "int"), ("unit_price", "money"), ("total_price", "money"),
+                    ("sold_by", "int"), ("seller", "text"), ("customer_name", "text")]
+    },
+    "activity_logs": {
+        "sql": """SELECT a.id, a.timestamp, a.user_id, u.username, a.action, a.details
+                  FROM activity_logs a
+                  LEFT JOIN users u ON u.id = a.user_id""",
+        "table": "activity_logs",
+        "id_column": "a.id",
+        "time_column": "a.timestamp",
+        "columns": [("id", "int"), ("timestamp", "timestamp"), ("user_id", "int"),
+                    ("username", "text"), ("action", "text"), ("details", "text")]
+    },
+}
+
+
+def stream_rows(conn, sql, params, chunk_size=None):
+    # пачки строк; в PostgreSQL — через серверный курсор в текущей транзакции,
+    # в SQLite курсор и так читает базу по мере fetchmany
+    chunk_size = chunk_size or EXPORT_CONFIG["chunk_size"]
+    cur = conn.cursor()
+    if dialect_of(conn) != "postgresql":
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+    cur.execute(f"DECLARE export_rows NO SCROLL CURSOR FOR {sql}", params)
+    try:
+        while True:
+            cur.execute(f"FETCH FORWARD {int(chunk_size)} FROM export_rows")
+            rows = cur.fetchall()
+            if not rows:
+                return
+            yield rows
+    finally:
+        conn.rollback()
+
+
+def build_query(conn, name, date_from=None, date_to=None, after_id=None, high_id=None):
+    spec = EXPORTS[name]
+    conditions, params = [], []
+    if date_from:
+        conditions.append(f"{spec['time_column']} >= ?")
+        params.append(datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        # конец периода включительно
+        conditions.append(f"{spec['time_column']} < ?")
+        params.append(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if after_id is not None:
+        conditions.append(f"{spec['id_column']} > ? AND {spec['id_column']} <= ?")
+        params += [after_id, high_id]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # новые строки — по id, чтобы граница выгрузки была одним числом; период — по времени
+    order = spec["id_column"] if after_id is not None else f"{spec['time_column']}, {spec['id_column']}"
+    return f"{spec['sql']} {where} ORDER BY {order}", params
+
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, "wt", newline="", encoding="utf-8",
+                              compresslevel=EXPORT_CONFIG["csv_compresslevel"])
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column for column, _ in columns])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+def _parquet_value(kind, value):
+    if value is None:
+        return None
+    if kind == "money" and not isinstance(value, Decimal):
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+    if kind == "timestamp" and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+class ParquetWriter:
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Для Parquet нужен пакет pyarrow: pip install pyarrow")
+        types = {"int": pa.int64(), "text": pa.string(), "money": pa.decimal128(14, 2),
+                 "timestamp": pa.timestamp("us")}
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(column, types[kind]) for column, kind in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression=EXPORT_CONFIG["parquet_compression"])
+
+    def write(self, rows):
+        # каждая пачка — отдельная группа строк файла
+        arrays = [
+            self.pa.array([_parquet_value(kind, row[i]) for row in rows], type=self.schema.field(i).type)
+            for i, (_, kind) in enumerate(self.columns)
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"csv": (CsvWriter, ".csv.gz"), "parquet": (ParquetWriter, ".parquet")}
+
+
+def load_state(export_dir):
+    try:
+        with open(os.path.join(export_dir, STATE_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(export_dir, state):
+    path = os.path.join(export_dir, STATE_FILE)
+    with open(path + ".partial", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".partial", path)
+
+
+def export_table(pool, name, date_from=None, date_to=None, incremental=False, fmt=None,
+                 export_dir=None, progress=None):
+    fmt = fmt or EXPORT_CONFIG["format"]
+    export_dir = export_dir or EXPORT_CONFIG["export_dir"]
+    if name not in EXPORTS:
+        raise ValueError(f"Неизвестная таблица '{name}', допустимы: {', '.join(EXPORTS)}")
+    if fmt not in WRITERS:
+        raise ValueError(f"Неизвестный формат '{fmt}', допустимы: {', '.join(WRITERS)}")
+    if incremental and (date_from or date_to):
+        # граница одна на таблицу: выгрузка за период сдвинула бы её за строки вне периода
+        raise ValueError("Новые строки выгружаются без периода: уберите даты или --incremental")
+    os.makedirs(export_dir, exist_ok=True)
+
+    state = load_state(export_dir)
+    after_id = state.get(name, 0) if incremental else None
+    writer_class, extension = WRITERS[fmt]
+    period = "_".join(f"{day:%Y%m%d}" for day in (date_from, date_to) if day) or "all"
+    suffix = f"_after{after_id}" if incremental else ""
+    path = os.path.join(export_dir, f"{name}_{period}{suffix}_{datetime.now():%Y%m%d_%H%M%S}{extension}")
+
+    summary = {"path": None, "rows": 0, "last_id": after_id}
+    writer = None
+    try:
+        with pool.connection() as conn:
+            high_id = (committed_high_id(conn, EXPORTS[name]["table"], EXPORT_CONFIG["settle_timeout"])
+                       if incremental else None)
+            sql, params = build_query(conn, name, date_from, date_to, after_id, high_id)
+            for rows in stream_rows(conn, sql, params):
+                if writer is None:
+                    writer = writer_class(path + ".partial", EXPORTS[name]["columns"])
+                writer.write(rows)
+                summary["rows"] += len(rows)
+                if progress:
+                    progress(f"Выгружено строк: {summary['rows']}")
+            conn.rollback()
+    except Exception:
+        if writer is not None:
+            writer.close()
+            os.remove(path + ".partial")
+        raise
+
+    if writer is not None:
+        writer.close()
+        os.replace(path + ".partial", path)
+        summary["path"] = path
+    # граница сдвигается только после того, как файл целиком на месте
+    if incremental and high_id > after_id:
+        summary["last_id"] = state[name] = high_id
+        save_state(export_dir, state)
+    return summary
+
+
+def describe(name, summary):
+    if not summary["path"]:
+        return f"{name}: новых строк нет"
+    return f"{name}: {summary['rows']} строк -> {summary['path']}"
+
+
+def export_pool(host, incremental):
+    # выгрузка за период только читает: пусть нагружает реплику, а не кассы. Новые строки —
+    # с основного сервера: граница берётся из его снимка транзакций, а реплика может не успеть
+    # проиграть строки ниже неё
+    return get_pool(host) if incremental else read_pool(host)
+
+
+def run_export(host, user_id, name, date_from=None, date_to=None, incremental=False, fmt=None,
+               export_dir=None, progress=None):
+    summary = export_table(export_pool(host, incremental), name, date_from, date_to, incremental,
+                           fmt, export_dir, progress)
+    get_log_writer(host).log(user_id, "Выгрузка данных", describe(name, summary))
+    return summary
+
+
+def _day(value):
+    return date.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка продаж и журнала действий в CSV/Parquet")
+    parser.add_argument("table", choices=list(EXPORTS))
+    parser.add_argument("--from", dest="date_from", type=_day, metavar="ГГГГ-ММ-ДД")
+    parser.add_argument("--to", dest="date_to", type=_day, metavar="ГГГГ-ММ-ДД", help="включительно")
+    parser.add_argument("--incremental", action="store_true",
+                        help="только строки после прошлой выгрузки в эту папку")
+    parser.add_argument("--format", choices=list(WRITERS), default=EXPORT_CONFIG["format"])
+    parser.add_argument("-o", "--output", default=EXPORT_CONFIG["export_dir"], help="папка выгрузок")
+    parser.add_argument("--host", default=DB_CONFIG["server"])
+    args = parser.parse_args()
+    if args.incremental and (args.date_from or args.date_to):
+        parser.error("--incremental не сочетается с --from/--to")
+
+    summary = export_table(export_pool(args.host, args.incremental), args.table, args.date_from,
+                           args.date_to, args.incremental, args.format, args.output, progress=print)
+    print(f"✅ {describe(args.table, summary)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,271 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+from backends import get_backend
+from query_metrics import instrument
+
+DB_CONFIG = {
+    "backend": "auto",                  # auto | psycopg | pyodbc | sqlite, см. backends.py
+    "driver": "PostgreSQL Unicode(x64)",  # только для pyodbc
+    "sqlite_path": "shoes_store.sqlite3",  # только для sqlite
+    "server": "localhost",
+    "port": "5432",
+    "database": "Shoes_store",
+    "user": "appuser",
+    "password": "apppass",
+    "admin_user": "postgres",
+    "admin_password": "admin"
+}
+
+POOL_CONFIG = {
+    "min_size": 1,
+    "max_size": 5,
+    "idle_timeout": 300,       # секунд простоя до закрытия лишнего соединения
+    "checkout_timeout": 10,    # сколько ждать свободное соединение
+    "ping_after": 30,          # проверять соединение SELECT 1, если оно простаивало дольше
+    "connect_retries": 2
+}
+
+
+def split_host(host):
+    # «хост:порт» — для второго экземпляра на той же машине (реплика, тесты)
+    # IPv6 с портом пишется в скобках: «[::1]:5433»
+    name, sep, port = host.rpartition(":")
+    if sep and port.isdigit() and name.startswith("[") and name.endswith("]"):
+        return name[1:-1], port
+    if sep and name and port.isdigit() and ":" not in name:
+        return name, port
+    return host, DB_CONFIG["port"]
+
+
+def connect_db(host, user=None, password=None):
+    # драйвер грузится при первом подключении, а не при старте приложения
+    host, port = split_host(host)
+    return get_backend(DB_CONFIG["backend"]).connect(
+        {**DB_CONFIG, "port": port}, host, user or DB_CONFIG["user"], password or DB_CONFIG["password"]
+    )
+
+
+def is_connection_error(error):
+    # нет связи с сервером, а не ошибка в данных: по DB-API это OperationalError и
+    # InterfaceError у любого драйвера, плюс исчерпанный пул и сетевые ошибки ОС
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in ("OperationalError", "InterfaceError") for cls in type(error).__mro__)
+
+
+def in_transaction(conn):
+    # открыта ли транзакция на соединении; None — драйвер этого не сообщает (pyodbc)
+    raw = getattr(conn, "raw", conn)
+    if hasattr(raw, "in_transaction"):
+        return raw.in_transaction    # sqlite3
+    info = getattr(raw, "info", None)
+    if hasattr(info, "transaction_status"):
+        return info.transaction_status != 0    # psycopg: 0 — IDLE, вне транзакции
+    return None
+
+
+def dialect_of(conn):
+    # SQLite — локальная база (офлайн, бенчмарки); всё остальное — PostgreSQL
+    conn = getattr(conn, "raw", conn)
+    return "sqlite" if type(conn).__module__.startswith("sqlite3") else "postgresql"
+
+
+def committed_high_id(conn, table, settle_timeout):
+    # id, ниже которого в table уже не появится ни одной строки: граница для выгрузки новых
+    # строк и дневных итогов. Время строки для этого не годится — его ставят кассы, а
+    # офлайн-журнал пишет продажи задним числом. id тоже выдаются до коммита, и меньший
+    # может закоммититься позже большего, поэтому вместе с MAX(id) берётся снимок транзакций
+    # и граница отдаётся, когда все транзакции, шедшие в тот момент, закончились.
+    cur = conn.cursor()
+    if dialect_of(conn) != "postgresql":
+        # в SQLite пишет один писатель, и его незакоммиченные строки получат id больше видимых
+        cur.execute(f"SELECT MAX(id) FROM {table}")
+        high_id = cur.fetchone()[0] or 0
+        conn.rollback()
+        return high_id
+
+    cur.execute(f"SELECT MAX(id), CAST(pg_current_snapshot() AS TEXT) FROM {table}")
+    high_id, snapshot = cur.fetchone()
+    conn.rollback()
+    deadline = time.monotonic() + settle_timeout
+    while True:
+        cur.execute(
+            """SELECT COUNT(*) FROM pg_snapshot_xip(CAST(? AS pg_snapshot)) AS running (xact)
+               WHERE pg_xact_status(running.xact) = 'in progress'""",
+            (snapshot,)
+        )
+        running = cur.fetchone()[0]
+        conn.rollback()
+        if not running:
+            return high_id or 0
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"На сервере {running} долгих транзакций, повторите позже")
+        time.sleep(0.5)
+
+
+class ConnectionPool:
+    def __init__(self, connect, min_size=None, max_size=None, idle_timeout=None,
+                 checkout_timeout=None, ping_after=None, connect_retries=None):
+        self._connect = connect
+        self.min_size = POOL_CONFIG["min_size"] if min_size is None else min_size
+        self.max_size = POOL_CONFIG["max_size"] if max_size is None else max_size
+        self.idle_timeout = POOL_CONFIG["idle_timeout"] if idle_timeout is None else idle_timeout
+        self.checkout_timeout = POOL_CONFIG["checkout_timeout"] if checkout_timeout is None else checkout_timeout
+        self.ping_after = POOL_CONFIG["ping_after"] if ping_after is None else ping_after
+        self.connect_retries = POOL_CONFIG["connect_retries"] if connect_retries is None else connect_retries
+
+        self._idle = []      # [(conn, last_used)], самые старые в начале
+        self._size = 0       # выданные + простаивающие соединения
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _dial(self):
+        last_error = None
+        for attempt in range(self.connect_retries + 1):
+            try:
+                # каждый execute/commit попадает в query_metrics
+                return instrument(self._connect())
+            except Exception as e:
+                last_error = e
+                if attempt < self.connect_retries:
+                    time.sleep(0.2 * (attempt + 1))
+        raise last_error
+
+    def _is_alive(self, conn):
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _take_expired(self):
+        # вызывается под self._cond
+        expired = []
+        now = time.monotonic()
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0][1] > self.idle_timeout):
+            conn, _ = self._idle.pop(0)
+            self._size -= 1
+            expired.append(conn)
+        return expired
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        conn = None
+        last_used = None
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Пул соединений закрыт")
+            expired = self._take_expired()
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Нет свободных соединений с БД")
+                self._cond.wait(remaining)
+
+        for old in expired:
+            self._close_quietly(old)
+
+        if conn is not None:
+            if time.monotonic() - last_used < self.ping_after or self._is_alive(conn):
+                return conn
+            self._close_quietly(conn)
+
+        try:
+            return self._dial()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                # ROLLBACK только если транзакция осталась открытой: иначе это лишний круг
+                # до сервера на каждой выдаче. Мимо query_metrics — это работа пула, не действия
+                if in_transaction(conn) is not False:
+                    getattr(conn, "raw", conn).rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            expired = self._take_expired()
+            self._cond.notify()
+
+        if conn is not None:
+            self._close_quietly(conn)
+        for old in expired:
+            self._close_quietly(old)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            # release() откатит незавершённую транзакцию и выбросит соединение, если оно умерло
+            self.release(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle = []
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host, user=None, password=None, **options):
+    key = (host, user or DB_CONFIG["user"])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(lambda: connect_db(host, user, password), **options)
+            _pools[key] = pool
+        return pool
+
+
+def get_admin_pool(host=None):
+    return get_pool(host or DB_CONFIG["server"], DB_CONFIG["admin_user"],
+                    DB_CONFIG["admin_password"], min_size=0)
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_pools)
@@ -0,0 +1,220 @@
+import argparse
+import getpass
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from activity_log import get_log_writer
+from bulk_import import _chunks, _text, read_rows
+from db import DB_CONFIG, get_pool
+from passwords import hash_password, target_rounds
+from photos import prepare_photo_file, store_prepared_photo
+from store import authenticate, validate_email, validate_phone
+
+# Массовое заведение сотрудников из CSV/JSON (поля как в админ-панели:
+# full_name, position, birth_date, phone, email, username, password, photo)
+# и папки с фотографиями. bcrypt и пережатие фото идут параллельно в пуле процессов,
+# пользователи и анкеты пачки вставляются одной транзакцией: без «сирот» в users.
+
+EMPLOYEE_IMPORT_CONFIG = {
+    "batch_size": 200,   # сотрудников в одной транзакции
+    "workers": None      # процессов для bcrypt и фото; None — по числу ядер
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y")
+
+
+def _birth_date(row):
+    value = _text(row, "birth_date", 10)
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError("дата рождения в формате ГГГГ-ММ-ДД или ДД.ММ.ГГГГ")
+
+
+def validate_employee(row, photo_dir=None):
+    full_name = _text(row, "full_name", 100)
+    username = _text(row, "username", 50)
+    password = str(row.get("password") or "")
+    if not full_name or not username or not password:
+        raise ValueError("не заполнены обязательные поля: full_name, username, password")
+
+    phone = _text(row, "phone", 20)
+    email = _text(row, "email", 100)
+    if email and not validate_email(email):
+        raise ValueError("неверный формат email")
+    if phone and not validate_phone(phone):
+        raise ValueError("неверный формат телефона")
+
+    photo = _text(row, "photo", 255)
+    photo_path = None
+    if photo:
+        photo_path = os.path.join(photo_dir or "", photo)
+        if not os.path.isfile(photo_path):
+            raise ValueError(f"нет файла фото {photo}")
+
+    return {
+        "full_name": full_name,
+        "position": _text(row, "position", 50),
+        "birth_date": _birth_date(row),
+        "phone": phone,
+        "email": email,
+        "username": username,
+        "password": password,
+        "photo_path": photo_path
+    }
+
+
+def _prepare(password, rounds, photo_path):
+    # выполняется в дочернем процессе: только то, что грузит процессор
+    photo = prepare_photo_file(photo_path) if photo_path else None
+    return hash_password(password, rounds), photo
+
+
+def _existing_usernames(conn, usernames):
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT username FROM users WHERE username IN ({', '.join(['?'] * len(usernames))})",
+        usernames
+    )
+    return {row[0] for row in cur.fetchall()}
+
+
+def insert_batch(conn, employees):
+    # employees — [(анкета, хеш пароля, подготовленное фото или None)]; одна транзакция на пачку
+    cur = conn.cursor()
+    try:
+        photo_ids = [store_prepared_photo(conn, *photo) if photo else None for _, _, photo in employees]
+
+        cur.execute(
+            f"""INSERT INTO users (username, password_hash, role)
+                VALUES {", ".join(["(?, ?, 'worker')"] * len(employees))}
+                RETURNING id, username""",
+            [value for employee, password_hash, _ in employees
+             for value in (employee["username"], password_hash)]
+        )
+        user_ids = {username: user_id for user_id, username in cur.fetchall()}
+
+        cur.execute(
+            f"""INSERT INTO employees (full_name, position, birth_date, phone, email, photo_id, user_id)
+                VALUES {", ".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(employees))}""",
+            [value for (employee, _, _), photo_id in zip(employees, photo_ids)
+             for value in (employee["full_name"], employee["position"], employee["birth_date"],
+                           employee["phone"], employee["email"], photo_id, user_ids[employee["username"]])]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return user_ids
+
+
+def import_employees(pool, path, photo_dir=None, on_progress=None, batch_size=None):
+    photo_dir = photo_dir or os.path.dirname(os.path.abspath(path))
+    summary = {"rows": 0, "created": 0, "errors": []}
+    seen = set()
+    rounds = target_rounds()
+
+    with ProcessPoolExecutor(max_workers=EMPLOYEE_IMPORT_CONFIG["workers"]) as executor:
+        for chunk in _chunks(read_rows(path), batch_size or EMPLOYEE_IMPORT_CONFIG["batch_size"]):
+            summary["rows"] += len(chunk)
+            valid = []
+            for line_no, raw in chunk:
+                try:
+                    employee = validate_employee(raw, photo_dir)
+                    if employee["username"] in seen:
+                        raise ValueError(f"логин '{employee['username']}' повторяется в файле")
+                except ValueError as e:
+                    summary["errors"].append((line_no, str(e)))
+                    continue
+                seen.add(employee["username"])
+                valid.append((line_no, employee))
+
+            if valid:
+                with pool.connection() as conn:
+                    taken = _existing_usernames(conn, [employee["username"] for _, employee in valid])
+                    conn.rollback()
+                for line_no, employee in valid:
+                    if employee["username"] in taken:
+                        summary["errors"].append((line_no, f"логин '{employee['username']}' уже занят"))
+                valid = [(line_no, employee) for line_no, employee in valid if employee["username"] not in taken]
+
+            futures = [(line_no, employee,
+                        executor.submit(_prepare, employee["password"], rounds, employee["photo_path"]))
+                       for line_no, employee in valid]
+            prepared = []
+            for line_no, employee, future in futures:
+                try:
+                    password_hash, photo = future.result()
+                except Exception as e:
+                    summary["errors"].append((line_no, f"фото или пароль: {e}"))
+                    continue
+                prepared.append((line_no, (employee, password_hash, photo)))
+
+            if prepared:
+                with pool.connection() as conn:
+                    summary["created"] += _insert_with_fallback(conn, prepared, summary["errors"])
+
+            if on_progress:
+                on_progress(summary)
+
+    summary["errors"].sort()
+    return summary
+
+
+def _insert_with_fallback(conn, prepared, errors):
+    try:
+        insert_batch(conn, [item for _, item in prepared])
+        return len(prepared)
+    except Exception:
+        pass
+    # пачка не прошла целиком (например, логин заняли параллельно) — ищем виноватые строки
+    created = 0
+    for line_no, item in prepared:
+        try:
+            insert_batch(conn, [item])
+            created += 1
+        except Exception as e:
+            errors.append((line_no, str(e)))
+    return created
+
+
+def describe(path, summary):
+    return (f"{os.path.basename(path)}: строк {summary['rows']}, заведено сотрудников {summary['created']}, "
+            f"ошибок {len(summary['errors'])}")
+
+
+def run_import(host, path, user_id, photo_dir=None):
+    summary = import_employees(get_pool(host), path, photo_dir)
+    get_log_writer(host).log(user_id, "Импорт сотрудников", describe(path, summary))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовое заведение сотрудников из CSV/JSON")
+    parser.add_argument("path", help="файл с полями full_name, position, birth_date, phone, email, "
+                                     "username, password, photo")
+    parser.add_argument("--photos", help="папка с фото (по умолчанию — папка файла)")
+    parser.add_argument("--host", default=DB_CONFIG["server"])
+    parser.add_argument("--login", required=True, help="администратор, от имени которого идёт импорт")
+    args = parser.parse_args()
+
+    with get_pool(args.host).connection() as conn:
+        user = authenticate(conn, args.login, getpass.getpass("Пароль: "))
+    if not user or user["role"] != "admin":
+        print("❌ Нужен логин и пароль администратора")
+        return 1
+
+    summary = run_import(args.host, args.path, user["id"], args.photos)
+    for line_no, error in summary["errors"][:50]:
+        print(f"⚠️ Строка {line_no}: {error}")
+    print(f"✅ {describe(args.path, summary)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+# История продаж и журнал действий: страницы по ключу (время, id), от новых к старым.
+# Следующая страница начинается строго после последнего ключа предыдущей, поэтому
+# стоимость запроса не растёт с глубиной прокрутки, в отличие от OFFSET.
+# Фильтры ложатся на индексы миграций 10, 11 и 13.
+
+SALES_HEADERS = ["Дата", "№", "Товар", "Бренд", "Размер", "Кол-во", "Цена", "Сумма", "Продавец", "Покупатель"]
+ACTIVITY_HEADERS = ["Время", "№", "Пользователь", "Действие", "Подробности"]
+
+
+def _like_prefix(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _page(conn, sql, conditions, params, after, limit, time_column, id_column):
+    if after is not None:
+        conditions.append(f"({time_column}, {id_column}) < (?, ?)")
+        params += list(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cur = conn.cursor()
+    cur.execute(
+        f"""{sql}
+            {where}
+            ORDER BY {time_column} DESC, {id_column} DESC
+            LIMIT ?""",
+        params + [limit]
+    )
+    return cur.fetchall()
+
+
+def sales_page(conn, filters, after=None, limit=200):
+    # filters: date_from, date_to (конец не включается), seller (логин), product (начало названия)
+    conditions, params = [], []
+    if filters.get("date_from"):
+        conditions.append("s.sale_date >= ?")
+        params.append(filters["date_from"])
+    if filters.get("date_to"):
+        conditions.append("s.sale_date < ?")
+        params.append(filters["date_to"])
+    if filters.get("seller"):
+        # подзапрос считается один раз, дальше работает индекс (sold_by, sale_date, id)
+        conditions.append("s.sold_by = (SELECT id FROM users WHERE username = ?)")
+        params.append(filters["seller"])
+    if filters.get("product"):
+        # три источника названия, у каждого свой индекс: товар (миграция 13 — включая
+        # распроданные), словарь старых продаж и ещё не перенесённые строки с текстом (миграция 11)
+        conditions.append(
+            """(s.product_id IN (SELECT id FROM products WHERE lower(name) LIKE ? ESCAPE '\\')
+                OR s.label_id IN (SELECT id FROM sale_labels WHERE lower(product_name) LIKE ? ESCAPE '\\')
+                OR lower(s.product_name) LIKE ? ESCAPE '\\')"""
+        )
+        params += [_like_prefix(filters["product"].lower())] * 3
+    return _page(
+        conn,
+        """SELECT s.sale_date, s.id,
+                  COALESCE(s.product_name, p.name, l.product_name),
+                  COALESCE(s.brand, p.brand, NULLIF(l.brand, '')),
+                  COALESCE(s.size, p.size, NULLIF(l.size, '')),
+                  s.quantity, s.unit_price, s.total_price, u.username, s.customer_name
+           FROM sales s
+           LEFT JOIN products p ON p.id = s.product_id
+           LEFT JOIN sale_labels l ON l.id = s.label_id
+           LEFT JOIN users u ON u.id = s.sold_by""",
+        conditions, params, after, limit, "s.sale_date", "s.id"
+    )
+
+
+def activity_page(conn, filters, after=None, limit=200):
+    # filters: date_from, date_to, user (логин), action (точное название действия)
+    conditions, params = [], []
+    if filters.get("date_from"):
+        conditions.append("a.timestamp >= ?")
+        params.append(filters["date_from"])
+    if filters.get("date_to"):
+        conditions.append("a.timestamp < ?")
+        params.append(filters["date_to"])
+    if filters.get("user"):
+        conditions.append("a.user_id = (SELECT id FROM users WHERE username = ?)")
+        params.append(filters["user"])
+    if filters.get("action"):
+        conditions.append("a.action = ?")
+        params.append(filters["action"])
+    return _page(
+        conn,
+        """SELECT a.timestamp, a.id, u.username, a.action, a.details
+           FROM activity_logs a
+           LEFT JOIN users u ON u.id = a.user_id""",
+        conditions, params, after, limit, "a.timestamp", "a.id"
+    )
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from tasks import run_db
+
+HISTORY_CONFIG = {
+    "page_size": 200,     # строк за один запрос
+    "cached_pages": 10    # сколько страниц держать в памяти; остальные перечитываются по ключу
+}
+
+PLACEHOLDER = "…"
+
+
+class HistoryPages:
+    # Строки лежат страницами по page_size. Для каждой прочитанной страницы помним только
+    # ключ её начала (время, id) — два значения; сами строки держим для cached_pages
+    # последних использованных страниц, а вытесненные при возврате к ним перечитываем по ключу.
+    def __init__(self, page_size, cached_pages):
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self.starts = [None]    # starts[n] — ключ, после которого начинается страница n
+        self.counts = []        # строк на каждой прочитанной странице
+        self.rows = OrderedDict()
+        self.complete = False
+
+    def row_count(self):
+        return sum(self.counts)
+
+    def locate(self, row):
+        return divmod(row, self.page_size)
+
+    def get(self, row):
+        page, offset = self.locate(row)
+        rows = self.rows.get(page)
+        if rows is None:
+            return None
+        self.rows.move_to_end(page)
+        return rows[offset] if offset < len(rows) else None
+
+    def store(self, page, rows):
+        if page == len(self.counts):
+            if page == 0 and rows:
+                # новые продажи не должны сдвигать уже показанную первую страницу при перечитывании
+                self.starts[0] = (rows[0][0], rows[0][1] + 1)
+            self.counts.append(len(rows))
+            if len(rows) < self.page_size:
+                self.complete = True
+            else:
+                self.starts.append((rows[-1][0], rows[-1][1]))
+        elif len(rows) < self.counts[page]:
+            # строку удалили (например, раздел журнала ушёл в архив) — дыру заполняем пустыми
+            rows = rows + [()] * (self.counts[page] - len(rows))
+        self.rows[page] = rows[:self.counts[page]]
+        self.rows.move_to_end(page)
+        while len(self.rows) > self.cached_pages:
+            self.rows.popitem(last=False)
+
+
+class HistoryTableModel(QAbstractTableModel):
+    # fetch_page(conn, filters, after, limit) -> строки, первые два поля — (время, id)
+    def __init__(self, pool, fetch_page, headers, page_size=None, cached_pages=None,
+                 on_error=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.fetch_page = fetch_page
+        self.headers = headers
+        self.page_size = page_size or HISTORY_CONFIG["page_size"]
+        self.cached_pages = cached_pages or HISTORY_CONFIG["cached_pages"]
+        self.on_error = on_error
+        self.filters = {}
+        self._reset_pages()
+
+    def _reset_pages(self):
+        self.pages = HistoryPages(self.page_size, self.cached_pages)
+        self._loading = set()
+        # ответы на запросы со старыми фильтрами приходят с устаревшим поколением и отбрасываются
+        self._generation = getattr(self, "_generation", 0) + 1
+
+    def set_filters(self, filters):
+        self.beginResetModel()
+        self.filters = dict(filters)
+        self._reset_pages()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.pages.row_count()
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        row = self.pages.get(index.row())
+        if row is None:
+            self._load(self.pages.locate(index.row())[0])
+            return PLACEHOLDER
+        value = row[index.column()] if row else None
+        if value is None:
+            return ""
+        if hasattr(value, "strftime"):
+            return value.strftime("%d.%m.%Y %H:%M:%S")
+        return str(value)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.pages.complete
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.pages.complete:
+            return
+        self._load(len(self.pages.counts))
+
+    def _load(self, page):
+        if page in self._loading:
+            return
+        self._loading.add(page)
+        generation = self._generation
+        run_db(
+            self.pool, self.fetch_page, self.filters, self.pages.starts[page], self.page_size,
+            on_result=lambda rows: self._on_page(generation, page, rows),
+            on_error=lambda error: self._on_failed(generation, page, error)
+        )
+
+    def _on_page(self, generation, page, rows):
+        if generation != self._generation:
+            return
+        self._loading.discard(page)
+        rows = [tuple(row) for row in rows]
+        if page == len(self.pages.counts):
+            first = self.pages.row_count()
+            if rows:
+                self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.pages.store(page, rows)
+            if rows:
+                self.endInsertRows()
+        else:
+            self.pages.store(page, rows)
+            first = page * self.page_size
+            last = first + self.pages.counts[page] - 1
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.headers) - 1))
+
+    def _on_failed(self, generation, page, error):
+        if generation != self._generation:
+            return
+        self._loading.discard(page)
+        if self.on_error:
+            self.on_error(error)
@@ -0,0 +1,381 @@
+import argparse
+import bisect
+import getpass
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import sales
+import store
+from bench import create_database, percentile
+from db import DB_CONFIG, ConnectionPool, connect_db
+from passwords import PASSWORD_CONFIG
+from store import StoreError
+
+# Нагрузка от нескольких касс на одну базу: N потоков-кассиров продают, добавляют товары
+# и входят в систему. Популярность товаров — по Ципфу (skew=0 — равномерно, больше — горячее).
+# Продажи идут по отдельным тестовым товарам с небольшим остатком, чтобы кассы
+# упирались в одни и те же строки и в нехватку товара; в конце сверяются остатки.
+# На PostgreSQL запускать на тестовой базе: продажи пишутся в sales как настоящие.
+#   python loadgen.py --sqlite -c 8 -d 20
+#   python loadgen.py --host 192.168.1.10 --login worker1 -c 16 --skew 1.3
+
+LOADGEN_CONFIG = {
+    "cashiers": 8,
+    "duration": 30,               # секунд
+    "products": 200,
+    "stock": 100,                 # начальный остаток каждого тестового товара
+    "skew": 1.1,
+    "mix": "sale=85,add=10,login=5",
+    "max_quantity": 3,
+    "sample_interval": 0.05       # как часто смотреть pg_stat_activity на ожидания блокировок
+}
+
+OPERATIONS = ("sale", "add", "login")
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Неизвестная операция '{name}', допустимы: {', '.join(OPERATIONS)}")
+        weights[name] = float(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("В смеси операций все веса нулевые")
+    return weights
+
+
+def zipf_cum_weights(count, skew):
+    total = 0.0
+    cumulative = []
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** skew
+        cumulative.append(total)
+    return cumulative
+
+
+class LoadStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.rejected = Counter()     # нехватка товара — ожидаемый отказ, не ошибка
+        self.errors = Counter()
+        self.error_samples = {}
+        self.sold = Counter()         # product_id -> продано по подтверждённым продажам
+        self.added = []
+
+    def record(self, operation, elapsed_ms):
+        with self._lock:
+            self.latencies[operation].append(elapsed_ms)
+
+    def reject(self, operation):
+        with self._lock:
+            self.rejected[operation] += 1
+
+    def fail(self, operation, error):
+        key = f"{operation}: {type(error).__name__}"
+        with self._lock:
+            self.errors[key] += 1
+            self.error_samples.setdefault(key, str(error)[:200])
+
+    def sale(self, product_id, quantity):
+        with self._lock:
+            self.sold[product_id] += quantity
+
+    def product_added(self, product_id):
+        with self._lock:
+            self.added.append(product_id)
+
+
+class LockSampler(threading.Thread):
+    # PostgreSQL не считает время ожидания блокировок по запросам, поэтому
+    # периодически смотрим, сколько сеансов нашей базы стоят в wait_event_type = 'Lock'
+    def __init__(self, pool, interval):
+        super().__init__(name="lock-sampler", daemon=True)
+        self._pool = pool
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        with self._pool.connection() as conn:
+            cur = conn.cursor()
+            while not self._stop_event.wait(self.interval):
+                cur.execute(
+                    """SELECT COUNT(*) FROM pg_stat_activity
+                       WHERE datname = current_database() AND wait_event_type = 'Lock'"""
+                )
+                self.samples.append(cur.fetchone()[0])
+                conn.commit()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def summary(self):
+        if not self.samples:
+            return None
+        waiting = sum(self.samples)
+        return {
+            "samples": len(self.samples),
+            "max_waiting": max(self.samples),
+            "mean_waiting": waiting / len(self.samples),
+            "share_with_waits": sum(1 for s in self.samples if s) / len(self.samples),
+            # сеанс-секунды в ожидании: грубая оценка суммарного времени на блокировках
+            "wait_seconds": waiting * self.interval
+        }
+
+
+def seed_products(pool, user_id, tag, count, stock):
+    ids = []
+    with pool.connection() as conn:
+        for i in range(count):
+            product = store.add_product(conn, user_id, f"LOADGEN {tag} #{i}", "LoadGen", "42", 10, stock)
+            ids.append(product[0])
+    return ids
+
+
+def cashier(pool, stats, user, password, product_ids, cum_weights, mix, deadline, seed, customer):
+    rng = random.Random(seed)
+    operations, weights = list(mix), list(mix.values())
+    total_weight = cum_weights[-1]
+
+    def pick_product():
+        index = bisect.bisect_left(cum_weights, rng.random() * total_weight)
+        return product_ids[min(index, len(product_ids) - 1)]
+
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        start = time.perf_counter()
+        try:
+            with pool.connection() as conn:
+                if operation == "sale":
+                    product_id = pick_product()
+                    quantity = rng.randint(1, LOADGEN_CONFIG["max_quantity"])
+                    try:
+                        sales.sell_product(conn, user["id"], product_id, quantity, customer)
+                    except StoreError:
+                        stats.reject(operation)
+                    else:
+                        stats.sale(product_id, quantity)
+                elif operation == "add":
+                    # нулевой остаток: новые товары не влияют на сверку продаж
+                    product = store.add_product(conn, user["id"], f"{customer} new {rng.getrandbits(48):012x}",
+                                                "LoadGen", "43", 10, 0)
+                    stats.product_added(product[0])
+                elif not store.authenticate(conn, user["username"], password):
+                    raise RuntimeError("authenticate вернул None")
+        except Exception as e:
+            stats.fail(operation, e)
+            continue
+        stats.record(operation, (time.perf_counter() - start) * 1000)
+
+
+def check_invariants(pool, product_ids, stock, stats, customer):
+    placeholders = ", ".join(["?"] * len(product_ids))
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT id, stock FROM products WHERE id IN ({placeholders})", product_ids)
+        final = dict(cur.fetchall())
+        cur.execute(
+            "SELECT COUNT(*), COALESCE(SUM(quantity), 0) FROM sales WHERE customer_name = ?",
+            (customer,)
+        )
+        sales_rows, sales_quantity = cur.fetchone()
+        conn.commit()
+
+    violations = []
+    for product_id in product_ids:
+        expected = stock - stats.sold[product_id]
+        actual = final.get(product_id)
+        if actual is None or actual < 0:
+            violations.append(f"товар #{product_id}: остаток {actual} (ушёл в минус)")
+        elif actual != expected:
+            violations.append(f"товар #{product_id}: остаток {actual}, ожидалось {expected}")
+
+    confirmed = len(stats.latencies["sale"]) - stats.rejected["sale"]
+    if sales_quantity != sum(stats.sold.values()):
+        violations.append(
+            f"в sales {sales_quantity} шт., подтверждено кассам {sum(stats.sold.values())} шт."
+        )
+    if sales_rows != confirmed:
+        violations.append(f"строк в sales {sales_rows}, подтверждённых продаж {confirmed}")
+    return violations
+
+
+def cleanup(pool, product_ids, added, customer):
+    ids = product_ids + added
+    placeholders = ", ".join(["?"] * len(ids))
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM sales WHERE customer_name = ?", (customer,))
+        cur.execute(f"DELETE FROM products WHERE id IN ({placeholders})", ids)
+        conn.commit()
+
+
+def summarize(stats, elapsed):
+    operations = {}
+    for operation, samples in stats.latencies.items():
+        samples = sorted(samples)
+        operations[operation] = {
+            "count": len(samples),
+            "ops_per_sec": len(samples) / elapsed,
+            "p50_ms": percentile(samples, 0.50),
+            "p95_ms": percentile(samples, 0.95),
+            "p99_ms": percentile(samples, 0.99),
+            "max_ms": samples[-1],
+            "rejected": stats.rejected[operation]
+        }
+    return operations
+
+
+def run(pool, user, password, cashiers, duration, products, stock, skew, mix, sampler_pool=None, keep=False):
+    tag = datetime.now().strftime("%Y%m%d%H%M%S")
+    customer = f"loadgen-{tag}"
+    product_ids = seed_products(pool, user["id"], tag, products, stock)
+    cum_weights = zipf_cum_weights(len(product_ids), skew)
+    stats = LoadStats()
+
+    sampler = LockSampler(sampler_pool, LOADGEN_CONFIG["sample_interval"]) if sampler_pool else None
+    if sampler:
+        sampler.start()
+
+    started = time.monotonic()
+    deadline = started + duration
+    threads = [
+        threading.Thread(
+            target=cashier, name=f"cashier-{i}",
+            args=(pool, stats, user, password, product_ids, cum_weights, mix, deadline, i, customer)
+        )
+        for i in range(cashiers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    if sampler:
+        sampler.stop()
+
+    violations = check_invariants(pool, product_ids, stock, stats, customer)
+    if not keep:
+        cleanup(pool, product_ids, stats.added, customer)
+
+    total = sum(len(v) for v in stats.latencies.values())
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "cashiers": cashiers,
+            "duration": duration,
+            "products": products,
+            "stock": stock,
+            "skew": skew,
+            "mix": mix
+        },
+        "throughput": total / elapsed,
+        "operations": summarize(stats, elapsed),
+        "errors": dict(stats.errors),
+        "error_samples": stats.error_samples,
+        "lock_waits": sampler.summary() if sampler else None,
+        "violations": violations
+    }
+
+
+def print_report(report):
+    meta = report["meta"]
+    print(f"\nКасс: {meta['cashiers']}, {meta['duration']} с, товаров {meta['products']} "
+          f"по {meta['stock']} шт., skew {meta['skew']}")
+    print(f"Всего: {report['throughput']:.1f} оп/с")
+    for name, result in sorted(report["operations"].items()):
+        print(f"  {name:<6} {result['count']:>7} шт. {result['ops_per_sec']:>8.1f} оп/с   "
+              f"p50 {result['p50_ms']:>7.2f}  p95 {result['p95_ms']:>7.2f}  "
+              f"p99 {result['p99_ms']:>7.2f}  max {result['max_ms']:>7.2f} мс"
+              + (f"   отказов: {result['rejected']}" if result["rejected"] else ""))
+
+    waits = report["lock_waits"]
+    if waits:
+        print(f"Ожидания блокировок: до {waits['max_waiting']} сеансов одновременно, "
+              f"в среднем {waits['mean_waiting']:.2f}, "
+              f"{waits['share_with_waits'] * 100:.0f}% замеров с ожиданием, "
+              f"≈{waits['wait_seconds']:.1f} сеанс-с")
+
+    for key, count in report["errors"].items():
+        print(f"⚠️ {key} × {count}: {report['error_samples'][key]}")
+    if report["violations"]:
+        print(f"❌ Нарушения целостности остатков: {len(report['violations'])}")
+        for line in report["violations"][:20]:
+            print(f"   {line}")
+    else:
+        print("✅ Остатки сходятся, в минус ничего не ушло")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест: несколько касс на одну базу")
+    parser.add_argument("--host", default=DB_CONFIG["server"])
+    parser.add_argument("--login", help="пользователь PostgreSQL-базы, от имени которого работают кассы")
+    parser.add_argument("--sqlite", action="store_true", help="временная SQLite-база вместо сервера")
+    parser.add_argument("-c", "--cashiers", type=int, default=LOADGEN_CONFIG["cashiers"])
+    parser.add_argument("-d", "--duration", type=float, default=LOADGEN_CONFIG["duration"])
+    parser.add_argument("--products", type=int, default=LOADGEN_CONFIG["products"])
+    parser.add_argument("--stock", type=int, default=LOADGEN_CONFIG["stock"])
+    parser.add_argument("--skew", type=float, default=LOADGEN_CONFIG["skew"])
+    parser.add_argument("--mix", default=LOADGEN_CONFIG["mix"], help="например sale=80,add=10,login=10")
+    parser.add_argument("--keep", action="store_true", help="не удалять тестовые товары и продажи")
+    parser.add_argument("-o", "--output", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.sqlite:
+            PASSWORD_CONFIG["rounds"] = 4
+            password = "loadgen"
+            path = os.path.join(tmp, "loadgen.sqlite3")
+            user_id = create_database(path, 0, password)
+            user = {"id": user_id, "username": "bench"}
+            pool = ConnectionPool(lambda: sqlite3.connect(path, timeout=30, check_same_thread=False),
+                                  min_size=0, max_size=args.cashiers)
+            sampler_pool = None
+        else:
+            if not args.login:
+                parser.error("для PostgreSQL нужен --login (или --sqlite)")
+            password = getpass.getpass("Пароль: ")
+            pool = ConnectionPool(lambda: connect_db(args.host), min_size=0, max_size=args.cashiers)
+            with pool.connection() as conn:
+                user = store.authenticate(conn, args.login, password)
+            if not user:
+                print("❌ Неверный логин или пароль")
+                return 1
+            sampler_pool = ConnectionPool(lambda: connect_db(args.host), min_size=0, max_size=1)
+
+        try:
+            report = run(pool, user, password, args.cashiers, args.duration, args.products,
+                         args.stock, args.skew, mix, sampler_pool, args.keep)
+        finally:
+            pool.close()
+            if sampler_pool:
+                sampler_pool.close()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Отчёт: {args.output}")
+    return 1 if report["violations"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import argparse
+import csv
+import gzip
+import os
+import re
+from datetime import date, datetime
+
+from db import DB_CONFIG, dialect_of, get_admin_pool, get_pool
+
+LOG_PARTITION_CONFIG = {
+    "months_ahead": 3,        # сколько месяцев вперёд держать готовые разделы
+    "retention_months": 12,   # разделы старше уходят в архив
+    "archive_dir": "archive",
+    "fetch_size": 5000
+}
+
+_BOUND_TO = re.compile(r"TO \('([^']+)'\)")
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"activity_logs_p{month:%Y_%m}"
+
+
+def partition_activity_logs(cur):
+    # шаг миграции: старая таблица становится разделом «всё до следующего месяца»,
+    # данные не переписываются; месячные разделы начинаются после неё
+    cur.execute("SELECT relkind FROM pg_class WHERE relname = 'activity_logs' AND relnamespace = 'public'::regnamespace")
+    row = cur.fetchone()
+    if row and row[0] == "p":
+        return
+
+    cur.execute("ALTER TABLE activity_logs RENAME TO activity_logs_legacy")
+    cur.execute("ALTER TABLE activity_logs_legacy RENAME CONSTRAINT activity_logs_pkey TO activity_logs_legacy_pkey")
+    cur.execute("ALTER INDEX IF EXISTS activity_logs_user_timestamp_idx RENAME TO activity_logs_legacy_user_timestamp_idx")
+    cur.execute("UPDATE activity_logs_legacy SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL")
+    cur.execute("ALTER TABLE activity_logs_legacy ALTER COLUMN timestamp SET NOT NULL")
+    cur.execute("""
+        SELECT CAST(date_trunc('month', GREATEST(CURRENT_TIMESTAMP, COALESCE(MAX(timestamp), CURRENT_TIMESTAMP)))
+                    + INTERVAL '1 month' AS DATE)
+        FROM activity_logs_legacy
+    """)
+    month = cur.fetchone()[0]
+
+    cur.execute("""
+        CREATE TABLE activity_logs (
+            id INTEGER NOT NULL DEFAULT nextval('activity_logs_id_seq'),
+            user_id INTEGER REFERENCES users(id),
+            action VARCHAR(50) NOT NULL,
+            details TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    cur.execute("ALTER SEQUENCE activity_logs_id_seq OWNED BY activity_logs.id")
+    cur.execute("CREATE INDEX activity_logs_user_timestamp_idx ON activity_logs (user_id, timestamp)")
+    cur.execute(
+        f"ALTER TABLE activity_logs ATTACH PARTITION activity_logs_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{month:%Y-%m-%d}')"
+    )
+    # страховка: запись никогда не упадёт из-за отсутствующего раздела
+    cur.execute("CREATE TABLE activity_logs_default PARTITION OF activity_logs DEFAULT")
+    for offset in range(LOG_PARTITION_CONFIG["months_ahead"]):
+        _create_partition(cur, _add_months(month, offset))
+
+
+def _create_partition(cur, month):
+    name = partition_name(month)
+    start, end = f"{month:%Y-%m-%d}", f"{_add_months(month, 1):%Y-%m-%d}"
+    cur.execute("SELECT to_regclass(?)", (name,))
+    if cur.fetchone()[0]:
+        return False
+
+    # строки этого месяца, успевшие попасть в DEFAULT, не дадут создать раздел — переносим их
+    cur.execute("CREATE TEMP TABLE activity_logs_moving (LIKE activity_logs)")
+    cur.execute(
+        """WITH moved AS (
+               DELETE FROM activity_logs_default
+               WHERE timestamp >= ? AND timestamp < ?
+               RETURNING *
+           )
+           INSERT INTO activity_logs_moving SELECT * FROM moved""",
+        (start, end)
+    )
+    cur.execute(f"CREATE TABLE {name} PARTITION OF activity_logs FOR VALUES FROM ('{start}') TO ('{end}')")
+    cur.execute("INSERT INTO activity_logs SELECT * FROM activity_logs_moving")
+    cur.execute("DROP TABLE activity_logs_moving")
+    return True
+
+
+def missing_months(conn, months_ahead=None):
+    # месяцы от текущего и на months_ahead вперёд, для которых ещё нет раздела;
+    # каталог читается правами приложения
+    months_ahead = LOG_PARTITION_CONFIG["months_ahead"] if months_ahead is None else months_ahead
+    partitions = dict(list_partitions(conn))
+    # месяцы, которые ещё покрывает бывшая таблица, пропускаем
+    legacy_upper = partitions.get("activity_logs_legacy")
+    month = _month_start(date.today())
+    targets = (_add_months(month, offset) for offset in range(months_ahead + 1))
+    return [target for target in targets
+            if partition_name(target) not in partitions and not (legacy_upper and target < legacy_upper)]
+
+
+def ensure_partitions(conn, months_ahead=None):
+    cur = conn.cursor()
+    created = []
+    for target in missing_months(conn, months_ahead):
+        if _create_partition(cur, target):
+            created.append(partition_name(target))
+        conn.commit()
+    return created
+
+
+def list_partitions(conn):
+    # [(имя, верхняя граница или None для DEFAULT)]
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'activity_logs'::regclass
+        ORDER BY c.relname
+    """)
+    partitions = []
+    for name, bound in cur.fetchall():
+        match = _BOUND_TO.search(bound)
+        upper = datetime.fromisoformat(match.group(1)).date() if match else None
+        partitions.append((name, upper))
+    return partitions
+
+
+def _export(conn, name, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, user_id, action, details, timestamp FROM {name} ORDER BY timestamp, id")
+    with gzip.open(path + ".partial", "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "user_id", "action", "details", "timestamp"])
+        while True:
+            rows = cur.fetchmany(LOG_PARTITION_CONFIG["fetch_size"])
+            if not rows:
+                break
+            writer.writerows(rows)
+    os.replace(path + ".partial", path)
+    return path
+
+
+def expired_partitions(conn, retention_months=None):
+    retention_months = retention_months or LOG_PARTITION_CONFIG["retention_months"]
+    cutoff = _add_months(_month_start(date.today()), -retention_months)
+    return [name for name, upper in list_partitions(conn) if upper is not None and upper <= cutoff]
+
+
+def archive_old_partitions(conn, retention_months=None, archive_dir=None):
+    archive_dir = archive_dir or LOG_PARTITION_CONFIG["archive_dir"]
+    archived = []
+    for name in expired_partitions(conn, retention_months):
+        # сначала файл, потом DETACH + DROP одной транзакцией: данные не теряются при сбое
+        path = _export(conn, name, archive_dir)
+        cur = conn.cursor()
+        cur.execute(f"ALTER TABLE activity_logs DETACH PARTITION {name}")
+        cur.execute(f"DROP TABLE {name}")
+        conn.commit()
+        archived.append(path)
+    return archived
+
+
+def maintain(host=None, archive=True):
+    # Запускается по расписанию (python log_partitions.py из cron или планировщика задач)
+    # и из админ-панели без архивации. Есть ли работа, проверяется правами приложения:
+    # суперпользователь подключается, только когда нужно создать или выгрузить раздел.
+    with get_pool(host or DB_CONFIG["server"]).connection() as conn:
+        # разделы есть только в PostgreSQL; локальная SQLite-база пишет журнал в одну таблицу
+        if dialect_of(conn) != "postgresql":
+            return [], []
+        due = missing_months(conn) or (archive and expired_partitions(conn))
+        conn.rollback()
+    if not due:
+        return [], []
+    with get_admin_pool(host).connection() as conn:
+        created = ensure_partitions(conn)
+        archived = archive_old_partitions(conn) if archive else []
+    return created, archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание разделов activity_logs")
+    parser.add_argument("--host", default=DB_CONFIG["server"])
+    parser.add_argument("--no-archive", action="store_true", help="только создать разделы наперёд")
+    args = parser.parse_args()
+
+    created, archived = maintain(args.host, archive=not args.no_archive)
+    for name in created:
+        print(f"✅ Создан раздел {name}")
+    for path in archived:
+        print(f"📦 Раздел выгружен и удалён: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
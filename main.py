@@ -1,220 +1,79 @@
-import subprocess
+import time
+_started_at = time.perf_counter()
+
 import sys
-import bcrypt
-import pyodbc
-import os
-from datetime import datetime
-from PySide6.QtWidgets import (QApplication, QMessageBox, QFileDialog, 
+from PySide6.QtWidgets import (QApplication, QMainWindow, QMessageBox, QFileDialog, 
                                QTableWidget, QTableWidgetItem, QVBoxLayout, 
                                QHBoxLayout, QWidget, QPushButton, QLabel,
-                               QLineEdit, QComboBox, QSpinBox)
-from PySide6.QtUiTools import QUiLoader
-from PySide6.QtCore import QFile, QDate
+                               QLineEdit, QComboBox, QSpinBox, QListWidget,
+                               QListWidgetItem, QTableView, QDateEdit, QCheckBox,
+                               QDialog, QDialogButtonBox, QFormLayout)
+from PySide6.QtCore import QDate, QTimer, Qt
 from PySide6.QtGui import QPixmap
 
-DB_CONFIG = {
-    "driver": "PostgreSQL Unicode(x64)",
-    "server": "localhost",
-    "port": "5432",
-    "database": "Shoes_store",
-    "user": "appuser",
-    "password": "apppass"
-}
+from replicas import read_pool, write_pool
+from activity_log import get_log_writer
+from migrations import is_current, migrate
+from log_partitions import maintain as maintain_log_partitions
+import store
+import sales
+from store import validate_email, validate_phone
+from tasks import run_db, run_in_background, error_reporter
+from product_model import ProductListModel, MODEL_CONFIG, format_product
+from product_search import ProductSearch
+from bulk_import import run_import, describe as describe_import
+import employee_import
+from rollups import catch_up
+from photos import migrate_legacy_photos
+from backup import run_backup
+from ui_loader import load_ui
+from query_metrics import serve_metrics
+from offline_journal import OFFLINE_CONFIG, get_journal, get_syncer, new_key, record_sale, record_product
+from db import is_connection_error
+from store import StoreError
+import history
+from history_model import HistoryTableModel
+import data_export
 
-def log_activity(conn, user_id, action, details=""):
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO activity_logs (user_id, action, details) VALUES (?, ?, ?)",
-            (user_id, action, details)
-        )
-        conn.commit()
-    except Exception as e:
-        print(f"⚠️ Ошибка логирования: {e}")
+# python main.py --startup-time: напечатать время до первого окна и выйти
+STARTUP_TIME_MODE = "--startup-time" in sys.argv
+_imported_at = time.perf_counter()
+
+def log_activity(host, user_id, action, details=""):
+    get_log_writer(host).log(user_id, action, details)
 
 def init_database():
+    # при запуске — только проверка версии схемы правами приложения; суперпользователь
+    # нужен, лишь когда есть непримененные миграции
     try:
-        conn = pyodbc.connect(
-            f"DRIVER={{{DB_CONFIG['driver']}}};"
-            f"SERVER={DB_CONFIG['server']};"
-            f"PORT={DB_CONFIG['port']};"
-            f"DATABASE={DB_CONFIG['database']};"
-            "UID=postgres;"
-            "PWD=admin;"
-        )
-        cur = conn.cursor()
-        
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role VARCHAR(20) NOT NULL CHECK (role IN ('admin', 'worker')),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS employees (
-                id SERIAL PRIMARY KEY,
-                full_name VARCHAR(100) NOT NULL,
-                position VARCHAR(50),
-                birth_date DATE,
-                phone VARCHAR(20),
-                email VARCHAR(100),
-                photo BYTEA,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                brand VARCHAR(50),
-                size VARCHAR(10),
-                price DECIMAL(10, 2) NOT NULL,
-                stock INTEGER DEFAULT 0,
-                added_by INTEGER REFERENCES users(id),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS sales (
-                id SERIAL PRIMARY KEY,
-                product_name VARCHAR(100) NOT NULL,
-                brand VARCHAR(50),
-                size VARCHAR(10),
-                quantity INTEGER NOT NULL,
-                unit_price DECIMAL(10, 2) NOT NULL,
-                total_price DECIMAL(10, 2) NOT NULL,
-                sold_by INTEGER REFERENCES users(id),
-                customer_name VARCHAR(100),
-                sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS activity_logs (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id),
-                action VARCHAR(50) NOT NULL,
-                details TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cur.execute("GRANT USAGE ON SCHEMA public TO appuser")
-        cur.execute("GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA public TO appuser")
-        cur.execute("GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA public TO appuser")
-        cur.execute("ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT, INSERT, UPDATE, DELETE ON TABLES TO appuser")
-        cur.execute("ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT USAGE, SELECT ON SEQUENCES TO appuser")
-        
-        conn.commit()
-        
-        cur.execute("SELECT id FROM users WHERE username = 'admin'")
-        if not cur.fetchone():
-            password_hash = bcrypt.hashpw("admin123".encode(), bcrypt.gensalt()).decode()
-            cur.execute(
-                "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-                ("admin", password_hash, "admin")
-            )
-            conn.commit()
-            print("✅ Админ создан: admin/admin123")
-        
-        conn.close()
+        if is_current():
+            print("✅ Схема БД актуальна")
+            return
+        migrate()
         print("✅ БД инициализирована")
         
     except Exception as e:
         print(f"⚠️ Инициализация БД: {e}")
 
-def create_backup():
-    try:
-        backup_dir = "backups"
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = os.path.join(backup_dir, f"backup_{timestamp}.sql")
-        
-        pg_dump_path = r"C:\Program Files\PostgreSQL\16\bin\pg_dump.exe"
-        
-        result = subprocess.run([
-            pg_dump_path,
-            '-h', DB_CONFIG["server"],
-            '-p', DB_CONFIG["port"],
-            '-U', 'postgres',
-            '-d', DB_CONFIG["database"],
-            '-F', 'p',
-            '-f', backup_file
-        ], capture_output=True, text=True, env={'PGPASSWORD': 'admin'})
-        
-        if result.returncode == 0:
-            print(f"✅ Бэкап создан: {backup_file}")
-            return True
-        else:
-            print(f"❌ Ошибка бэкапа: {result.stderr}")
-            return False
-        
-    except Exception as e:
-        print(f"❌ Ошибка бэкапа: {e}")
-        return False
-
-def connect_db(host):
-    conn_str = (
-        f"DRIVER={{{DB_CONFIG['driver']}}};"
-        f"SERVER={host};"
-        f"PORT={DB_CONFIG['port']};"
-        f"DATABASE={DB_CONFIG['database']};"
-        f"UID={DB_CONFIG['user']};"
-        f"PWD={DB_CONFIG['password']};"
-    )
-    return pyodbc.connect(conn_str)
-
-def verify_password(password: str, password_hash: str) -> bool:
-    return bcrypt.checkpw(password.encode(), password_hash.encode())
-
-def authenticate(conn, username, password):
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, password_hash, role FROM users WHERE username = ?",
-        (username,)
-    )
-    row = cur.fetchone()
-    if not row:
-        return None
-    user_id, password_hash, role = row
-    if verify_password(password, password_hash):
-        return {"id": user_id, "role": role, "username": username}
-    return None
-
-def validate_email(email):
-    return "@" in email and "." in email.split("@")[1]
-
-def validate_phone(phone):
-    allowed = set("0123456789+-()")
-    return all(c in allowed for c in phone)
-
-app = QApplication(sys.argv)
-loader = QUiLoader()
 selected_photo_path = None
 
 def open_admin_form(host, user_data):
     global selected_photo_path
     selected_photo_path = None
     
-    admin_file = QFile("Admin.ui")
-    if not admin_file.open(QFile.ReadOnly):
+    try:
+        admin_window = load_ui("Admin.ui", QWidget)
+    except OSError:
         QMessageBox.critical(None, "Ошибка", "Не найден файл Admin.ui")
         return
     
-    admin_window = loader.load(admin_file)
-    admin_file.close()
-    
-    conn = connect_db(host)
-    log_activity(conn, user_data['id'], "Вход в админ-панель")
+    pool = write_pool(host)
+    log_activity(host, user_data['id'], "Вход в админ-панель")
+    # догоняем дневные итоги продаж, пока админ работает с формой
+    run_in_background(catch_up, pool)
+    run_in_background(migrate_legacy_photos, pool)
+    # разделы журнала на месяцы вперёд; архивация — по расписанию, python log_partitions.py
+    run_in_background(maintain_log_partitions, host, False)
     
     def choose_photo():
         global selected_photo_path
@@ -229,8 +88,6 @@ def open_admin_form(host, user_data):
             admin_window.photoBtn.setText(f"Выбрано: {file_path.split('/')[-1]}")
     
     def add_employee():
-        global selected_photo_path
-        
         full_name = admin_window.full_nameEdit.toPlainText().strip()
         position = admin_window.pos_edit.toPlainText().strip()
         birth_date = admin_window.b_day_ed.date().toString("yyyy-MM-dd")
@@ -251,40 +108,9 @@ def open_admin_form(host, user_data):
             QMessageBox.warning(admin_window, "Ошибка", "Неверный формат телефона")
             return
         
-        try:
-            cur = conn.cursor()
-            
-            cur.execute("SELECT id FROM users WHERE username = ?", (username,))
-            if cur.fetchone():
-                QMessageBox.warning(admin_window, "Ошибка", f"Логин '{username}' уже занят!")
-                return
-            
-            photo_data = None
-            if selected_photo_path:
-                with open(selected_photo_path, 'rb') as f:
-                    photo_data = f.read()
-            
-            password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-            
-            cur.execute(
-                "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-                (username, password_hash, "worker")
-            )
-            conn.commit()
-            
-            cur.execute("SELECT id FROM users WHERE username = ?", (username,))
-            user_id = cur.fetchone()[0]
-            
-            cur.execute(
-                """INSERT INTO employees 
-                   (full_name, position, birth_date, phone, email, photo, user_id) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (full_name, position, birth_date, phone, email, photo_data, user_id)
-            )
-            
-            conn.commit()
-            
-            log_activity(conn, user_data['id'], "Добавлен сотрудник", f"ФИО: {full_name}, Логин: {username}")
+        def on_added(_user_id):
+            global selected_photo_path
+            log_activity(host, user_data['id'], "Добавлен сотрудник", f"ФИО: {full_name}, Логин: {username}")
             
             QMessageBox.information(admin_window, "Успех", f"Сотрудник {full_name} добавлен!")
             
@@ -297,46 +123,180 @@ def open_admin_form(host, user_data):
             admin_window.pass_edit.clear()
             admin_window.photoBtn.setText("Добавить фото")
             selected_photo_path = None
-            
-        except Exception as e:
-            conn.rollback()
-            QMessageBox.critical(admin_window, "Ошибка", f"Не удалось добавить сотрудника:\n{e}")
+        
+        run_db(
+            pool, store.add_employee,
+            full_name, position, birth_date, phone, email, username, password, selected_photo_path,
+            on_result=on_added,
+            on_error=error_reporter(admin_window, "Не удалось добавить сотрудника"),
+            busy=(admin_window.addBtn, admin_window.save_n_exitBtn, admin_window.exitBtn)
+        )
+    
+    def import_employees():
+        file_path, _ = QFileDialog.getOpenFileName(
+            admin_window,
+            "Импорт сотрудников",
+            "",
+            "Сотрудники (*.csv *.json *.jsonl)"
+        )
+        if not file_path:
+            return
+        # отмена выбора папки — фото ищутся рядом с файлом
+        photo_dir = QFileDialog.getExistingDirectory(admin_window, "Папка с фото сотрудников") or None
+        
+        def on_imported(summary):
+            message = employee_import.describe(file_path, summary)
+            errors = "\n".join(f"Строка {line_no}: {error}" for line_no, error in summary['errors'][:10])
+            if errors:
+                message += f"\n\n{errors}"
+            QMessageBox.information(admin_window, "Импорт завершён", message)
+        
+        run_in_background(
+            employee_import.run_import, host, file_path, user_data['id'], photo_dir,
+            on_result=on_imported,
+            on_error=error_reporter(admin_window, "Не удалось импортировать сотрудников"),
+            busy=(admin_window.importBtn, admin_window.addBtn, admin_window.save_n_exitBtn, admin_window.exitBtn)
+        )
+    
+    # окна истории держим здесь, пока открыта админ-панель
+    history_windows = []
+    
+    def show_history(kind):
+        history_windows[:] = [w for w in history_windows if w.isVisible()]
+        history_windows.append(open_history_window(host, kind))
+    
+    def export_data():
+        dialog = QDialog(admin_window)
+        dialog.setWindowTitle("Выгрузка для бухгалтерии")
+        form = QFormLayout(dialog)
+        
+        table_combo = QComboBox()
+        table_combo.addItem("Продажи", "sales")
+        table_combo.addItem("Журнал действий", "activity_logs")
+        form.addRow("Данные:", table_combo)
+        
+        format_combo = QComboBox()
+        format_combo.addItem("CSV (gzip)", "csv")
+        format_combo.addItem("Parquet", "parquet")
+        form.addRow("Формат:", format_combo)
+        
+        period_check = QCheckBox("за период")
+        period_check.setChecked(True)
+        form.addRow(period_check)
+        date_from = QDateEdit(QDate(QDate.currentDate().year(), QDate.currentDate().month(), 1))
+        date_from.setCalendarPopup(True)
+        form.addRow("С:", date_from)
+        date_to = QDateEdit(QDate.currentDate())
+        date_to.setCalendarPopup(True)
+        form.addRow("По (включительно):", date_to)
+        
+        incremental_check = QCheckBox("только новое с прошлой выгрузки в эту папку")
+        form.addRow(incremental_check)
+        
+        def on_incremental(checked):
+            # новое выгружается целиком, без периода: граница по id одна на таблицу
+            period_check.setEnabled(not checked)
+            if checked:
+                period_check.setChecked(False)
+        
+        incremental_check.toggled.connect(on_incremental)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        form.addRow(buttons)
+        
+        if dialog.exec() != QDialog.Accepted:
+            return
+        export_dir = QFileDialog.getExistingDirectory(
+            admin_window, "Папка для выгрузок", data_export.EXPORT_CONFIG["export_dir"]
+        )
+        if not export_dir:
+            return
+        
+        name = table_combo.currentData()
+        period = (date_from.date().toPython(), date_to.date().toPython()) if period_check.isChecked() else (None, None)
+        
+        button_text = admin_window.exportBtn.text()
+        report_error = error_reporter(admin_window, "Не удалось выгрузить данные")
+        
+        def on_exported(summary):
+            admin_window.exportBtn.setText(button_text)
+            QMessageBox.information(admin_window, "Выгрузка завершена", data_export.describe(name, summary))
+        
+        def on_failed(error):
+            admin_window.exportBtn.setText(button_text)
+            report_error(error)
+        
+        run_in_background(
+            data_export.run_export, host, user_data['id'], name, *period,
+            incremental=incremental_check.isChecked(), fmt=format_combo.currentData(),
+            export_dir=export_dir,
+            on_result=on_exported,
+            on_error=on_failed,
+            on_progress=admin_window.exportBtn.setText,
+            busy=(admin_window.exportBtn,)
+        )
     
     def save_and_exit():
-        create_backup()
-        log_activity(conn, user_data['id'], "Выход из админ-панели")
-        conn.close()
+        log_activity(host, user_data['id'], "Выход из админ-панели")
+        run_in_background(get_log_writer(host).flush)
+        start_backup(host)
         admin_window.close()
         window.show()
     
     def exit_form():
-        log_activity(conn, user_data['id'], "Выход без сохранения")
-        conn.close()
+        log_activity(host, user_data['id'], "Выход без сохранения")
+        run_in_background(get_log_writer(host).flush)
         admin_window.close()
         window.show()
     
     admin_window.photoBtn.clicked.connect(choose_photo)
     admin_window.addBtn.clicked.connect(add_employee)
+    admin_window.importBtn.clicked.connect(import_employees)
+    admin_window.salesHistoryBtn.clicked.connect(lambda: show_history("sales"))
+    admin_window.activityHistoryBtn.clicked.connect(lambda: show_history("activity"))
+    admin_window.exportBtn.clicked.connect(export_data)
     admin_window.save_n_exitBtn.clicked.connect(save_and_exit)
     admin_window.exitBtn.clicked.connect(exit_form)
     
     admin_window.setWindowTitle(f"Панель администратора — {user_data['username']}")
     window.hide()
     admin_window.show()
+    
+    return admin_window
 
 def open_worker_form(host, user_data):
     worker_window = QWidget()
     worker_window.setWindowTitle(f"Панель работника — {user_data['username']}")
-    worker_window.resize(600, 500)
+    worker_window.resize(600, 850)
     
-    conn = connect_db(host)
-    log_activity(conn, user_data['id'], "Вход в панель работника")
+    # продажи и новые товары — на основной сервер, каталог и поиск — с реплик
+    pool = write_pool(host)
+    reads = read_pool(host)
+    journal = get_journal()
+    # переносит на сервер продажи, сохранённые без связи
+    syncer = get_syncer(host)
+    log_activity(host, user_data['id'], "Вход в панель работника")
     
     layout = QVBoxLayout()
     
     title = QLabel(f"<h2>Добро пожаловать, {user_data['username']}!</h2>")
     layout.addWidget(title)
     
+    offline_label = QLabel()
+    layout.addWidget(offline_label)
+    
+    def update_offline_label():
+        counts = journal.counts(host)
+        pending, conflicts = counts.get('pending', 0), counts.get('conflict', 0)
+        parts = []
+        if pending:
+            parts.append(f"не отправлено на сервер: {pending}")
+        if conflicts:
+            parts.append(f"конфликтов: {conflicts}")
+        offline_label.setText(f"📴 Офлайн-журнал — {', '.join(parts)}" if parts else "")
+    
     layout.addWidget(QLabel("<h3>Добавить товар</h3>"))
     
     product_layout = QVBoxLayout()
@@ -375,16 +335,12 @@ def open_worker_form(host, user_data):
         
         try:
             price_float = float(price)
-            
-            cur = conn.cursor()
-            cur.execute(
-                """INSERT INTO products (name, brand, size, price, stock, added_by)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (name, brand, size, price_float, stock, user_data['id'])
-            )
-            conn.commit()
-            
-            log_activity(conn, user_data['id'], "Добавлен товар", f"{name} ({brand}), {price} руб.")
+        except ValueError:
+            QMessageBox.warning(worker_window, "Ошибка", "Цена должна быть числом")
+            return
+        
+        def on_added(product):
+            log_activity(host, user_data['id'], "Добавлен товар", f"{name} ({brand}), {price} руб.")
             
             QMessageBox.information(worker_window, "Успех", f"Товар '{name}' добавлен!")
             
@@ -394,24 +350,121 @@ def open_worker_form(host, user_data):
             price_input.clear()
             stock_input.setValue(0)
             
-            refresh_products()
-            
-        except ValueError:
-            QMessageBox.warning(worker_window, "Ошибка", "Цена должна быть числом")
-        except Exception as e:
-            conn.rollback()
-            QMessageBox.critical(worker_window, "Ошибка", f"Не удалось добавить товар:\n{e}")
+            product_model.apply([product])
+            product_search.cache.clear()
+        
+        report_error = error_reporter(worker_window, "Не удалось добавить товар")
+        # тот же ключ уйдёт и с попыткой на сервер, и в журнал
+        product_key = new_key()
+        
+        def add_offline():
+            record_product(journal, host, user_data['id'], name, brand, size, price_float, stock, product_key)
+            syncer.wake()
+            update_offline_label()
+            QMessageBox.information(
+                worker_window, "Сохранено офлайн",
+                f"Сервер недоступен: товар '{name}' записан в журнал и появится после синхронизации"
+            )
+        
+        def on_add_failed(error):
+            # в журнал — только при обрыве связи: ошибка в данных повторится и при переносе
+            if is_connection_error(error):
+                add_offline()
+            else:
+                report_error(error)
+        
+        if OFFLINE_CONFIG['mode'] == "always":
+            add_offline()
+            return
+        
+        run_db(
+            pool, store.add_product,
+            user_data['id'], name, brand, size, price_float, stock, product_key,
+            on_result=on_added,
+            on_error=on_add_failed,
+            busy=(add_product_btn,)
+        )
     
     add_product_btn = QPushButton("Добавить товар")
     add_product_btn.clicked.connect(add_product)
     product_layout.addWidget(add_product_btn)
     
+    def import_products():
+        file_path, _ = QFileDialog.getOpenFileName(
+            worker_window,
+            "Импорт товаров",
+            "",
+            "Товары (*.csv *.json *.jsonl)"
+        )
+        if not file_path:
+            return
+        
+        def on_imported(summary):
+            message = describe_import(file_path, summary)
+            errors = "\n".join(f"Строка {line_no}: {error}" for line_no, error in summary['errors'][:10])
+            if errors:
+                message += f"\n\n{errors}"
+            QMessageBox.information(worker_window, "Импорт завершён", message)
+            refresh_products()
+            product_search.cache.clear()
+        
+        run_in_background(
+            run_import, host, file_path, user_data['id'],
+            on_result=on_imported,
+            on_error=error_reporter(worker_window, "Не удалось импортировать товары"),
+            busy=(import_btn, add_product_btn)
+        )
+    
+    import_btn = QPushButton("Импорт из файла (CSV/JSON)")
+    import_btn.clicked.connect(import_products)
+    product_layout.addWidget(import_btn)
+    
     layout.addLayout(product_layout)
     
     layout.addWidget(QLabel("<h3>Продать товар</h3>"))
     
     sale_layout = QVBoxLayout()
     
+    search_input = QLineEdit()
+    search_input.setPlaceholderText("Поиск: название, бренд, размер")
+    sale_layout.addWidget(search_input)
+    
+    search_results = QListWidget()
+    search_results.setMaximumHeight(120)
+    sale_layout.addWidget(search_results)
+    
+    more_results_btn = QPushButton("Показать ещё")
+    more_results_btn.setEnabled(False)
+    sale_layout.addWidget(more_results_btn)
+    
+    product_search = ProductSearch(
+        reads,
+        on_error=error_reporter(worker_window, "Не удалось выполнить поиск"),
+        parent=worker_window
+    )
+    
+    def show_search_results(query, offset, rows):
+        if offset == 0:
+            search_results.clear()
+        for row in rows:
+            item = QListWidgetItem(format_product(row))
+            item.setData(Qt.UserRole, row)
+            search_results.addItem(item)
+        more_results_btn.setEnabled(len(rows) == product_search.page_size)
+    
+    def choose_search_result(item):
+        row = item.data(Qt.UserRole)
+        # найденный товар мог ещё не подгрузиться в список
+        product_model.apply([row])
+        index = product_model.row_of(row[0])
+        if index >= 0:
+            product_combo.setCurrentIndex(index)
+    
+    search_input.textChanged.connect(product_search.set_query)
+    product_search.results_ready.connect(show_search_results)
+    more_results_btn.clicked.connect(product_search.more)
+    search_results.itemClicked.connect(choose_search_result)
+    
     product_combo = QComboBox()
     sale_layout.addWidget(QLabel("Выбери товар:"))
     sale_layout.addWidget(product_combo)
@@ -425,73 +478,123 @@ def open_worker_form(host, user_data):
     customer_input.setPlaceholderText("Имя покупателя (необязательно)")
     sale_layout.addWidget(customer_input)
     
+    product_model = ProductListModel(
+        reads,
+        on_error=error_reporter(worker_window, "Не удалось загрузить товары"),
+        parent=worker_window
+    )
+    product_combo.setModel(product_model)
+    
     def refresh_products():
-        product_combo.clear()
-        cur = conn.cursor()
-        cur.execute("SELECT id, name, brand, price, stock FROM products WHERE stock > 0")
-        products = cur.fetchall()
-        
-        for prod in products:
-            product_combo.addItem(
-                f"{prod[1]} ({prod[2]}) — {prod[3]} руб. (В наличии: {prod[4]})",
-                prod[0]
-            )
+        product_model.sync()
+        update_offline_label()
     
-    def sell_product():
+    sync_timer = QTimer(worker_window)
+    sync_timer.timeout.connect(refresh_products)
+    sync_timer.start(MODEL_CONFIG["sync_interval"] * 1000)
+    
+    cart = []
+    
+    cart_list = QListWidget()
+    
+    def add_to_cart():
         if product_combo.count() == 0:
             QMessageBox.warning(worker_window, "Ошибка", "Нет товаров в наличии")
             return
         
-        product_id = product_combo.currentData()
         quantity = quantity_input.value()
+        cart.append((product_combo.currentData(), quantity))
+        cart_list.addItem(f"{product_combo.currentText()} x{quantity}")
+        quantity_input.setValue(1)
+    
+    def clear_cart():
+        cart.clear()
+        cart_list.clear()
+    
+    def sell_product():
+        if cart:
+            items = list(cart)
+        elif product_combo.count() == 0:
+            QMessageBox.warning(worker_window, "Ошибка", "Нет товаров в наличии")
+            return
+        else:
+            items = [(product_combo.currentData(), quantity_input.value())]
+        
         customer = customer_input.text().strip()
         
-        try:
-            cur = conn.cursor()
-            
-            cur.execute("SELECT name, brand, size, price, stock FROM products WHERE id = ?", (product_id,))
-            product = cur.fetchone()
-            
-            if not product:
-                QMessageBox.warning(worker_window, "Ошибка", "Товар не найден")
-                return
-            
-            name, brand, size, price, stock = product
-            
-            if stock < quantity:
-                QMessageBox.warning(worker_window, "Ошибка", f"Недостаточно товара! В наличии: {stock}")
-                return
-            
-            total_price = price * quantity
-            
-            cur.execute(
-                """INSERT INTO sales (product_name, brand, size, quantity, unit_price, total_price, sold_by, customer_name)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (name, brand, size, quantity, price, total_price, user_data['id'], customer if customer else None)
-            )
-            
-            cur.execute(
-                "UPDATE products SET stock = stock - ? WHERE id = ?",
-                (quantity, product_id)
-            )
-            
-            conn.commit()
-            
-            log_activity(conn, user_data['id'], "Продан товар", f"{name} x{quantity}, Сумма: {total_price} руб.")
+        def on_sold(sale):
+            # офлайн-продажу запишет в журнал действий перенос на сервер, вместе с самой продажей
+            if not sale.get('offline'):
+                for line in sale['items']:
+                    log_activity(host, user_data['id'], "Продан товар", f"{line['name']} x{line['quantity']}, Сумма: {line['total_price']} руб.")
             
+            sold = "\n".join(f"{line['name']} x{line['quantity']}" for line in sale['items'])
+            offline_note = "\n\n📴 Сохранено в офлайн-журнал, уйдёт на сервер при появлении связи" if sale.get('offline') else ""
             QMessageBox.information(
                 worker_window,
                 "Успех",
-                f"Продано: {name} x{quantity}\nСумма: {total_price} руб."
+                f"Продано:\n{sold}\nСумма: {sale['total_price']} руб.{offline_note}"
             )
             
+            clear_cart()
             customer_input.clear()
             quantity_input.setValue(1)
+            product_model.apply([line['product'] for line in sale['items']])
+            product_search.cache.clear()
+        
+        report_error = error_reporter(worker_window, "Не удалось продать товар")
+        # ключ создаётся до попытки на сервер: если продажа там закоммитилась, а ответ
+        # не дошёл, перенос из журнала увидит ключ в offline_replays и не продаст второй раз
+        sale_key = new_key()
+        
+        def sell_offline():
+            lines = []
+            for product_id, quantity in items:
+                row = product_model.product(product_id)
+                if row is None:
+                    report_error(StoreError(f"Товар #{product_id} не загружен, продать без связи нельзя"))
+                    return
+                lines.append((row, quantity))
+            try:
+                sale = record_sale(journal, host, user_data['id'], lines, customer, sale_key)
+            except StoreError as e:
+                report_error(e)
+                return
+            syncer.wake()
+            update_offline_label()
+            on_sold(sale)
+        
+        def on_sell_failed(error):
+            if is_connection_error(error):
+                # сервер недоступен или не ответил — продажа не должна вставать
+                sell_offline()
+                return
+            report_error(error)
+            # остатки могли измениться на другой кассе
             refresh_products()
-            
-        except Exception as e:
-            conn.rollback()
-            QMessageBox.critical(worker_window, "Ошибка", f"Не удалось продать товар:\n{e}")
+        
+        if OFFLINE_CONFIG['mode'] == "always":
+            sell_offline()
+            return
+        
+        run_db(
+            pool, sales.sell_cart,
+            user_data['id'], items, customer, sale_key,
+            on_result=on_sold,
+            on_error=on_sell_failed,
+            busy=(sell_btn, add_to_cart_btn)
+        )
+    
+    add_to_cart_btn = QPushButton("В корзину")
+    add_to_cart_btn.clicked.connect(add_to_cart)
+    sale_layout.addWidget(add_to_cart_btn)
+    
+    sale_layout.addWidget(QLabel("Корзина:"))
+    sale_layout.addWidget(cart_list)
+    
+    clear_cart_btn = QPushButton("Очистить корзину")
+    clear_cart_btn.clicked.connect(clear_cart)
+    sale_layout.addWidget(clear_cart_btn)
     
     sell_btn = QPushButton("Продать")
     sell_btn.clicked.connect(sell_product)
@@ -500,8 +603,9 @@ def open_worker_form(host, user_data):
     layout.addLayout(sale_layout)
     
     def exit_worker():
-        log_activity(conn, user_data['id'], "Выход из панели работника")
-        conn.close()
+        log_activity(host, user_data['id'], "Выход из панели работника")
+        run_in_background(get_log_writer(host).flush)
+        sync_timer.stop()
         worker_window.close()
         window.show()
     
@@ -511,23 +615,104 @@ def open_worker_form(host, user_data):
     
     worker_window.setLayout(layout)
     
-    refresh_products()
+    product_model.fetchMore()
     
     window.hide()
     worker_window.show()
     
     return worker_window
 
-ui_file = QFile("Form.ui")
-if not ui_file.open(QFile.ReadOnly):
-    QMessageBox.critical(None, "Ошибка", "Не найден файл Form.ui")
-    sys.exit(1)
+def open_history_window(host, kind):
+    # kind: "sales" — история продаж, "activity" — журнал действий
+    is_sales = kind == "sales"
+    history_window = QWidget()
+    history_window.setWindowTitle("История продаж" if is_sales else "Журнал действий")
+    history_window.resize(1000, 700)
+    
+    layout = QVBoxLayout()
+    filters_layout = QHBoxLayout()
+    
+    period_check = QCheckBox("Период:")
+    period_check.setChecked(True)
+    filters_layout.addWidget(period_check)
+    
+    date_from = QDateEdit(QDate.currentDate().addDays(-30))
+    date_from.setCalendarPopup(True)
+    filters_layout.addWidget(date_from)
+    
+    filters_layout.addWidget(QLabel("—"))
+    
+    date_to = QDateEdit(QDate.currentDate())
+    date_to.setCalendarPopup(True)
+    filters_layout.addWidget(date_to)
+    
+    user_input = QLineEdit()
+    user_input.setPlaceholderText("Логин продавца" if is_sales else "Логин пользователя")
+    filters_layout.addWidget(user_input)
+    
+    text_input = QLineEdit()
+    text_input.setPlaceholderText("Начало названия товара" if is_sales else "Действие (точно)")
+    filters_layout.addWidget(text_input)
+    
+    apply_btn = QPushButton("Показать")
+    filters_layout.addWidget(apply_btn)
+    layout.addLayout(filters_layout)
+    
+    model = HistoryTableModel(
+        read_pool(host),
+        history.sales_page if is_sales else history.activity_page,
+        history.SALES_HEADERS if is_sales else history.ACTIVITY_HEADERS,
+        on_error=error_reporter(history_window, "Не удалось загрузить историю"),
+        parent=history_window
+    )
+    table = QTableView()
+    table.setModel(model)
+    # строки одной высоты: представление не измеряет каждую, прокрутка не зависит от объёма
+    table.verticalHeader().setDefaultSectionSize(24)
+    table.verticalHeader().hide()
+    table.horizontalHeader().setStretchLastSection(True)
+    layout.addWidget(table)
+    
+    def apply_filters():
+        filters = {}
+        if period_check.isChecked():
+            # конец периода включительно: до начала следующего дня
+            filters["date_from"] = date_from.date().startOfDay().toPython()
+            filters["date_to"] = date_to.date().addDays(1).startOfDay().toPython()
+        filters["seller" if is_sales else "user"] = user_input.text().strip()
+        filters["product" if is_sales else "action"] = text_input.text().strip()
+        model.set_filters(filters)
+    
+    apply_btn.clicked.connect(apply_filters)
+    user_input.returnPressed.connect(apply_filters)
+    text_input.returnPressed.connect(apply_filters)
+    
+    history_window.setLayout(layout)
+    apply_filters()
+    history_window.show()
+    
+    return history_window
 
-window = loader.load(ui_file)
-ui_file.close()
+def start_backup(host):
+    status_bar = window.statusBar()
+    
+    def on_done(result):
+        status_bar.showMessage(f"✅ Бэкап создан и проверен: {result['path']}", 15000)
+    
+    def on_failed(error):
+        status_bar.showMessage("❌ Ошибка бэкапа", 15000)
+        QMessageBox.critical(window, "Ошибка бэкапа", str(error))
+    
+    status_bar.showMessage("Бэкап запущен...")
+    run_in_background(
+        run_backup, host,
+        on_result=on_done,
+        on_error=on_failed,
+        on_progress=status_bar.showMessage
+    )
 
-window.tBoxServer.setEditable(True)
-window.tBoxServer.addItems(["localhost", "127.0.0.1"])
+# окна держим в глобальной ссылке, иначе их соберёт сборщик мусора
+open_windows = []
 
 def on_connect_clicked():
     host = window.tBoxServer.currentText().strip()
@@ -538,31 +723,58 @@ def on_connect_clicked():
         QMessageBox.warning(window, "Ошибка", "Заполни все поля")
         return
     
-    try:
-        conn = connect_db(host)
-    except Exception as e:
-        QMessageBox.critical(window, "Ошибка подключения", str(e))
-        return
-    
-    user = authenticate(conn, username, password)
-    if not user:
-        QMessageBox.warning(window, "Ошибка", "Неверный логин или пароль")
-        conn.close()
-        return
+    def on_authenticated(user):
+        if not user:
+            QMessageBox.warning(window, "Ошибка", "Неверный логин или пароль")
+            return
+        
+        if user['role'] == 'admin':
+            open_windows[:] = [open_admin_form(host, user)]
+        elif user['role'] == 'worker':
+            open_windows[:] = [open_worker_form(host, user)]
+        else:
+            QMessageBox.warning(window, "Ошибка", "Неизвестная роль пользователя")
     
-    conn.close()
+    def on_failed(error):
+        QMessageBox.critical(window, "Ошибка подключения", str(error))
     
-    if user['role'] == 'admin':
-        open_admin_form(host, user)
-    elif user['role'] == 'worker':
-        open_worker_form(host, user)
-    else:
-        QMessageBox.warning(window, "Ошибка", "Неизвестная роль пользователя")
-
-window.connBtn.clicked.connect(on_connect_clicked)
-window.setWindowTitle("Авторизация — Shoes Store")
-window.show()
+    run_db(
+        read_pool(host), store.authenticate, username, password, write_pool=write_pool(host),
+        on_result=on_authenticated,
+        on_error=on_failed,
+        busy=(window.connBtn,)
+    )
 
-init_database()
+def on_first_window():
+    if STARTUP_TIME_MODE:
+        now = time.perf_counter()
+        print(f"⏱ Импорт модулей: {(_imported_at - _started_at) * 1000:.0f} мс")
+        print(f"⏱ До первого окна: {(now - _started_at) * 1000:.0f} мс")
+        app.quit()
+        return
+    # схема проверяется уже после показа окна и не в GUI-потоке
+    run_in_background(init_database)
+    # /metrics на 127.0.0.1, если задан METRICS_CONFIG["http_port"]
+    serve_metrics()
 
-sys.exit(app.exec())
\ No newline at end of file
+# окно и цикл событий — только при запуске файла: пул процессов импорта сотрудников
+# на Windows заново импортирует __main__ в каждом дочернем процессе
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    
+    try:
+        window = load_ui("Form.ui", QMainWindow)
+    except OSError:
+        QMessageBox.critical(None, "Ошибка", "Не найден файл Form.ui")
+        sys.exit(1)
+    
+    window.tBoxServer.setEditable(True)
+    window.tBoxServer.addItems(["localhost", "127.0.0.1"])
+    window.connBtn.clicked.connect(on_connect_clicked)
+    window.setWindowTitle("Авторизация — Shoes Store")
+    window.show()
+    
+    # срабатывает на первой итерации цикла событий, когда окно уже отрисовано
+    QTimer.singleShot(0, on_first_window)
+    
+    sys.exit(app.exec())
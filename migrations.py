@@ -0,0 +1,447 @@
+from backends import get_backend
+from db import DB_CONFIG, get_pool, get_admin_pool
+from log_partitions import partition_activity_logs
+from passwords import hash_password
+
+# Каждая миграция — (версия, описание, шаги). Шаг — SQL-строка или функция от курсора;
+# если диалекты расходятся — словарь {"postgresql": шаг, "sqlite": шаг}, отсутствующий
+# ключ означает «в этом диалекте пропустить». SERIAL, BYTEA и GRANT бэкенд переводит сам.
+# Ранние миграции написаны через IF NOT EXISTS, чтобы лечь поверх баз,
+# созданных старым init_database() и init_admin.py.
+
+
+def _seed_admin(cur):
+    cur.execute("SELECT id FROM users WHERE username = 'admin'")
+    if not cur.fetchone():
+        cur.execute(
+            "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+            ("admin", hash_password("admin123"), "admin")
+        )
+        print("✅ Админ создан: admin/admin123")
+
+
+def _relax_sales_sqlite(cur):
+    # SQLite не умеет ALTER COLUMN ... DROP NOT NULL: пересобираем sales с теми же id
+    cur.execute("PRAGMA table_info(sales)")
+    columns = {row[1]: row for row in cur.fetchall()}
+    if not columns["product_name"][3]:
+        return
+    cur.execute("""
+        CREATE TABLE sales_rebuilt (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_name VARCHAR(100),
+            brand VARCHAR(50),
+            size VARCHAR(10),
+            quantity INTEGER NOT NULL,
+            unit_price DECIMAL(10, 2) NOT NULL,
+            total_price DECIMAL(10, 2) NOT NULL,
+            sold_by INTEGER REFERENCES users(id),
+            customer_name VARCHAR(100),
+            sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            product_id INTEGER REFERENCES products(id),
+            label_id INTEGER REFERENCES sale_labels(id)
+        )
+    """)
+    names = ", ".join(name for name in columns)
+    cur.execute(f"INSERT INTO sales_rebuilt ({names}) SELECT {names} FROM sales")
+    cur.execute("DROP TABLE sales")
+    cur.execute("ALTER TABLE sales_rebuilt RENAME TO sales")
+    cur.execute("CREATE INDEX sales_date_id_idx ON sales (sale_date, id)")
+    cur.execute("CREATE INDEX sales_seller_date_idx ON sales (sold_by, sale_date, id)")
+
+
+# Старые столбцы продажи для отчётов и внешних выгрузок. У новых продаж текст берётся
+# из products, у перенесённых sales_backfill.py без товара — из словаря sale_labels,
+# у ещё не перенесённых — из самой строки.
+SALES_COMPAT_VIEW = """
+    VIEW sales_compat AS
+    SELECT s.id,
+           COALESCE(s.product_name, p.name, l.product_name) AS product_name,
+           COALESCE(s.brand, p.brand, NULLIF(l.brand, '')) AS brand,
+           COALESCE(s.size, p.size, NULLIF(l.size, '')) AS size,
+           s.quantity, s.unit_price, s.total_price, s.sold_by, s.customer_name, s.sale_date,
+           s.product_id, s.label_id
+    FROM sales s
+    LEFT JOIN products p ON p.id = s.product_id
+    LEFT JOIN sale_labels l ON l.id = s.label_id
+"""
+
+
+def _merge_duplicate_products(cur):
+    # перед уникальным индексом: импорт не узнавал товар с NULL в бренде или размере
+    # и добавлял его заново. Дубли сливаются в товар с меньшим id — остатки складываются,
+    # продажи переводятся на него
+    cur.execute("""
+        SELECT MIN(id), name, coalesce(brand, ''), coalesce(size, ''), SUM(stock)
+        FROM products
+        GROUP BY name, coalesce(brand, ''), coalesce(size, '')
+        HAVING COUNT(*) > 1
+    """)
+    for keep_id, name, brand, size, stock in cur.fetchall():
+        duplicates = "name = ? AND coalesce(brand, '') = ? AND coalesce(size, '') = ? AND id <> ?"
+        params = (name, brand, size, keep_id)
+        cur.execute(
+            f"UPDATE sales SET product_id = ? WHERE product_id IN (SELECT id FROM products WHERE {duplicates})",
+            (keep_id,) + params
+        )
+        cur.execute(f"DELETE FROM products WHERE {duplicates}", params)
+        cur.execute("UPDATE products SET stock = ? WHERE id = ?", (stock, keep_id))
+
+
+MIGRATIONS = [
+    (1, "Начальная схема", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role VARCHAR(20) NOT NULL CHECK (role IN ('admin', 'worker')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # init_admin.py создавал users без created_at
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+        """
+        CREATE TABLE IF NOT EXISTS employees (
+            id SERIAL PRIMARY KEY,
+            full_name VARCHAR(100) NOT NULL,
+            position VARCHAR(50),
+            birth_date DATE,
+            phone VARCHAR(20),
+            email VARCHAR(100),
+            photo BYTEA,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            brand VARCHAR(50),
+            size VARCHAR(10),
+            price DECIMAL(10, 2) NOT NULL,
+            stock INTEGER DEFAULT 0,
+            added_by INTEGER REFERENCES users(id),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales (
+            id SERIAL PRIMARY KEY,
+            product_name VARCHAR(100) NOT NULL,
+            brand VARCHAR(50),
+            size VARCHAR(10),
+            quantity INTEGER NOT NULL,
+            unit_price DECIMAL(10, 2) NOT NULL,
+            total_price DECIMAL(10, 2) NOT NULL,
+            sold_by INTEGER REFERENCES users(id),
+            customer_name VARCHAR(100),
+            sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS activity_logs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            action VARCHAR(50) NOT NULL,
+            details TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # права по умолчанию покрывают и таблицы из следующих миграций
+        f"GRANT USAGE ON SCHEMA public TO {DB_CONFIG['user']}",
+        f"GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA public TO {DB_CONFIG['user']}",
+        f"GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA public TO {DB_CONFIG['user']}",
+        f"ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT, INSERT, UPDATE, DELETE ON TABLES TO {DB_CONFIG['user']}",
+        f"ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT USAGE, SELECT ON SEQUENCES TO {DB_CONFIG['user']}",
+        _seed_admin,
+    ]),
+    (2, "products.updated_at для дельта-синхронизации", [
+        {
+            "postgresql": "ALTER TABLE products ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+            # SQLite не добавляет столбец с непостоянным DEFAULT, время ставят триггеры ниже
+            "sqlite": "ALTER TABLE products ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT '1970-01-01 00:00:00'",
+        },
+        {"sqlite": "UPDATE products SET updated_at = CURRENT_TIMESTAMP"},
+        "CREATE INDEX IF NOT EXISTS products_updated_at_idx ON products (updated_at)",
+        {
+            "postgresql": """
+            CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+            BEGIN
+                NEW.updated_at = CURRENT_TIMESTAMP;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            "sqlite": """
+            CREATE TRIGGER IF NOT EXISTS products_stamp_updated_at
+            AFTER INSERT ON products FOR EACH ROW
+            BEGIN
+                UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END
+            """,
+        },
+        {
+            "postgresql": """
+            CREATE OR REPLACE TRIGGER products_touch_updated_at
+            BEFORE UPDATE ON products
+            FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+            """,
+            # своё UPDATE триггер не перезапускает: recursive_triggers по умолчанию выключены
+            "sqlite": """
+            CREATE TRIGGER IF NOT EXISTS products_touch_updated_at
+            AFTER UPDATE ON products FOR EACH ROW
+            WHEN NEW.updated_at IS OLD.updated_at
+            BEGIN
+                UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END
+            """,
+        },
+    ]),
+    (3, "Индексы поиска товаров", [
+        # триграммы для подстрок, text_pattern_ops для префиксов; в SQLite поиск идёт перебором
+        {"postgresql": "CREATE EXTENSION IF NOT EXISTS pg_trgm"},
+        {"postgresql": """
+        CREATE INDEX IF NOT EXISTS products_search_trgm_idx ON products
+        USING gin ((lower(name || ' ' || coalesce(brand, '') || ' ' || coalesce(size, ''))) gin_trgm_ops)
+        WHERE stock > 0
+        """},
+        {"postgresql": "CREATE INDEX IF NOT EXISTS products_name_prefix_idx ON products (lower(name) text_pattern_ops) WHERE stock > 0"},
+        {"postgresql": "CREATE INDEX IF NOT EXISTS products_brand_prefix_idx ON products (lower(brand) text_pattern_ops) WHERE stock > 0"},
+        {"postgresql": "CREATE INDEX IF NOT EXISTS products_size_prefix_idx ON products (lower(size) text_pattern_ops) WHERE stock > 0"},
+    ]),
+    (4, "Индексы продаж, журнала и товаров в наличии", [
+        "CREATE INDEX IF NOT EXISTS sales_sale_date_idx ON sales (sale_date)",
+        "CREATE INDEX IF NOT EXISTS sales_sold_by_idx ON sales (sold_by)",
+        "CREATE INDEX IF NOT EXISTS activity_logs_user_timestamp_idx ON activity_logs (user_id, timestamp)",
+        # постраничная загрузка каталога: WHERE stock > 0 AND id > ? ORDER BY id
+        "CREATE INDEX IF NOT EXISTS products_in_stock_idx ON products (id) WHERE stock > 0",
+    ]),
+    (5, "Индекс для сопоставления товаров при импорте", [
+        "CREATE INDEX IF NOT EXISTS products_identity_idx ON products (name, brand, size)",
+    ]),
+    (6, "Дневные итоги продаж", [
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily_product (
+            day DATE NOT NULL,
+            product_name VARCHAR(100) NOT NULL,
+            brand VARCHAR(50) NOT NULL,
+            size VARCHAR(10) NOT NULL,
+            quantity BIGINT NOT NULL,
+            revenue DECIMAL(14, 2) NOT NULL,
+            sales_count BIGINT NOT NULL,
+            PRIMARY KEY (day, product_name, brand, size)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily_brand (
+            day DATE NOT NULL,
+            brand VARCHAR(50) NOT NULL,
+            quantity BIGINT NOT NULL,
+            revenue DECIMAL(14, 2) NOT NULL,
+            sales_count BIGINT NOT NULL,
+            PRIMARY KEY (day, brand)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily_seller (
+            day DATE NOT NULL,
+            sold_by INTEGER NOT NULL,
+            quantity BIGINT NOT NULL,
+            revenue DECIMAL(14, 2) NOT NULL,
+            sales_count BIGINT NOT NULL,
+            PRIMARY KEY (day, sold_by)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name VARCHAR(50) PRIMARY KEY,
+            last_sale_id BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "INSERT INTO rollup_state (name) VALUES ('sales') ON CONFLICT DO NOTHING",
+    ]),
+    (7, "Фото сотрудников отдельно от анкет, с миниатюрами", [
+        """
+        CREATE TABLE IF NOT EXISTS employee_photos (
+            id SERIAL PRIMARY KEY,
+            sha256 CHAR(64) UNIQUE NOT NULL,
+            photo BYTEA NOT NULL,
+            thumbnail BYTEA NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            size_bytes INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # JPEG уже сжат; без повторного сжатия substring() читает фото по частям
+        {"postgresql": "ALTER TABLE employee_photos ALTER COLUMN photo SET STORAGE EXTERNAL"},
+        "ALTER TABLE employees ADD COLUMN IF NOT EXISTS photo_id INTEGER REFERENCES employee_photos(id)",
+    ]),
+    (8, "Помесячные разделы activity_logs", [
+        {"postgresql": partition_activity_logs},
+    ]),
+    (9, "Ключи продаж, перенесённых из офлайн-журнала касс", [
+        """
+        CREATE TABLE IF NOT EXISTS offline_replays (
+            key VARCHAR(36) PRIMARY KEY,
+            kind VARCHAR(20) NOT NULL,
+            conflict TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (10, "Индексы для постраничной истории продаж и журнала", [
+        # ключ страницы — (время, id): WHERE (sale_date, id) < (?, ?) ORDER BY sale_date DESC, id DESC
+        "CREATE INDEX IF NOT EXISTS sales_date_id_idx ON sales (sale_date, id)",
+        "CREATE INDEX IF NOT EXISTS sales_seller_date_idx ON sales (sold_by, sale_date, id)",
+        {"postgresql": """
+        CREATE INDEX IF NOT EXISTS sales_product_prefix_idx ON sales
+        (lower(product_name) text_pattern_ops, sale_date, id)
+        """},
+        # на секционированной таблице индекс создаётся во всех разделах
+        "CREATE INDEX IF NOT EXISTS activity_logs_timestamp_id_idx ON activity_logs (timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS activity_logs_user_timestamp_id_idx ON activity_logs (user_id, timestamp, id)",
+        # новые индексы покрывают старые своим началом — не платим за них на каждой продаже
+        # и записи журнала: sales(sale_date) — sales_date_id_idx, sales(sold_by) —
+        # sales_seller_date_idx, activity_logs(user_id, timestamp) — activity_logs_user_timestamp_id_idx
+        "DROP INDEX IF EXISTS sales_sale_date_idx",
+        "DROP INDEX IF EXISTS sales_sold_by_idx",
+        "DROP INDEX IF EXISTS activity_logs_user_timestamp_idx",
+    ]),
+    (11, "Продажи ссылаются на товар по id, старые названия — в словаре", [
+        # названия, бренды и размеры из старых продаж, для которых не нашлось товара
+        """
+        CREATE TABLE IF NOT EXISTS sale_labels (
+            id SERIAL PRIMARY KEY,
+            product_name VARCHAR(100) NOT NULL,
+            brand VARCHAR(50) NOT NULL DEFAULT '',
+            size VARCHAR(10) NOT NULL DEFAULT '',
+            UNIQUE (product_name, brand, size)
+        )
+        """,
+        # без значения по умолчанию: в PostgreSQL столбцы добавляются без перезаписи таблицы
+        {"postgresql": "ALTER TABLE sales ADD COLUMN IF NOT EXISTS product_id INTEGER REFERENCES products(id)"},
+        {"postgresql": "ALTER TABLE sales ADD COLUMN IF NOT EXISTS label_id INTEGER REFERENCES sale_labels(id)"},
+        {"postgresql": "ALTER TABLE sales ALTER COLUMN product_name DROP NOT NULL",
+         "sqlite": _relax_sales_sqlite},
+        "CREATE INDEX IF NOT EXISTS sales_product_date_idx ON sales (product_id, sale_date, id)",
+        "CREATE INDEX IF NOT EXISTS sales_label_date_idx ON sales (label_id, sale_date, id)",
+        # префиксный индекс нужен только ещё не перенесённым строкам и тает вместе с ними
+        {"postgresql": "DROP INDEX IF EXISTS sales_product_prefix_idx"},
+        {"postgresql": """
+        CREATE INDEX IF NOT EXISTS sales_legacy_name_prefix_idx ON sales
+        (lower(product_name) text_pattern_ops, sale_date, id)
+        WHERE product_name IS NOT NULL
+        """},
+        {"postgresql": "CREATE INDEX IF NOT EXISTS sale_labels_name_prefix_idx ON sale_labels (lower(product_name) text_pattern_ops)"},
+        {"postgresql": "CREATE OR REPLACE" + SALES_COMPAT_VIEW,
+         "sqlite": "CREATE" + SALES_COMPAT_VIEW.replace("VIEW", "VIEW IF NOT EXISTS", 1)},
+        """
+        CREATE TABLE IF NOT EXISTS backfill_state (
+            name VARCHAR(50) PRIMARY KEY,
+            last_id BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "INSERT INTO backfill_state (name) VALUES ('sales_product_id') ON CONFLICT DO NOTHING",
+    ]),
+    (12, "Товар уникален по названию, бренду и размеру", [
+        _merge_duplicate_products,
+        # пустой бренд и NULL — один и тот же товар; по этому индексу импорт делает
+        # INSERT ... ON CONFLICT и сопоставляет товары вместо products_identity_idx (миграция 5)
+        "CREATE UNIQUE INDEX IF NOT EXISTS products_identity_key ON products (name, coalesce(brand, ''), coalesce(size, ''))",
+        "DROP INDEX IF EXISTS products_identity_idx",
+    ]),
+    (13, "Префиксный индекс названий всех товаров для истории продаж", [
+        # products_name_prefix_idx (миграция 3) частичный, WHERE stock > 0: фильтр истории
+        # по товару ищет и распроданные товары, и без полного индекса читал бы всю таблицу
+        {"postgresql": "CREATE INDEX IF NOT EXISTS products_name_all_prefix_idx ON products (lower(name) text_pattern_ops)"},
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT MAX(version) FROM schema_version")
+        row = cur.fetchone()
+    except Exception:
+        # таблицы ещё нет — база не размечена
+        conn.rollback()
+        return 0
+    return row[0] or 0
+
+
+def is_current(host=None):
+    try:
+        with get_pool(host or DB_CONFIG["server"]).connection() as conn:
+            return current_version(conn) >= LATEST_VERSION
+    except Exception:
+        return False
+
+
+def _run_step(cur, step, backend):
+    if isinstance(step, dict):
+        step = step.get(backend.dialect)
+        if step is None:
+            return
+    if callable(step):
+        step(cur)
+    else:
+        backend.run_ddl(cur, step)
+
+
+def apply_migrations(conn, backend, on_applied=None):
+    # все непримененные миграции на данном соединении; возвращает число применённых
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+    applied = 0
+    for version, description, steps in MIGRATIONS:
+        # блокировка на транзакцию: две кассы не применят одну миграцию дважды;
+        # SQLite и так пускает только одного писателя
+        if backend.dialect == "postgresql":
+            cur.execute("SELECT pg_advisory_xact_lock(20240601)")
+        if current_version(conn) >= version:
+            conn.rollback()
+            continue
+        for step in steps:
+            _run_step(cur, step, backend)
+        cur.execute(
+            "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+            (version, description)
+        )
+        conn.commit()
+        applied += 1
+        if on_applied:
+            on_applied(version, description)
+    return applied
+
+
+def migrate(host=None):
+    # быстрая проверка правами приложения: на актуальной базе суперпользователь не нужен
+    if is_current(host):
+        return 0
+
+    def report(version, description):
+        print(f"✅ Миграция {version}: {description}")
+
+    with get_admin_pool(host).connection() as conn:
+        return apply_migrations(conn, get_backend(DB_CONFIG["backend"]), report)
+
+
+if __name__ == "__main__":
+    count = migrate()
+    print(f"✅ Схема актуальна (версия {LATEST_VERSION}, применено миграций: {count})")
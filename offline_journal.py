@@ -0,0 +1,390 @@
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import store
+from db import DB_CONFIG, dialect_of, is_connection_error
+from replicas import write_pool
+from store import StoreError
+
+# Офлайн-журнал кассы: продажа и добавление товара сначала надёжно пишутся в локальный
+# SQLite-файл с ключом идемпотентности, а фоновый поток переносит их на сервер пачками.
+# Сервер запоминает применённые ключи в offline_replays, поэтому повтор после обрыва связи
+# не проведёт продажу дважды.
+
+OFFLINE_CONFIG = {
+    "mode": "fallback",          # fallback — в журнал, только если сервер недоступен; always — всегда
+    "path": "offline_journal.sqlite3",
+    "batch_size": 50,            # записей за одно подключение к серверу
+    "sync_interval": 10,         # секунд между попытками синхронизации
+    "max_backoff": 300,          # предел паузы после неудачных попыток
+    "conflict_policy": "force"   # товара на сервере не хватило: force — провести, обнулив остаток
+                                 # и записав конфликт; hold — оставить запись менеджеру
+}
+
+JOURNAL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS journal (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT UNIQUE NOT NULL,
+        host TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        payload TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT
+    )
+"""
+
+
+def new_key():
+    # ключ создаётся до первой попытки записи на сервер и идёт с ней в offline_replays:
+    # если сервер успел закоммитить, а ответ потерялся, перенос из журнала ничего не повторит
+    return str(uuid.uuid4())
+
+
+class OfflineJournal:
+    def __init__(self, path=None):
+        self.path = path or OFFLINE_CONFIG["path"]
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        # FULL: запись переживает выключение питания сразу после «Продано»
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = FULL")
+        self._conn.execute(JOURNAL_SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS journal_pending_idx ON journal (host, status, id)")
+        self._conn.commit()
+
+    def append(self, host, kind, user_id, payload, key=None):
+        # key — тот же ключ, с которым касса уже пробовала записать на сервер
+        key = key or new_key()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO journal (key, host, kind, user_id, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, host, kind, user_id, json.dumps(payload, ensure_ascii=False),
+                 datetime.now().isoformat(" ", timespec="seconds"))
+            )
+            self._conn.commit()
+        return key
+
+    def pending(self, host, limit):
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT id, key, kind, user_id, payload, created_at FROM journal
+                   WHERE host = ? AND status = 'pending'
+                   ORDER BY id
+                   LIMIT ?""",
+                (host, limit)
+            ).fetchall()
+        return [(entry_id, key, kind, user_id, json.loads(payload), datetime.fromisoformat(created_at))
+                for entry_id, key, kind, user_id, payload, created_at in rows]
+
+    def mark(self, entry_id, status, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE journal SET status = ?, error = ?, attempts = attempts + 1 WHERE id = ?",
+                (status, error, entry_id)
+            )
+            self._conn.commit()
+
+    def failed_attempt(self, entry_id, error):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE journal SET attempts = attempts + 1, error = ? WHERE id = ?",
+                (error, entry_id)
+            )
+            self._conn.commit()
+
+    def requeue_conflicts(self, host):
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE journal SET status = 'pending' WHERE host = ? AND status = 'conflict'", (host,)
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def counts(self, host):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM journal WHERE host = ? GROUP BY status", (host,)
+            ).fetchall()
+        return dict(rows)
+
+    def conflicts(self, host):
+        with self._lock:
+            return self._conn.execute(
+                """SELECT key, kind, payload, created_at, error FROM journal
+                   WHERE host = ? AND status = 'conflict'
+                   ORDER BY id""",
+                (host,)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def record_sale(journal, host, user_id, lines, customer=None, key=None):
+    # lines — [(строка товара из кэша, количество)]; остаток проверяем по кэшу кассы,
+    # окончательно его сверит сервер при переносе
+    merged = {}
+    for row, quantity in lines:
+        product_id = row[0]
+        if product_id in merged:
+            merged[product_id] = (row, merged[product_id][1] + quantity)
+        else:
+            merged[product_id] = (tuple(row), quantity)
+
+    items = []
+    for row, quantity in merged.values():
+        product_id, name, brand, size, price, stock, updated_at = row
+        if quantity > stock:
+            raise StoreError(f"Недостаточно товара «{name}»! В наличии: {stock}")
+        items.append({
+            "product_id": product_id,
+            "name": name,
+            "quantity": quantity,
+            "unit_price": price,
+            "total_price": price * quantity,
+            "product": (product_id, name, brand, size, price, stock - quantity, updated_at)
+        })
+
+    key = journal.append(host, "sale", user_id, {
+        "customer": customer or None,
+        "items": [{"product_id": item["product_id"], "quantity": item["quantity"],
+                   "unit_price": str(item["unit_price"])} for item in items],
+        # записи журнала действий: без связи их не записать, они уходят на сервер вместе с продажей
+        "log": [f"{item['name']} x{item['quantity']}, Сумма: {item['total_price']} руб." for item in items]
+    }, key)
+    return {"items": items, "total_price": sum(item["total_price"] for item in items),
+            "offline": True, "key": key}
+
+
+def record_product(journal, host, user_id, name, brand, size, price, stock, key=None):
+    return journal.append(host, "product", user_id, {
+        "name": name, "brand": brand, "size": size, "price": str(price), "stock": stock
+    }, key)
+
+
+def _replay_sale(conn, cur, key, user_id, payload, sold_at, policy):
+    quantities = {}
+    prices = {}
+    for item in payload["items"]:
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+        prices[item["product_id"]] = item["unit_price"]
+
+    ids = sorted(quantities)
+    lock = " FOR UPDATE" if dialect_of(conn) == "postgresql" else ""
+    # строки блокируются по возрастанию id: две кассы не возьмут их накрест
+    cur.execute(
+        f"""SELECT id, name, stock FROM products
+            WHERE id IN ({", ".join(["?"] * len(ids))})
+            ORDER BY id{lock}""",
+        ids
+    )
+    products = {row[0]: row for row in cur.fetchall()}
+
+    missing = [product_id for product_id in ids if product_id not in products]
+    if missing:
+        conn.rollback()
+        return "conflict", f"товары удалены с сервера: {missing}"
+
+    shortages = [f"«{products[pid][1]}»: продано {quantities[pid]}, на сервере {products[pid][2]}"
+                 for pid in ids if products[pid][2] < quantities[pid]]
+    if shortages and policy == "hold":
+        conn.rollback()
+        return "conflict", "; ".join(shortages)
+
+    for product_id in ids:
+        stock = products[product_id][2]
+        quantity = quantities[product_id]
+        # товар уже у покупателя: при нехватке остаток обнуляется, а не уходит в минус
+        cur.execute("UPDATE products SET stock = ? WHERE id = ?", (max(stock - quantity, 0), product_id))
+        # цена — та, по которой касса продала, а не текущая серверная
+        unit_price = Decimal(prices[product_id])
+        cur.execute(
+            """INSERT INTO sales (product_id, quantity, unit_price, total_price,
+                                  sold_by, customer_name, sale_date)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (product_id, quantity, unit_price, unit_price * quantity,
+             user_id, payload["customer"], sold_at)
+        )
+    # в журнал действий — в той же транзакции и со временем продажи на кассе
+    for details in payload.get("log", []):
+        cur.execute(
+            "INSERT INTO activity_logs (user_id, action, details, timestamp) VALUES (?, ?, ?, ?)",
+            (user_id, "Продан товар", details, sold_at)
+        )
+    if shortages:
+        cur.execute("UPDATE offline_replays SET conflict = ? WHERE key = ?", ("; ".join(shortages), key))
+    conn.commit()
+    return "applied", "; ".join(shortages) or None
+
+
+def replay_entry(conn, key, kind, user_id, payload, created_at, policy=None):
+    # ("applied" | "duplicate" | "conflict", подробности); сетевые ошибки пробрасываются
+    policy = policy or OFFLINE_CONFIG["conflict_policy"]
+    cur = conn.cursor()
+    try:
+        if not store.claim_key(cur, key, kind):
+            conn.rollback()
+            return "duplicate", None
+        if kind == "sale":
+            return _replay_sale(conn, cur, key, user_id, payload, created_at, policy)
+        if kind == "product":
+            # add_product коммитит и ключ вместе с товаром
+            store.add_product(conn, user_id, payload["name"], payload["brand"], payload["size"],
+                              Decimal(payload["price"]), payload["stock"])
+            return "applied", None
+        conn.rollback()
+        return "conflict", f"неизвестный тип записи '{kind}'"
+    except StoreError as e:
+        conn.rollback()
+        return "conflict", str(e)
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+
+
+class JournalSyncer(threading.Thread):
+    def __init__(self, journal, host, pool=None):
+        super().__init__(name=f"offline-sync-{host}", daemon=True)
+        self.journal = journal
+        self.host = host
+        # перенесённые продажи — свои записи кассы: чтения после них идут на основной сервер
+        self.pool = pool or write_pool(host)
+        self.applied = 0
+        self.conflicts = 0
+        self.last_error = None
+        self._wake = threading.Event()
+        self._stopped = False
+        self._delay = OFFLINE_CONFIG["sync_interval"]
+
+    def wake(self):
+        self._wake.set()
+
+    def run(self):
+        while not self._stopped:
+            self._wake.wait(self._delay)
+            self._wake.clear()
+            if self._stopped:
+                break
+            try:
+                while self.sync_once():
+                    pass
+                self.last_error = None
+                self._delay = OFFLINE_CONFIG["sync_interval"]
+            except Exception as e:
+                # сервер недоступен: пробуем реже, пока связь не вернётся
+                self.last_error = str(e)
+                self._delay = min(self._delay * 2, OFFLINE_CONFIG["max_backoff"])
+
+    def sync_once(self):
+        entries = self.journal.pending(self.host, OFFLINE_CONFIG["batch_size"])
+        if not entries:
+            return 0
+        with self.pool.connection() as conn:
+            for entry_id, key, kind, user_id, payload, created_at in entries:
+                try:
+                    status, details = replay_entry(conn, key, kind, user_id, payload, created_at)
+                except Exception as e:
+                    if is_connection_error(e):
+                        # связь пропала: запись остаётся в очереди, run() подождёт подольше
+                        self.journal.failed_attempt(entry_id, str(e))
+                        raise
+                    # ошибка в самих данных (слишком длинное название, нарушенное ограничение)
+                    # повторится при каждой попытке — отдаём запись менеджеру и идём дальше
+                    status, details = "conflict", f"{type(e).__name__}: {e}"
+                if status == "conflict":
+                    self.conflicts += 1
+                    self.journal.mark(entry_id, "conflict", details)
+                else:
+                    self.applied += 1
+                    self.journal.mark(entry_id, "synced", details)
+        return len(entries)
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        self.join(timeout=5)
+
+
+_journal = None
+_syncers = {}
+_lock = threading.Lock()
+
+
+def get_journal():
+    global _journal
+    with _lock:
+        if _journal is None:
+            _journal = OfflineJournal()
+        return _journal
+
+
+def get_syncer(host):
+    journal = get_journal()
+    with _lock:
+        syncer = _syncers.get(host)
+        if syncer is None:
+            syncer = JournalSyncer(journal, host)
+            syncer.start()
+            _syncers[host] = syncer
+        return syncer
+
+
+def close_syncers():
+    with _lock:
+        syncers = list(_syncers.values())
+        _syncers.clear()
+    for syncer in syncers:
+        syncer.stop()
+
+
+atexit.register(close_syncers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-журнал продаж кассы")
+    parser.add_argument("--host", default=DB_CONFIG["server"])
+    parser.add_argument("--sync", action="store_true", help="перенести накопленное на сервер сейчас")
+    parser.add_argument("--retry-conflicts", action="store_true",
+                        help="провести конфликтные записи с обнулением остатка (политика force)")
+    args = parser.parse_args()
+
+    if not os.path.exists(OFFLINE_CONFIG["path"]):
+        print("Журнал пуст")
+        return 0
+    journal = get_journal()
+    if args.retry_conflicts:
+        OFFLINE_CONFIG["conflict_policy"] = "force"
+        print(f"Возвращено в очередь: {journal.requeue_conflicts(args.host)}")
+    if args.sync or args.retry_conflicts:
+        syncer = JournalSyncer(journal, args.host)
+        try:
+            while syncer.sync_once():
+                pass
+        except Exception as e:
+            print(f"❌ Сервер недоступен: {e}")
+        print(f"✅ Перенесено: {syncer.applied}, конфликтов: {syncer.conflicts}")
+
+    counts = journal.counts(args.host)
+    print(f"В очереди: {counts.get('pending', 0)}, перенесено: {counts.get('synced', 0)}, "
+          f"конфликтов: {counts.get('conflict', 0)}")
+    for key, kind, payload, created_at, error in journal.conflicts(args.host):
+        print(f"⚠️ {created_at} {kind} {key}: {error}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PASSWORD_CONFIG = {
+    "rounds": 12,         # None — подобрать через calibrate_rounds() под target_ms
+    "target_ms": 250,     # желаемое время одной проверки пароля
+    "min_rounds": 10,
+    "max_rounds": 16
+}
+
+# bcrypt отпускает GIL, поэтому обычных потоков достаточно
+_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="bcrypt")
+_calibrated_rounds = None
+
+
+def _bcrypt():
+    # bcrypt нужен только при входе и создании пользователей, не при старте
+    import bcrypt
+    return bcrypt
+
+
+def _measure_ms(rounds):
+    bcrypt = _bcrypt()
+    password_hash = bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds))
+    start = time.perf_counter()
+    bcrypt.checkpw(b"calibration", password_hash)
+    return (time.perf_counter() - start) * 1000
+
+
+def calibrate_rounds(target_ms=None):
+    target_ms = target_ms or PASSWORD_CONFIG["target_ms"]
+    rounds = PASSWORD_CONFIG["min_rounds"]
+    elapsed = _measure_ms(rounds)
+    # каждый следующий раунд удваивает работу, поэтому дальше можно не мерить
+    while rounds < PASSWORD_CONFIG["max_rounds"] and elapsed * 2 <= target_ms:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+def target_rounds():
+    global _calibrated_rounds
+    if PASSWORD_CONFIG["rounds"]:
+        return PASSWORD_CONFIG["rounds"]
+    if _calibrated_rounds is None:
+        _calibrated_rounds = calibrate_rounds()
+    return _calibrated_rounds
+
+
+def hash_password(password, rounds=None):
+    bcrypt = _bcrypt()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds or target_rounds())).decode()
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    return _bcrypt().checkpw(password.encode(), password_hash.encode())
+
+
+def hash_rounds(password_hash):
+    # формат: $2b$12$<соль и хеш>
+    try:
+        return int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash, rounds=None):
+    return hash_rounds(password_hash) != (rounds or target_rounds())
+
+
+def submit(fn, *args):
+    # работа с bcrypt вне потока, который держит соединение с БД или цикл событий
+    return _executor.submit(fn, *args)
+
+
+def hash_password_async(password, rounds=None):
+    return submit(hash_password, password, rounds)
+
+
+def verify_password_async(password, password_hash):
+    return submit(verify_password, password, password_hash)
+
+
+if __name__ == "__main__":
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else PASSWORD_CONFIG["target_ms"]
+    rounds = calibrate_rounds(target)
+    print(f"Подходящая стоимость bcrypt: {rounds} (проверка ≈ {_measure_ms(rounds):.0f} мс, цель {target} мс)")
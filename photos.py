@@ -0,0 +1,156 @@
+import hashlib
+import os
+
+# Qt нужен только для пережатия картинок: store, сервис касс и консольные утилиты
+# импортируют этот модуль и без PySide6, пока не обрабатывают новое фото
+
+PHOTO_CONFIG = {
+    "max_side": 1024,        # длинная сторона полноразмерного фото после пережатия
+    "quality": 85,
+    "thumb_side": 128,
+    "thumb_quality": 80,
+    "max_file_size": 20 * 1024 * 1024,
+    "read_chunk": 64 * 1024  # чтение файла и выдача фото из БД кусками
+}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(PHOTO_CONFIG["read_chunk"]), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_jpeg(image, side, quality):
+    from PySide6.QtCore import QBuffer, QByteArray, QIODevice, Qt
+    if image.width() > side or image.height() > side:
+        image = image.scaled(side, side, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "JPEG", quality)
+    buffer.close()
+    return bytes(data), image.width(), image.height()
+
+
+def prepare_photo(source):
+    # source — путь к файлу или уже прочитанные байты
+    from PySide6.QtCore import Qt
+    from PySide6.QtGui import QImage, QPainter
+    image = QImage.fromData(source) if isinstance(source, bytes) else QImage(source)
+    if image.isNull():
+        raise ValueError("Не удалось прочитать изображение")
+    # JPEG без альфы: прозрачный фон PNG иначе станет чёрным
+    if image.hasAlphaChannel():
+        background = QImage(image.size(), QImage.Format_RGB32)
+        background.fill(Qt.white)
+        painter = QPainter(background)
+        painter.drawImage(0, 0, image)
+        painter.end()
+        image = background
+    photo, width, height = _encode_jpeg(image, PHOTO_CONFIG["max_side"], PHOTO_CONFIG["quality"])
+    thumbnail, _, _ = _encode_jpeg(image, PHOTO_CONFIG["thumb_side"], PHOTO_CONFIG["thumb_quality"])
+    return photo, thumbnail, width, height
+
+
+def _check_size(path):
+    if os.path.getsize(path) > PHOTO_CONFIG["max_file_size"]:
+        raise ValueError("Файл фото слишком большой")
+
+
+def store_photo(conn, path):
+    # возвращает id в employee_photos; одинаковые файлы хранятся один раз
+    _check_size(path)
+    return _store(conn, file_sha256(path), path)
+
+
+def prepare_photo_file(path):
+    # для пакетной загрузки: тяжёлую часть можно выполнить в другом процессе,
+    # а в БД записать через store_prepared_photo
+    _check_size(path)
+    return (file_sha256(path), *prepare_photo(path))
+
+
+def store_photo_bytes(conn, data):
+    return _store(conn, hashlib.sha256(data).hexdigest(), data)
+
+
+def _store(conn, sha256, source):
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM employee_photos WHERE sha256 = ?", (sha256,))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    return store_prepared_photo(conn, sha256, *prepare_photo(source))
+
+
+def store_prepared_photo(conn, sha256, photo, thumbnail, width, height):
+    cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO employee_photos (sha256, photo, thumbnail, width, height, size_bytes)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT (sha256) DO UPDATE SET sha256 = EXCLUDED.sha256
+           RETURNING id""",
+        (sha256, photo, thumbnail, width, height, len(photo))
+    )
+    return cur.fetchone()[0]
+
+
+def load_thumbnail(conn, photo_id):
+    cur = conn.cursor()
+    cur.execute("SELECT thumbnail FROM employee_photos WHERE id = ?", (photo_id,))
+    row = cur.fetchone()
+    return bytes(row[0]) if row else None
+
+
+def iter_photo(conn, photo_id, chunk_size=None):
+    # полноразмерное фото по запросу и кусками: substring по bytea с STORAGE EXTERNAL
+    # читает из TOAST только нужные страницы
+    chunk_size = chunk_size or PHOTO_CONFIG["read_chunk"]
+    cur = conn.cursor()
+    cur.execute("SELECT size_bytes FROM employee_photos WHERE id = ?", (photo_id,))
+    row = cur.fetchone()
+    if not row:
+        return
+    for offset in range(0, row[0], chunk_size):
+        cur.execute(
+            "SELECT substring(photo FROM ? FOR ?) FROM employee_photos WHERE id = ?",
+            (offset + 1, chunk_size, photo_id)
+        )
+        yield bytes(cur.fetchone()[0])
+
+
+def load_photo(conn, photo_id):
+    return b"".join(iter_photo(conn, photo_id))
+
+
+def migrate_legacy_photos(pool, batch_size=20):
+    # переносит фото, сохранённые до появления employee_photos, из employees.photo;
+    # нечитаемые картинки остаются в старой колонке
+    after_id = 0
+    moved = 0
+    while True:
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """SELECT id, photo FROM employees
+                   WHERE photo IS NOT NULL AND photo_id IS NULL AND id > ?
+                   ORDER BY id LIMIT ?""",
+                (after_id, batch_size)
+            )
+            rows = cur.fetchall()
+            for employee_id, data in rows:
+                after_id = employee_id
+                try:
+                    photo_id = store_photo_bytes(conn, bytes(data))
+                except ValueError:
+                    continue
+                cur.execute(
+                    "UPDATE employees SET photo_id = ?, photo = NULL WHERE id = ?",
+                    (photo_id, employee_id)
+                )
+                conn.commit()
+                moved += 1
+        if len(rows) < batch_size:
+            return moved
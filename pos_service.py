@@ -0,0 +1,340 @@
+import argparse
+import asyncio
+import json
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
+
+import sales
+import store
+from activity_log import get_log_writer
+from bulk_import import validate_row
+from employee_import import validate_employee
+from db import DB_CONFIG, get_pool
+from passwords import needs_rehash, verify_password_async
+from replicas import read_pool, write_pool
+from query_metrics import action
+from store import StoreError
+
+# HTTP/JSON-сервис для сканеров и веб-касс: та же логика, что и в окне работника.
+# Соединения держит asyncio, а запросы к БД идут в пул потоков размером с пул соединений:
+# сотни терминалов ждут своей очереди в цикле событий, не занимая соединений.
+# Асинхронного драйвера БД нет: pyodbc, psycopg и sqlite3 блокируют поток, поэтому запросы
+# идут через run_in_executor в тот же ConnectionPool, что у GUI и консольных утилит.
+# Так работают все три бэкенда, а число потоков не даёт занять больше соединений, чем есть.
+#   POST /auth        {"username", "password"}            -> {"token", "user"}
+#   POST /sales       {"items": [{"product_id", "quantity"}], "customer"}
+#   POST /products    {"name", "brand", "size", "price", "stock"}
+#   GET  /products/7  остаток и цена товара
+#   GET  /products?q=nike 42&limit=20&offset=0
+#   POST /employees   (только admin) поля анкеты, как в админ-панели
+#   GET  /health
+# Авторизация: заголовок «Authorization: Bearer <token>».
+
+SERVICE_CONFIG = {
+    "listen": "0.0.0.0",
+    "port": 8080,
+    "db_workers": 10,            # одновременных запросов к БД = размер пула соединений
+    "session_ttl": 12 * 3600,    # секунд жизни токена
+    "session_purge": 300,        # секунд между чистками истёкших токенов
+    "max_body": 1024 * 1024,
+    "keepalive_timeout": 30
+}
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+               404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+               500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def product_json(row):
+    product_id, name, brand, size, price, stock, updated_at = row
+    return {"id": product_id, "name": name, "brand": brand, "size": size,
+            "price": price, "stock": stock, "updated_at": updated_at}
+
+
+def _positive_int(value, field):
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise HttpError(400, f"{field} должно быть целым числом больше нуля")
+    return value
+
+
+class PosService:
+    def __init__(self, db_host, db_workers=None):
+        self.db_host = db_host
+        workers = db_workers or SERVICE_CONFIG["db_workers"]
+        self.pool = get_pool(db_host, max_size=workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pos-db")
+        self.sessions = {}    # token -> (user, истекает)
+        self.purged_at = time.monotonic()
+        self.routes = {
+            ("POST", "/auth"): self.auth,
+            ("POST", "/sales"): self.sell,
+            ("POST", "/products"): self.add_product,
+            ("GET", "/products"): self.search_products,
+            ("POST", "/employees"): self.add_employee,
+            ("GET", "/health"): self.health,
+        }
+
+    async def db(self, fn, *args, pool=None, **kwargs):
+        # как run_db в GUI: соединение из пула, действие подписано для query_metrics;
+        # по умолчанию — основной сервер
+        pool = pool or self.pool
+
+        def job():
+            with action(fn.__name__), pool.connection() as conn:
+                return fn(conn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, job)
+
+    def reads(self, user=None):
+        # кассир читает с реплики, пока она не отстаёт от его собственных продаж
+        return read_pool(self.db_host, session=user and user["id"])
+
+    def writes(self, user):
+        return write_pool(self.db_host, session=user["id"])
+
+    def log(self, user, what, details=""):
+        get_log_writer(self.db_host).log(user["id"], what, details)
+
+    def user_for(self, headers, role=None):
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        session = self.sessions.get(token) if scheme.lower() == "bearer" else None
+        if session is None or session[1] < time.monotonic():
+            self.sessions.pop(token, None)
+            raise HttpError(401, "Нужна авторизация: POST /auth")
+        user = session[0]
+        if role and user["role"] != role:
+            raise HttpError(403, "Недостаточно прав")
+        return user
+
+    def purge_sessions(self):
+        # токен, которым больше не пользуются, иначе остался бы в памяти навсегда
+        now = time.monotonic()
+        if now - self.purged_at < SERVICE_CONFIG["session_purge"]:
+            return
+        self.purged_at = now
+        for token in [token for token, (_, expires) in self.sessions.items() if expires < now]:
+            del self.sessions[token]
+
+    async def auth(self, request):
+        body = request["json"]
+        username, password = body.get("username"), body.get("password")
+        if not username or not password:
+            raise HttpError(400, "Нужны username и password")
+        row = await self.db(store.find_login, username, pool=self.reads())
+        # bcrypt — в своём пуле потоков: соединение с БД на время проверки свободно
+        if not row or not await asyncio.wrap_future(verify_password_async(password, row[1])):
+            raise HttpError(401, "Неверный логин или пароль")
+        user_id, password_hash, role = row
+        if needs_rehash(password_hash):
+            store.rehash_in_background(self.pool, user_id, password, password_hash)
+        user = {"id": user_id, "role": role, "username": username}
+        self.purge_sessions()
+        token = secrets.token_urlsafe(32)
+        self.sessions[token] = (user, time.monotonic() + SERVICE_CONFIG["session_ttl"])
+        self.log(user, "Вход через POS API")
+        return 200, {"token": token, "user": user}
+
+    async def sell(self, request):
+        user = self.user_for(request["headers"])
+        body = request["json"]
+        lines = body.get("items")
+        if not isinstance(lines, list) or not lines:
+            raise HttpError(400, "items — непустой список {product_id, quantity}")
+        items = [(_positive_int(line.get("product_id"), "product_id"),
+                  _positive_int(line.get("quantity"), "quantity"))
+                 for line in lines if isinstance(line, dict)]
+        if len(items) != len(lines):
+            raise HttpError(400, "Каждая строка items — объект {product_id, quantity}")
+        customer = (body.get("customer") or "").strip() or None
+
+        sale = await self.db(sales.sell_cart, user["id"], items, customer, pool=self.writes(user))
+        for line in sale["items"]:
+            self.log(user, "Продан товар", f"{line['name']} x{line['quantity']}, Сумма: {line['total_price']} руб.")
+        return 201, {
+            "items": [{**{k: v for k, v in line.items() if k != "product"},
+                       "product": product_json(line["product"])} for line in sale["items"]],
+            "total_price": sale["total_price"]
+        }
+
+    async def add_product(self, request):
+        user = self.user_for(request["headers"])
+        try:
+            name, brand, size, price, stock = validate_row(request["json"])
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        product = await self.db(store.add_product, user["id"], name, brand, size, float(price), stock,
+                                pool=self.writes(user))
+        self.log(user, "Добавлен товар", f"{name} ({brand}), {price} руб.")
+        return 201, product_json(product)
+
+    async def get_product(self, request, product_id):
+        user = self.user_for(request["headers"])
+        product = await self.db(store.get_product, product_id, pool=self.reads(user))
+        if product is None:
+            raise HttpError(404, f"Товар #{product_id} не найден")
+        return 200, product_json(product)
+
+    async def search_products(self, request):
+        user = self.user_for(request["headers"])
+        query = request["query"]
+        text = query.get("q", [""])[0]
+        try:
+            limit = min(int(query.get("limit", ["20"])[0]), 100)
+            offset = int(query.get("offset", ["0"])[0])
+        except ValueError:
+            raise HttpError(400, "limit и offset — целые числа")
+        rows = (await self.db(store.search_products, text, limit, offset, pool=self.reads(user))
+                if text.strip() else [])
+        return 200, {"items": [product_json(row) for row in rows]}
+
+    async def add_employee(self, request):
+        user = self.user_for(request["headers"], role="admin")
+        # те же проверки, что и при импорте из файла: длины полей, дата рождения; без фото
+        fields = {key: value for key, value in request["json"].items() if key != "photo"}
+        try:
+            employee = validate_employee(fields)
+        except ValueError as e:
+            raise HttpError(400, str(e))
+
+        user_id = await self.db(
+            store.add_employee, employee["full_name"], employee["position"], employee["birth_date"],
+            employee["phone"], employee["email"], employee["username"], employee["password"],
+            pool=self.writes(user)
+        )
+        self.log(user, "Добавлен сотрудник", f"ФИО: {employee['full_name']}, Логин: {employee['username']}")
+        return 201, {"user_id": user_id}
+
+    async def health(self, request):
+        return 200, {"status": "ok", "sessions": len(self.sessions)}
+
+    async def dispatch(self, request):
+        method, path = request["method"], request["path"]
+        if path.startswith("/products/") and method == "GET":
+            try:
+                product_id = int(path.rsplit("/", 1)[1])
+            except ValueError:
+                raise HttpError(404, "Нет такого адреса")
+            return await self.get_product(request, product_id)
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.routes):
+                raise HttpError(405, "Метод не поддерживается")
+            raise HttpError(404, "Нет такого адреса")
+        return await handler(request)
+
+    async def read_request(self, reader):
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), SERVICE_CONFIG["keepalive_timeout"])
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length") or 0)
+        if length > SERVICE_CONFIG["max_body"]:
+            raise HttpError(413, "Слишком большой запрос")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        request = {"method": method.upper(), "path": url.path.rstrip("/") or "/",
+                   "query": parse_qs(url.query), "headers": headers, "version": version, "json": {}}
+        if body:
+            try:
+                request["json"] = json.loads(body)
+            except ValueError:
+                raise HttpError(400, "Тело запроса — не JSON")
+            if not isinstance(request["json"], dict):
+                raise HttpError(400, "Тело запроса — JSON-объект")
+        return request
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = True
+                try:
+                    try:
+                        request = await self.read_request(reader)
+                    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                        # клиент закрыл соединение или молчит дольше keepalive_timeout
+                        return
+                    keep_alive = (request["version"] == "HTTP/1.1"
+                                  and request["headers"].get("connection", "").lower() != "close")
+                    status, payload = await self.dispatch(request)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                    if status == 413:
+                        # тело не прочитано: следующий запрос начался бы с его середины
+                        keep_alive = False
+                except StoreError as e:
+                    # нехватка товара, занятый логин — та же проверка, что и в GUI
+                    status, payload = 409, {"error": str(e)}
+                except (ValueError, asyncio.LimitOverrunError):
+                    status, payload, keep_alive = 400, {"error": "Некорректный HTTP-запрос"}, False
+                except Exception as e:
+                    print(f"⚠️ POS API: {e}")
+                    status, payload = 500, {"error": "Внутренняя ошибка сервера"}
+
+                body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, listen, port):
+        server = await asyncio.start_server(self.handle_connection, listen, port, backlog=1024)
+        print(f"✅ POS API слушает {listen}:{port}, БД {self.db_host}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        get_log_writer(self.db_host).flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON-сервис для касс и сканеров")
+    parser.add_argument("--host", default=DB_CONFIG["server"], help="сервер БД")
+    parser.add_argument("--listen", default=SERVICE_CONFIG["listen"])
+    parser.add_argument("--port", type=int, default=SERVICE_CONFIG["port"])
+    parser.add_argument("--db-workers", type=int, default=SERVICE_CONFIG["db_workers"])
+    args = parser.parse_args()
+
+    service = PosService(args.host, args.db_workers)
+    try:
+        asyncio.run(service.serve(args.listen, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,183 @@
+from bisect import bisect_left
+from datetime import timedelta
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+
+import store
+from tasks import run_db
+
+MODEL_CONFIG = {
+    "page_size": 200,      # сколько товаров подгружать за раз
+    "sync_interval": 15,   # секунд между дельта-синхронизациями
+    "sync_overlap": 60     # секунд перекрытия при дельта-синхронизации: updated_at
+                           # ставится в начале транзакции, поздний коммит может «отстать»
+}
+
+
+class ProductCache:
+    def __init__(self):
+        self.products = {}    # id -> (id, name, brand, size, price, stock, updated_at)
+        self.ids = []         # отсортированные id товаров в наличии
+        self.last_id = 0      # до какого id дочитан каталог постранично
+        self.synced_at = None # время сервера, с которого дельта-синхронизация берёт изменения
+
+    def is_stale(self, row):
+        # ответ синхронизации мог прийти позже локальной записи того же товара
+        old = self.products.get(row[0])
+        return old is not None and old[6] is not None and row[6] is not None and row[6] < old[6]
+
+    def change_for(self, row):
+        # (действие, позиция) для модели или None, если в списке ничего не меняется
+        product_id, stock = row[0], row[5]
+        pos = bisect_left(self.ids, product_id)
+        listed = pos < len(self.ids) and self.ids[pos] == product_id
+
+        if stock > 0 and listed:
+            return ("update", pos) if self.products.get(product_id) != row else None
+        if stock > 0:
+            return ("insert", pos)
+        if listed:
+            return ("remove", pos)
+        return None
+
+    def apply(self, row, change):
+        product_id = row[0]
+        self.products[product_id] = row
+        if change is None:
+            return
+        action, pos = change
+        if action == "insert":
+            self.ids.insert(pos, product_id)
+        elif action == "remove":
+            del self.ids[pos]
+
+    def row_at(self, pos):
+        return self.products[self.ids[pos]]
+
+
+def first_page(conn, limit):
+    # время сервера берётся до чтения: всё, что изменится, пока дочитываются остальные
+    # страницы, заберёт дельта-синхронизация
+    return store.server_time(conn), store.list_products(conn, 0, limit)
+
+
+def changes_since(conn, since):
+    return store.server_time(conn), store.product_changes(conn, since)
+
+
+def format_product(row):
+    _, name, brand, _, price, stock, _ = row
+    return f"{name} ({brand}) — {price} руб. (В наличии: {stock})"
+
+
+class ProductListModel(QAbstractListModel):
+    def __init__(self, pool, page_size=None, on_error=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.page_size = page_size or MODEL_CONFIG["page_size"]
+        self.on_error = on_error
+        self.cache = ProductCache()
+        self._complete = False
+        self._loading = False
+        self._syncing = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.cache.ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.cache.ids):
+            return None
+        row = self.cache.row_at(index.row())
+        if role == Qt.DisplayRole:
+            return format_product(row)
+        if role == Qt.UserRole:
+            return row[0]
+        return None
+
+    def product(self, product_id):
+        return self.cache.products.get(product_id)
+
+    def row_of(self, product_id):
+        pos = bisect_left(self.cache.ids, product_id)
+        if pos < len(self.cache.ids) and self.cache.ids[pos] == product_id:
+            return pos
+        return -1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._complete
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._complete or self._loading:
+            return
+        self._loading = True
+        if self.cache.synced_at is None:
+            run_db(
+                self.pool, first_page, self.page_size,
+                on_result=self._on_first_page,
+                on_error=self._on_failed
+            )
+            return
+        run_db(
+            self.pool, store.list_products,
+            self.cache.last_id, self.page_size,
+            on_result=self._on_page,
+            on_error=self._on_failed
+        )
+
+    def _on_first_page(self, result):
+        self.cache.synced_at, rows = result
+        self._on_page(rows)
+
+    def _on_page(self, rows):
+        self._loading = False
+        self.apply(rows)
+        if rows:
+            self.cache.last_id = max(self.cache.last_id, rows[-1][0])
+        if len(rows) < self.page_size:
+            self._complete = True
+
+    def _on_failed(self, error):
+        self._loading = False
+        self._syncing = False
+        if self.on_error:
+            self.on_error(error)
+
+    def apply(self, rows):
+        for row in rows:
+            row = tuple(row)
+            if self.cache.is_stale(row):
+                continue
+            change = self.cache.change_for(row)
+            action, pos = change or (None, None)
+            if action == "insert":
+                self.beginInsertRows(QModelIndex(), pos, pos)
+            elif action == "remove":
+                self.beginRemoveRows(QModelIndex(), pos, pos)
+
+            self.cache.apply(row, change)
+
+            if action == "insert":
+                self.endInsertRows()
+            elif action == "remove":
+                self.endRemoveRows()
+            elif action == "update":
+                index = self.index(pos)
+                self.dataChanged.emit(index, index)
+
+    def sync(self):
+        # до первой страницы синхронизировать не с чем: она сама принесёт свежий каталог
+        if self._syncing or self._loading or self.cache.synced_at is None:
+            return
+        since = self.cache.synced_at - timedelta(seconds=MODEL_CONFIG["sync_overlap"])
+        self._syncing = True
+        run_db(
+            self.pool, changes_since, since,
+            on_result=self._on_changes,
+            on_error=self._on_failed
+        )
+
+    def _on_changes(self, result):
+        self._syncing = False
+        synced_at, rows = result
+        self.apply(rows)
+        self.cache.synced_at = max(self.cache.synced_at, synced_at)
@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+import store
+from tasks import run_db
+
+SEARCH_CONFIG = {
+    "debounce_ms": 250,   # пауза после последнего нажатия перед запросом
+    "min_length": 2,
+    "page_size": 20,
+    "cache_size": 256,    # запросов в клиентском кеше
+    "cache_ttl": 30       # секунд, остатки в выдаче не должны сильно устаревать
+}
+
+
+def normalize_query(text):
+    return " ".join(text.lower().split())
+
+
+class SearchCache:
+    def __init__(self, size=None, ttl=None):
+        self.size = size or SEARCH_CONFIG["cache_size"]
+        self.ttl = ttl or SEARCH_CONFIG["cache_ttl"]
+        self._entries = OrderedDict()   # (запрос, offset) -> (время, строки)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, rows = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return rows
+
+    def put(self, key, rows):
+        self._entries[key] = (time.monotonic(), rows)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class ProductSearch(QObject):
+    # запрос, offset, строки в формате store.PRODUCT_COLUMNS
+    results_ready = Signal(str, int, object)
+
+    def __init__(self, pool, on_error=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.on_error = on_error
+        self.page_size = SEARCH_CONFIG["page_size"]
+        self.cache = SearchCache()
+        self.query = ""
+        self.offset = 0
+        self._pending = ""
+        self._seq = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(SEARCH_CONFIG["debounce_ms"])
+        self._timer.timeout.connect(self._run_pending)
+
+    def set_query(self, text):
+        self._pending = normalize_query(text)
+        self._timer.start()
+
+    def _run_pending(self):
+        self.search(self._pending, 0)
+
+    def more(self):
+        self.search(self.query, self.offset + self.page_size)
+
+    def search(self, query, offset):
+        self.query = query
+        self.offset = offset
+        self._seq += 1
+        seq = self._seq
+
+        if len(query) < SEARCH_CONFIG["min_length"]:
+            self.results_ready.emit(query, offset, [])
+            return
+
+        key = (query, offset)
+        rows = self.cache.get(key)
+        if rows is not None:
+            self.results_ready.emit(query, offset, rows)
+            return
+
+        def on_rows(rows):
+            rows = [tuple(row) for row in rows]
+            self.cache.put(key, rows)
+            # ответ на устаревший запрос только кешируем
+            if seq == self._seq:
+                self.results_ready.emit(query, offset, rows)
+
+        run_db(
+            self.pool, store.search_products, query, self.page_size, offset,
+            on_result=on_rows,
+            on_error=self.on_error
+        )
@@ -0,0 +1,257 @@
+import atexit
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_CONFIG = {
+    "enabled": True,
+    "slow_ms": 200,                   # запросы дольше пишутся в slow_log
+    "slow_log": "slow_queries.log",
+    "export_path": "metrics.prom",    # текстовый формат Prometheus, пишется при выходе; None — не писать
+    "http_port": None,                # например 9108 — отдавать /metrics с 127.0.0.1
+    "buckets_ms": (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+}
+
+_WHITESPACE = re.compile(r"\s+")
+# VALUES (?, ?), (?, ?), ... и IN (?, ?, ?) дают новый текст на каждый размер пачки
+_REPEATED_TUPLES = re.compile(r"(\([^()]*\))(?:\s*,\s*\([^()]*\))+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_sql(sql):
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _REPEATED_TUPLES.sub(r"\1, ...", sql)
+    sql = _PLACEHOLDER_LIST.sub("(?, ...)", sql)
+    return sql[:160]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+class QueryMetrics:
+    def __init__(self, config=None):
+        self.config = config or METRICS_CONFIG
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.statements = {}      # текст запроса -> Histogram, мс
+        self.actions = {}         # действие -> (Histogram обращений к БД, Histogram длительности)
+        self.slow_count = 0
+
+    def _action(self):
+        return getattr(self._local, "action", None)
+
+    @contextmanager
+    def action(self, name):
+        # вложенные действия считаются во внешнем: «продажа» включает всё, что она вызвала
+        outer = self._action()
+        if outer is not None:
+            yield
+            return
+        self._local.action = name
+        self._local.round_trips = 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            round_trips = self._local.round_trips
+            self._local.action = None
+            with self._lock:
+                trips, durations = self.actions.setdefault(
+                    name, (Histogram((1, 2, 3, 5, 10, 20, 50, 100)), Histogram(self.config["buckets_ms"]))
+                )
+                trips.observe(round_trips)
+                durations.observe(elapsed)
+
+    def record(self, sql, elapsed_ms, param_count=0):
+        if self._action() is not None:
+            self._local.round_trips += 1
+        statement = normalize_sql(sql)
+        with self._lock:
+            histogram = self.statements.get(statement)
+            if histogram is None:
+                histogram = self.statements[statement] = Histogram(self.config["buckets_ms"])
+            histogram.observe(elapsed_ms)
+        if elapsed_ms >= self.config["slow_ms"]:
+            self._log_slow(statement, elapsed_ms, param_count)
+
+    def _log_slow(self, statement, elapsed_ms, param_count):
+        # значения параметров не пишем: там пароли, телефоны, имена покупателей
+        line = (f"{datetime.now():%Y-%m-%d %H:%M:%S} {elapsed_ms:.0f} ms "
+                f"[{self._action() or '-'}] {statement} -- параметров: {param_count} (скрыты)\n")
+        with self._lock:
+            self.slow_count += 1
+            try:
+                with open(self.config["slow_log"], "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"⚠️ Не удалось записать медленный запрос: {e}")
+
+    def render(self):
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, "shop_query_duration_ms", "Длительность запросов к БД, мс",
+                                    "statement", self.statements.items())
+            self._render_histograms(lines, "shop_action_round_trips", "Обращений к БД за действие",
+                                    "action", ((name, pair[0]) for name, pair in self.actions.items()))
+            self._render_histograms(lines, "shop_action_duration_ms", "Длительность действия, мс",
+                                    "action", ((name, pair[1]) for name, pair in self.actions.items()))
+            lines.append("# TYPE shop_slow_queries_total counter")
+            lines.append(f"shop_slow_queries_total {self.slow_count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histograms(lines, metric, help_text, label, items):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for name, histogram in items:
+            value = _escape_label(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{label}="{value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label}="{value}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{{label}="{value}"}} {histogram.total:.3f}')
+            lines.append(f'{metric}_count{{{label}="{value}"}} {histogram.count}')
+
+    def write(self, path=None):
+        path = path or self.config["export_path"]
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.render())
+        # os.replace, чтобы сборщик метрик не прочитал недописанный файл
+        os.replace(path + ".tmp", path)
+        return path
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, metrics):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_metrics", metrics)
+
+    def execute(self, sql, *params):
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *params)
+        finally:
+            count = len(params[0]) if len(params) == 1 and isinstance(params[0], (list, tuple)) else len(params)
+            self._metrics.record(sql, (time.perf_counter() - start) * 1000, count)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, seq_of_params)
+        finally:
+            self._metrics.record(sql, (time.perf_counter() - start) * 1000,
+                                 sum(len(p) for p in seq_of_params))
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # cur.fast_executemany = True и подобное должно попасть в настоящий курсор
+        setattr(self._cursor, name, value)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, metrics):
+        object.__setattr__(self, "raw", conn)
+        object.__setattr__(self, "_metrics", metrics)
+
+    def cursor(self):
+        return InstrumentedCursor(self.raw.cursor(), self._metrics)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            self.raw.commit()
+        finally:
+            self._metrics.record("COMMIT", (time.perf_counter() - start) * 1000)
+
+    def rollback(self):
+        start = time.perf_counter()
+        try:
+            self.raw.rollback()
+        finally:
+            self._metrics.record("ROLLBACK", (time.perf_counter() - start) * 1000)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.raw, name, value)
+
+
+metrics = QueryMetrics()
+
+
+def instrument(conn):
+    if not METRICS_CONFIG["enabled"]:
+        return conn
+    return InstrumentedConnection(conn, metrics)
+
+
+def action(name):
+    return metrics.action(name)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port=None):
+    port = port or METRICS_CONFIG["http_port"]
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def _write_on_exit():
+    if METRICS_CONFIG["export_path"] and metrics.statements:
+        try:
+            metrics.write()
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить метрики: {e}")
+
+
+atexit.register(_write_on_exit)
@@ -0,0 +1,281 @@
+import argparse
+import atexit
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from db import DB_CONFIG, get_pool
+
+# Чтения — на реплики, записи — на основной сервер. Адрес сервера — «хост» или «хост:порт»,
+# так что два локальных экземпляра PostgreSQL проверяются без отдельной машины:
+#   pg_basebackup -h localhost -U postgres -D replica_data -R -X stream
+#   pg_ctl -D replica_data -o "-p 5433" start
+#   REPLICA_CONFIG["replicas"] = {"localhost": ["localhost:5433"]}
+#   python replicas.py --host localhost
+# Фоновый поток раз в check_interval берёт позицию WAL основного сервера и спрашивает у каждой
+# реплики, реплика ли она, до какой позиции проиграла журнал и насколько отстаёт. Чтение
+# уходит на реплику, если она жива, отстаёт не больше max_lag и уже проиграла последнюю
+# запись этой кассы; иначе — на основной сервер.
+
+REPLICA_CONFIG = {
+    "replicas": {},          # основной сервер -> [реплики]
+    "max_lag": 5.0,          # секунд отставания, после которых реплика не получает чтения
+    "check_interval": 5.0,   # секунд между проверками
+    "stale_after": 3,        # проверок подряд без ответа, после которых данные о реплике не верны
+    "catch_up_grace": 0.2    # секунд на то, чтобы догнать позицию, снятую с основного перед проверкой
+}
+
+# Догнала ли реплика основной, видно только по позиции WAL самого основного: на реплике
+# receive_lsn = replay_lsn и тогда, когда приёмник WAL отключился и больше ничего не получает.
+# Время последней проигранной транзакции нужно, только если реплика позади: на
+# простаивающем основном оно стареет, хотя реплика догнала его полностью.
+PRIMARY_LSN_SQL = "SELECT CAST(pg_current_wal_lsn() AS TEXT)"
+LAG_SQL = """
+    SELECT pg_is_in_recovery(),
+           CAST(pg_last_wal_replay_lsn() AS TEXT),
+           EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+"""
+
+
+def parse_lsn(text):
+    # «16/B374D848» -> число, чтобы позиции можно было сравнивать
+    high, low = text.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+class ReplicaState:
+    def __init__(self, host):
+        self.host = host
+        self.healthy = False     # до первой проверки читаем с основного
+        self.lag = None
+        self.replayed_at = 0.0   # monotonic-время, до которого реплика проиграла записи
+        self.checked_at = 0.0
+        self.error = None
+
+
+class ReplicaRouter:
+    def __init__(self, primary, replicas=(), max_lag=None, check_interval=None):
+        self.primary = primary
+        self.replicas = [ReplicaState(host) for host in replicas]
+        self.max_lag = REPLICA_CONFIG["max_lag"] if max_lag is None else max_lag
+        self.check_interval = REPLICA_CONFIG["check_interval"] if check_interval is None else check_interval
+        self._writes = {}        # сеанс (None — вся касса) -> monotonic-время последней записи
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        if self.replicas and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"replica-check-{self.primary}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self.check_all()
+            self._wake.wait(self.check_interval)
+
+    def primary_lsn(self):
+        # (позиция WAL основного, monotonic-время до запроса): всё, что закоммичено раньше
+        # этого времени, лежит не дальше этой позиции
+        sampled_at = time.monotonic()
+        with get_pool(self.primary).connection() as conn:
+            cur = conn.cursor()
+            cur.execute(PRIMARY_LSN_SQL)
+            return parse_lsn(cur.fetchone()[0]), sampled_at
+
+    def check(self, state, primary=None):
+        # primary — результат primary_lsn(); replayed_at считается от момента, когда снята
+        # позиция основного, а не от начала проверки: запись между ними реплика может не иметь
+        try:
+            if primary is None:
+                primary = self.primary_lsn()
+            primary_lsn, sampled_at = primary
+            with get_pool(state.host, min_size=0).connection() as conn:
+                cur = conn.cursor()
+                cur.execute(LAG_SQL)
+                in_recovery, replayed, lag = cur.fetchone()
+                if in_recovery and replayed and parse_lsn(replayed) < primary_lsn:
+                    # основной пишет прямо сейчас: живая реплика догоняет его за миллисекунды
+                    conn.rollback()
+                    time.sleep(REPLICA_CONFIG["catch_up_grace"])
+                    cur.execute(LAG_SQL)
+                    in_recovery, replayed, lag = cur.fetchone()
+        except Exception as e:
+            self.mark_down(state.host, e)
+            return state
+        caught_up = bool(replayed) and parse_lsn(replayed) >= primary_lsn
+        with self._lock:
+            state.checked_at = sampled_at
+            if not in_recovery:
+                # повышенная или чужая база — её данные могут разойтись с основной
+                state.healthy, state.lag, state.error = False, None, "не в режиме реплики"
+            elif caught_up:
+                # проиграно всё, что основной закоммитил до того, как сняли его позицию
+                state.healthy, state.lag, state.error = True, 0.0, None
+                state.replayed_at = sampled_at
+            elif lag is None:
+                state.healthy, state.lag, state.error = False, None, "ещё ничего не проиграла"
+            else:
+                # позади основного: приёмник WAL отключён или не успевает
+                state.healthy, state.lag, state.error = True, float(lag), None
+                state.replayed_at = sampled_at - state.lag
+        return state
+
+    def check_all(self):
+        try:
+            primary = self.primary_lsn()
+        except Exception as e:
+            # без позиции основного отставание не измерить: данные о репликах устареют
+            # через stale_after проверок, и чтения уйдут на основной
+            with self._lock:
+                for state in self.replicas:
+                    state.error = f"основной сервер недоступен: {e}"
+            return list(self.replicas)
+        return [self.check(state, primary) for state in self.replicas]
+
+    def mark_down(self, host, error):
+        with self._lock:
+            for state in self.replicas:
+                if state.host == host:
+                    state.healthy, state.error = False, str(error)
+
+    def note_write(self, session=None):
+        with self._lock:
+            self._writes[session] = time.monotonic()
+
+    def read_hosts(self, session=None):
+        # подходящие реплики по кругу, основной сервер — всегда последним
+        now = time.monotonic()
+        stale = self.check_interval * REPLICA_CONFIG["stale_after"]
+        with self._lock:
+            wrote_at = max(self._writes.get(session, 0.0), self._writes.get(None, 0.0))
+            ready = [state.host for state in self.replicas
+                     if state.healthy and state.lag <= self.max_lag
+                     and now - state.checked_at <= stale
+                     and state.replayed_at >= wrote_at]
+        if ready:
+            shift = next(self._turn) % len(ready)
+            ready = ready[shift:] + ready[:shift]
+        return ready + [self.primary]
+
+    def status(self):
+        with self._lock:
+            return [(state.host, state.healthy, state.lag, state.error) for state in self.replicas]
+
+
+class ReadPool:
+    # пул для чтений: тот же connection(), что и у ConnectionPool, но с выбором сервера
+    def __init__(self, router, session=None):
+        self.router = router
+        self.session = session
+
+    @contextmanager
+    def connection(self):
+        for host in self.router.read_hosts(self.session):
+            pool = get_pool(host)
+            try:
+                conn = pool.acquire()
+            except TimeoutError:
+                # реплика жива, но занята — не выключаем её, просто читаем с основного
+                if host == self.router.primary:
+                    raise
+                continue
+            except Exception as e:
+                if host == self.router.primary:
+                    raise
+                self.router.mark_down(host, e)
+                continue
+            break
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+
+class WritePool:
+    # пул основного сервера; после каждой записи чтения этого сеанса идут на основной,
+    # пока реплики её не проиграют
+    def __init__(self, router, session=None):
+        self.router = router
+        self.session = session
+        self.pool = get_pool(router.primary)
+
+    @contextmanager
+    def connection(self):
+        try:
+            with self.pool.connection() as conn:
+                yield conn
+        finally:
+            self.router.note_write(self.session)
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(host):
+    with _routers_lock:
+        router = _routers.get(host)
+        if router is None:
+            router = ReplicaRouter(host, REPLICA_CONFIG["replicas"].get(host, ()))
+            router.start()
+            _routers[host] = router
+        return router
+
+
+def read_pool(host, session=None):
+    # без настроенных реплик — обычный пул, без лишней работы на каждом запросе
+    if not REPLICA_CONFIG["replicas"].get(host):
+        return get_pool(host)
+    return ReadPool(get_router(host), session)
+
+
+def write_pool(host, session=None):
+    if not REPLICA_CONFIG["replicas"].get(host):
+        return get_pool(host)
+    return WritePool(get_router(host), session)
+
+
+def close_routers():
+    with _routers_lock:
+        routers = list(_routers.values())
+        _routers.clear()
+    for router in routers:
+        router.stop()
+
+
+atexit.register(close_routers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка реплик: живы ли и насколько отстают")
+    parser.add_argument("--host", default=DB_CONFIG["server"], help="основной сервер")
+    parser.add_argument("replicas", nargs="*", help="реплики «хост[:порт]»; по умолчанию из REPLICA_CONFIG")
+    args = parser.parse_args()
+
+    replicas = args.replicas or REPLICA_CONFIG["replicas"].get(args.host, [])
+    if not replicas:
+        print("⚠️ Реплики не заданы")
+        return 1
+    router = ReplicaRouter(args.host, replicas)
+    failed = 0
+    for state in router.check_all():
+        if state.healthy:
+            verdict = "✅" if state.lag <= router.max_lag else "⚠️"
+            print(f"{verdict} {state.host}: отставание {state.lag:.1f} с")
+        else:
+            failed += 1
+            print(f"❌ {state.host}: {state.error}")
+    print(f"Чтения сейчас идут на: {router.read_hosts()[0]}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
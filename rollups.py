@@ -0,0 +1,164 @@
+import argparse
+import time
+
+from db import DB_CONFIG, committed_high_id, dialect_of, get_pool
+
+ROLLUP_CONFIG = {
+    "batch_size": 50000,   # продаж за одну транзакцию
+    "settle_timeout": 60   # сколько ждать транзакции, которые ещё могут записать продажу
+                           # с id ниже границы пачки (db.committed_high_id)
+}
+
+# Дневные итоги копятся инкрементально: каждая продажа учитывается ровно один раз,
+# граница обработанного хранится в rollup_state.last_sale_id и не обгоняет продажи, которые
+# ещё не закоммичены: перенос из офлайн-журнала пишет их задним числом, так что по времени
+# продажи «устоявшиеся» не отличить. Названия товаров берутся
+# из sales_compat: у новых продаж в sales только product_id.
+ROLLUPS = [
+    ("sales_daily_product",
+     "day, product_name, brand, size",
+     "date(sale_date), product_name, coalesce(brand, ''), coalesce(size, '')"),
+    ("sales_daily_brand",
+     "day, brand",
+     "date(sale_date), coalesce(brand, '')"),
+    ("sales_daily_seller",
+     "day, sold_by",
+     "date(sale_date), coalesce(sold_by, 0)"),
+]
+
+
+def refresh_rollups(conn, batch_size=None):
+    batch_size = batch_size or ROLLUP_CONFIG["batch_size"]
+    # граница — до блокировки: committed_high_id завершает свои транзакции
+    settled_id = committed_high_id(conn, "sales", ROLLUP_CONFIG["settle_timeout"])
+    cur = conn.cursor()
+
+    # FOR UPDATE: два фоновых задания не посчитают одну пачку дважды
+    lock = " FOR UPDATE" if dialect_of(conn) == "postgresql" else ""
+    cur.execute(f"SELECT last_sale_id FROM rollup_state WHERE name = 'sales'{lock}")
+    last_id = cur.fetchone()[0]
+
+    cur.execute(
+        """SELECT MAX(id), COUNT(*) FROM (
+               SELECT id FROM sales
+               WHERE id > ? AND id <= ?
+               ORDER BY id
+               LIMIT ?
+           ) batch""",
+        (last_id, settled_id, batch_size)
+    )
+    high_id, count = cur.fetchone()
+    if not count:
+        conn.rollback()
+        return 0
+
+    for table, key, key_expr in ROLLUPS:
+        cur.execute(
+            f"""INSERT INTO {table} ({key}, quantity, revenue, sales_count)
+                SELECT {key_expr}, SUM(quantity), SUM(total_price), COUNT(*)
+                FROM sales_compat
+                WHERE id > ? AND id <= ?
+                GROUP BY {key_expr}
+                ON CONFLICT ({key}) DO UPDATE SET
+                    quantity = {table}.quantity + EXCLUDED.quantity,
+                    revenue = {table}.revenue + EXCLUDED.revenue,
+                    sales_count = {table}.sales_count + EXCLUDED.sales_count""",
+            (last_id, high_id)
+        )
+
+    cur.execute(
+        "UPDATE rollup_state SET last_sale_id = ?, updated_at = CURRENT_TIMESTAMP WHERE name = 'sales'",
+        (high_id,)
+    )
+    conn.commit()
+    return count
+
+
+def catch_up(pool):
+    total = 0
+    while True:
+        with pool.connection() as conn:
+            # итоги считаются на сервере; в локальной SQLite-базе их нет смысла вести
+            if dialect_of(conn) != "postgresql":
+                return total
+            processed = refresh_rollups(conn)
+        if not processed:
+            return total
+        total += processed
+
+
+# Отчёты читают только дневные итоги: стоимость зависит от ширины периода, а не от объёма sales.
+
+def daily_totals(conn, date_from, date_to):
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT day, SUM(quantity), SUM(revenue), SUM(sales_count)
+           FROM sales_daily_brand
+           WHERE day BETWEEN ? AND ?
+           GROUP BY day
+           ORDER BY day""",
+        (date_from, date_to)
+    )
+    return cur.fetchall()
+
+
+def top_products(conn, date_from, date_to, limit=10):
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT product_name, brand, size, SUM(quantity) AS quantity, SUM(revenue) AS revenue
+           FROM sales_daily_product
+           WHERE day BETWEEN ? AND ?
+           GROUP BY product_name, brand, size
+           ORDER BY revenue DESC
+           LIMIT ?""",
+        (date_from, date_to, limit)
+    )
+    return cur.fetchall()
+
+
+def brand_totals(conn, date_from, date_to):
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT brand, SUM(quantity), SUM(revenue)
+           FROM sales_daily_brand
+           WHERE day BETWEEN ? AND ?
+           GROUP BY brand
+           ORDER BY SUM(revenue) DESC""",
+        (date_from, date_to)
+    )
+    return cur.fetchall()
+
+
+def seller_totals(conn, date_from, date_to):
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT r.sold_by, u.username, SUM(r.quantity), SUM(r.revenue), SUM(r.sales_count)
+           FROM sales_daily_seller r
+           LEFT JOIN users u ON u.id = r.sold_by
+           WHERE r.day BETWEEN ? AND ?
+           GROUP BY r.sold_by, u.username
+           ORDER BY SUM(r.revenue) DESC""",
+        (date_from, date_to)
+    )
+    return cur.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пересчёт дневных итогов продаж")
+    parser.add_argument("--host", default=DB_CONFIG["server"])
+    parser.add_argument("--watch", type=int, metavar="СЕКУНД",
+                        help="не выходить, а пересчитывать с этим интервалом")
+    args = parser.parse_args()
+
+    pool = get_pool(args.host)
+    while True:
+        processed = catch_up(pool)
+        if processed:
+            print(f"✅ Учтено продаж: {processed}")
+        if not args.watch:
+            return 0
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,158 @@
+from db import dialect_of
+from store import StoreError, claim_key
+
+# Одна инструкция на всю корзину: условное списание остатков и запись продаж.
+# UPDATE ... WHERE stock >= quantity перепроверяется PostgreSQL на свежей версии
+# строки после ожидания блокировки, поэтому два кассира не продадут больше,
+# чем лежит на складе. В sales пишется только product_id: название, бренд и размер
+# товара не меняются, старые столбцы доступны через представление sales_compat.
+# Ключ идемпотентности кассы занимается в offline_replays тем же запросом: если ключ
+# уже занят, остатки не списываются и продажа не записывается.
+SELL_CART_SQL = """
+    WITH claimed AS (
+        {claim}
+    ),
+    cart (product_id, quantity) AS (
+        SELECT product_id, SUM(quantity)
+        FROM (VALUES {values}) AS items (product_id, quantity)
+        GROUP BY product_id
+    ),
+    sold AS (
+        UPDATE products p
+        SET stock = p.stock - cart.quantity
+        FROM cart
+        WHERE p.id = cart.product_id AND p.stock >= cart.quantity
+          AND EXISTS (SELECT 1 FROM claimed)
+        RETURNING p.id, p.name, p.brand, p.size, p.price, p.stock, p.updated_at, cart.quantity
+    ),
+    recorded AS (
+        INSERT INTO sales (product_id, quantity, unit_price, total_price, sold_by, customer_name)
+        SELECT id, quantity, price, price * quantity, CAST(? AS INTEGER), CAST(? AS VARCHAR(100))
+        FROM sold
+        WHERE (SELECT COUNT(*) FROM sold) = (SELECT COUNT(*) FROM cart)
+        RETURNING id
+    )
+    SELECT cart.product_id, p.name, p.stock, cart.quantity, sold.price,
+           (SELECT COUNT(*) FROM recorded),
+           sold.brand, sold.size, sold.stock, sold.updated_at,
+           (SELECT COUNT(*) FROM claimed)
+    FROM cart
+    LEFT JOIN products p ON p.id = cart.product_id
+    LEFT JOIN sold ON sold.id = cart.product_id
+"""
+
+CLAIM_SQL = """INSERT INTO offline_replays (key, kind) VALUES (CAST(? AS VARCHAR(36)), 'sale')
+        ON CONFLICT DO NOTHING RETURNING key"""
+NO_CLAIM_SQL = "SELECT NULL AS key"
+
+DUPLICATE_SALE = "Эта продажа уже проведена"
+
+
+def sell_cart(conn, user_id, items, customer=None, key=None):
+    # items: [(product_id, quantity), ...]; key — ключ идемпотентности (offline_journal.new_key),
+    # с ним повтор той же продажи после обрыва связи ничего не спишет второй раз
+    if not items:
+        raise StoreError("Корзина пуста")
+    for _, quantity in items:
+        if quantity <= 0:
+            raise StoreError("Количество должно быть больше нуля")
+
+    if dialect_of(conn) == "sqlite":
+        return _sell_cart_sqlite(conn, user_id, items, customer, key)
+
+    values = ", ".join(["(CAST(? AS INTEGER), CAST(? AS INTEGER))"] * len(items))
+    params = [key] if key is not None else []
+    params += [value for item in items for value in item]
+    params += [user_id, customer or None]
+
+    cur = conn.cursor()
+    try:
+        cur.execute(SELL_CART_SQL.format(claim=CLAIM_SQL if key is not None else NO_CLAIM_SQL,
+                                         values=values), params)
+        rows = cur.fetchall()
+    except Exception:
+        conn.rollback()
+        raise
+
+    lines = []
+    problems = []
+    if rows and not rows[0][10]:
+        conn.rollback()
+        raise StoreError(DUPLICATE_SALE)
+
+    for product_id, name, stock, quantity, price, _, brand, size, stock_left, updated_at, _ in rows:
+        if name is None:
+            problems.append(f"Товар #{product_id} не найден")
+        elif price is None:
+            problems.append(f"Недостаточно товара «{name}»! В наличии: {stock}")
+        else:
+            lines.append({
+                "product_id": product_id,
+                "name": name,
+                "quantity": quantity,
+                "unit_price": price,
+                "total_price": price * quantity,
+                # строка товара после списания, в том же виде, что store.list_products
+                "product": (product_id, name, brand, size, price, stock_left, updated_at)
+            })
+
+    if problems or not rows or rows[0][5] != len(rows):
+        conn.rollback()
+        raise StoreError("\n".join(problems) or "Не удалось оформить продажу")
+
+    conn.commit()
+    return {"items": lines, "total_price": sum(line["total_price"] for line in lines)}
+
+
+def _sell_cart_sqlite(conn, user_id, items, customer, key=None):
+    # в SQLite нет UPDATE внутри WITH, зато база локальная и запросы ничего не стоят;
+    # условие stock >= ? по-прежнему не даёт продать больше остатка
+    merged = {}
+    for product_id, quantity in items:
+        merged[product_id] = merged.get(product_id, 0) + quantity
+
+    cur = conn.cursor()
+    lines = []
+    try:
+        if key is not None and not claim_key(cur, key, "sale"):
+            raise StoreError(DUPLICATE_SALE)
+        for product_id, quantity in merged.items():
+            cur.execute(
+                """UPDATE products SET stock = stock - ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = ? AND stock >= ?
+                   RETURNING id, name, brand, size, price, stock, updated_at""",
+                (quantity, product_id, quantity)
+            )
+            product = cur.fetchone()
+            if product is None:
+                cur.execute("SELECT name, stock FROM products WHERE id = ?", (product_id,))
+                row = cur.fetchone()
+                if row is None:
+                    raise StoreError(f"Товар #{product_id} не найден")
+                raise StoreError(f"Недостаточно товара «{row[0]}»! В наличии: {row[1]}")
+            _, name, _, _, price, _, _ = product
+            cur.execute(
+                """INSERT INTO sales (product_id, quantity, unit_price, total_price, sold_by, customer_name)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (product_id, quantity, price, price * quantity, user_id, customer or None)
+            )
+            lines.append({
+                "product_id": product_id,
+                "name": name,
+                "quantity": quantity,
+                "unit_price": price,
+                "total_price": price * quantity,
+                "product": tuple(product)
+            })
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+    return {"items": lines, "total_price": sum(line["total_price"] for line in lines)}
+
+
+def sell_product(conn, user_id, product_id, quantity, customer=None):
+    sale = sell_cart(conn, user_id, [(product_id, quantity)], customer)
+    line = sale["items"][0]
+    return {"name": line["name"], "quantity": line["quantity"], "total_price": line["total_price"]}
@@ -0,0 +1,142 @@
+import argparse
+import time
+
+from bulk_import import _chunks
+from db import DB_CONFIG, dialect_of, get_pool
+
+BACKFILL_CONFIG = {
+    "batch_size": 5000,   # продаж за одну транзакцию
+    "pause": 0.1,         # секунд между пачками: кассы не ждут блокировок и ввода-вывода
+    "ids_per_update": 500
+}
+
+# Перенос старых продаж на product_id без остановки касс (миграция 11).
+# Строка с названием, брендом и размером получает ссылку на товар с тем же набором,
+# а если товара нет — на запись словаря sale_labels; текстовые столбцы обнуляются.
+# Пачки идут по возрастанию id, граница хранится в backfill_state: прерванный запуск
+# продолжается с места остановки, повторный ничего не переписывает.
+
+
+def _product_for(cur, name, brand, size):
+    cur.execute(
+        """SELECT MIN(id) FROM products
+           WHERE name = ? AND coalesce(brand, '') = ? AND coalesce(size, '') = ?""",
+        (name, brand, size)
+    )
+    return cur.fetchone()[0]
+
+
+def _label_for(cur, name, brand, size):
+    cur.execute(
+        """INSERT INTO sale_labels (product_name, brand, size) VALUES (?, ?, ?)
+           ON CONFLICT (product_name, brand, size) DO NOTHING""",
+        (name, brand, size)
+    )
+    cur.execute(
+        "SELECT id FROM sale_labels WHERE product_name = ? AND brand = ? AND size = ?",
+        (name, brand, size)
+    )
+    return cur.fetchone()[0]
+
+
+def backfill_batch(conn, encodings, batch_size=None):
+    # encodings — кэш (название, бренд, размер) -> (product_id, label_id) между пачками;
+    # возвращает (просмотрено строк, перенесено строк, граница id)
+    batch_size = batch_size or BACKFILL_CONFIG["batch_size"]
+    cur = conn.cursor()
+
+    # FOR UPDATE: два запуска не возьмут одну пачку
+    lock = " FOR UPDATE" if dialect_of(conn) == "postgresql" else ""
+    cur.execute(f"SELECT last_id FROM backfill_state WHERE name = 'sales_product_id'{lock}")
+    last_id = cur.fetchone()[0]
+
+    cur.execute(
+        """SELECT id, product_name, brand, size FROM sales
+           WHERE id > ?
+           ORDER BY id
+           LIMIT ?""",
+        (last_id, batch_size)
+    )
+    rows = cur.fetchall()
+    if not rows:
+        conn.rollback()
+        return 0, 0, last_id
+
+    targets = {}
+    for sale_id, name, brand, size in rows:
+        if name is None:
+            continue
+        key = (name, brand or "", size or "")
+        if key not in encodings:
+            product_id = _product_for(cur, *key)
+            encodings[key] = (product_id, None if product_id else _label_for(cur, *key))
+        targets.setdefault(encodings[key], []).append(sale_id)
+
+    for (product_id, label_id), sale_ids in targets.items():
+        for chunk in _chunks(sale_ids, BACKFILL_CONFIG["ids_per_update"]):
+            cur.execute(
+                f"""UPDATE sales
+                    SET product_id = ?, label_id = ?, product_name = NULL, brand = NULL, size = NULL
+                    WHERE id IN ({", ".join(["?"] * len(chunk))}) AND product_name IS NOT NULL""",
+                [product_id, label_id] + chunk
+            )
+
+    high_id = rows[-1][0]
+    cur.execute(
+        "UPDATE backfill_state SET last_id = ?, updated_at = CURRENT_TIMESTAMP WHERE name = 'sales_product_id'",
+        (high_id,)
+    )
+    conn.commit()
+    return len(rows), sum(len(sale_ids) for sale_ids in targets.values()), high_id
+
+
+def restart(conn):
+    # с начала: подхватить строки, которые старые версии касс записали уже после прохода
+    cur = conn.cursor()
+    cur.execute("UPDATE backfill_state SET last_id = 0, updated_at = CURRENT_TIMESTAMP WHERE name = 'sales_product_id'")
+    conn.commit()
+
+
+def run_backfill(pool, batch_size=None, pause=None, on_progress=None):
+    pause = BACKFILL_CONFIG["pause"] if pause is None else pause
+    encodings = {}
+    summary = {"scanned": 0, "encoded": 0, "last_id": 0}
+    while True:
+        with pool.connection() as conn:
+            scanned, encoded, last_id = backfill_batch(conn, encodings, batch_size)
+        if not scanned:
+            summary["last_id"] = last_id
+            return summary
+        summary["scanned"] += scanned
+        summary["encoded"] += encoded
+        summary["last_id"] = last_id
+        if on_progress:
+            on_progress(summary)
+        time.sleep(pause)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос старых продаж на product_id и словарь названий")
+    parser.add_argument("--host", default=DB_CONFIG["server"])
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_CONFIG["batch_size"])
+    parser.add_argument("--pause", type=float, default=BACKFILL_CONFIG["pause"],
+                        help="секунд между пачками")
+    parser.add_argument("--restart", action="store_true",
+                        help="пройти таблицу заново, с первой продажи")
+    args = parser.parse_args()
+
+    pool = get_pool(args.host)
+    if args.restart:
+        with pool.connection() as conn:
+            restart(conn)
+
+    def progress(summary):
+        print(f"… просмотрено {summary['scanned']}, перенесено {summary['encoded']}, до id {summary['last_id']}")
+
+    summary = run_backfill(pool, args.batch_size, args.pause, progress)
+    print(f"✅ Перенос завершён: просмотрено {summary['scanned']}, перенесено {summary['encoded']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,224 @@
+from datetime import datetime
+
+from db import dialect_of
+from photos import store_photo
+from passwords import hash_password, hash_password_async, needs_rehash, submit, verify_password
+
+
+class StoreError(Exception):
+    pass
+
+
+def validate_email(email):
+    return "@" in email and "." in email.split("@")[1]
+
+
+def validate_phone(phone):
+    allowed = set("0123456789+-()")
+    return all(c in allowed for c in phone)
+
+
+def find_login(conn, username):
+    # (id, password_hash, role) или None
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id, password_hash, role FROM users WHERE username = ?",
+        (username,)
+    )
+    return cur.fetchone()
+
+
+def authenticate(conn, username, password, write_pool=None):
+    # conn может смотреть на реплику: тогда новый хеш пишется через write_pool, в фоне.
+    # bcrypt проверяется в потоке вызывающего (run_db в GUI); сервис касс берёт find_login
+    # и проверяет пароль в пуле bcrypt, не держа соединение
+    row = find_login(conn, username)
+    if not row:
+        return None
+    user_id, password_hash, role = row
+    if not verify_password(password, password_hash):
+        return None
+    if needs_rehash(password_hash):
+        if write_pool is None:
+            rehash_password(conn, user_id, password, password_hash)
+        else:
+            rehash_in_background(write_pool, user_id, password, password_hash)
+    return {"id": user_id, "role": role, "username": username}
+
+
+def rehash_password(conn, user_id, password, old_hash):
+    try:
+        cur = conn.cursor()
+        # условие по старому хешу, чтобы не затереть пароль, сменённый параллельно
+        cur.execute(
+            "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+            (hash_password(password), user_id, old_hash)
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Не удалось обновить хеш пароля: {e}")
+
+
+def rehash_in_background(write_pool, user_id, password, old_hash):
+    # новый хеш стоит ещё одного bcrypt: вход не ждёт его, хеш пишется из пула bcrypt
+    def rehash():
+        try:
+            with write_pool.connection() as conn:
+                rehash_password(conn, user_id, password, old_hash)
+        except Exception as e:
+            print(f"⚠️ Не удалось обновить хеш пароля: {e}")
+    return submit(rehash)
+
+
+PRODUCT_COLUMNS = "id, name, brand, size, price, stock, updated_at"
+
+
+def list_products(conn, after_id=0, limit=200):
+    cur = conn.cursor()
+    cur.execute(
+        f"""SELECT {PRODUCT_COLUMNS} FROM products
+            WHERE stock > 0 AND id > ?
+            ORDER BY id
+            LIMIT ?""",
+        (after_id, limit)
+    )
+    return cur.fetchall()
+
+
+def get_product(conn, product_id):
+    cur = conn.cursor()
+    cur.execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id = ?", (product_id,))
+    return cur.fetchone()
+
+
+def server_time(conn):
+    # часы сервера, а не кассы: граница дельта-синхронизации сравнивается с updated_at
+    cur = conn.cursor()
+    if dialect_of(conn) == "sqlite":
+        cur.execute("SELECT CURRENT_TIMESTAMP")
+        return datetime.fromisoformat(cur.fetchone()[0])
+    # без часового пояса, как DEFAULT CURRENT_TIMESTAMP в столбце TIMESTAMP
+    cur.execute("SELECT LOCALTIMESTAMP")
+    return cur.fetchone()[0]
+
+
+def product_changes(conn, since):
+    # включая строки с нулевым остатком, чтобы клиент мог их убрать
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT {PRODUCT_COLUMNS} FROM products WHERE updated_at > ? ORDER BY id",
+        (since,)
+    )
+    return cur.fetchall()
+
+
+def _like_escape(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_products(conn, query, limit=20, offset=0):
+    # короткие слова ищем по префиксу (btree text_pattern_ops),
+    # длинные — подстрокой по триграммному индексу
+    conditions = []
+    params = []
+    for term in query.lower().split():
+        term = _like_escape(term)
+        if len(term) >= 3:
+            conditions.append(
+                "lower(name || ' ' || coalesce(brand, '') || ' ' || coalesce(size, '')) LIKE ? ESCAPE '\\'"
+            )
+            params.append(f"%{term}%")
+        else:
+            conditions.append(
+                "(lower(name) LIKE ? ESCAPE '\\' OR lower(brand) LIKE ? ESCAPE '\\' OR lower(size) LIKE ? ESCAPE '\\')"
+            )
+            params += [f"{term}%"] * 3
+    if not conditions:
+        return []
+
+    first_term = _like_escape(query.lower().split()[0])
+    cur = conn.cursor()
+    cur.execute(
+        f"""SELECT {PRODUCT_COLUMNS} FROM products
+            WHERE stock > 0 AND {" AND ".join(conditions)}
+            ORDER BY CASE WHEN lower(name) LIKE ? ESCAPE '\\' THEN 0 ELSE 1 END, name, id
+            LIMIT ? OFFSET ?""",
+        params + [f"{first_term}%", limit, offset]
+    )
+    return cur.fetchall()
+
+
+def claim_key(cur, key, kind):
+    # ключ идемпотентности из кассы: False — запись с этим ключом уже проведена;
+    # вызывается в той же транзакции, что и сама запись
+    cur.execute(
+        "INSERT INTO offline_replays (key, kind) VALUES (?, ?) ON CONFLICT DO NOTHING RETURNING key",
+        (key, kind)
+    )
+    return cur.fetchone() is not None
+
+
+def add_product(conn, user_id, name, brand, size, price, stock, key=None):
+    cur = conn.cursor()
+    if key is not None and not claim_key(cur, key, "product"):
+        conn.rollback()
+        raise StoreError(f"Товар '{name}' уже добавлен")
+    cur.execute(
+        f"""INSERT INTO products (name, brand, size, price, stock, added_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+            RETURNING {PRODUCT_COLUMNS}""",
+        (name, brand, size, price, stock, user_id)
+    )
+    product = cur.fetchone()
+    if product is None:
+        # тот же (название, бренд, размер) уже есть — пополняют его, а не заводят второй
+        conn.rollback()
+        raise StoreError(f"Товар '{name}' с таким брендом и размером уже есть")
+    conn.commit()
+    return product
+
+
+def add_employee(conn, full_name, position, birth_date, phone, email, username, password, photo_path=None):
+    # хешируем параллельно с проверкой логина и чтением фото
+    password_hash_future = hash_password_async(password)
+    cur = conn.cursor()
+
+    cur.execute("SELECT id FROM users WHERE username = ?", (username,))
+    if cur.fetchone():
+        raise StoreError(f"Логин '{username}' уже занят!")
+
+    # пользователь, фото и анкета — одна транзакция: без «сирот» в users при ошибке анкеты
+    try:
+        photo_id = store_photo(conn, photo_path) if photo_path else None
+
+        cur.execute(
+            "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?) RETURNING id",
+            (username, password_hash_future.result(), "worker")
+        )
+        user_id = cur.fetchone()[0]
+
+        cur.execute(
+            """INSERT INTO employees
+               (full_name, position, birth_date, phone, email, photo_id, user_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (full_name, position, birth_date, phone, email, photo_id, user_id)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return user_id
+
+
+def list_employees(conn):
+    # без самих фото: миниатюру и оригинал читают отдельно через photos.py
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT e.id, e.full_name, e.position, e.birth_date, e.phone, e.email, e.photo_id, u.username
+           FROM employees e
+           LEFT JOIN users u ON u.id = e.user_id
+           ORDER BY e.full_name"""
+    )
+    return cur.fetchall()
@@ -0,0 +1,84 @@
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtWidgets import QMessageBox
+
+from query_metrics import action
+from store import StoreError
+
+
+class TaskSignals(QObject):
+    finished = Signal(object)
+    failed = Signal(object)
+    progress = Signal(object)
+
+
+class Task(QRunnable):
+    def __init__(self, fn, args, kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(e)
+            return
+        self.signals.finished.emit(result)
+
+
+# задачи держим здесь, пока не придёт сигнал, иначе Python соберёт их вместе с сигналами
+_running = set()
+
+
+def run_in_background(fn, *args, on_result=None, on_error=None, on_progress=None, busy=(), **kwargs):
+    task = Task(fn, args, kwargs)
+    if on_progress:
+        # fn получает progress= и может звать его из рабочего потока
+        kwargs["progress"] = task.signals.progress.emit
+        task.signals.progress.connect(on_progress)
+    task.setAutoDelete(False)
+    _running.add(task)
+
+    for widget in busy:
+        widget.setEnabled(False)
+
+    def done():
+        _running.discard(task)
+        for widget in busy:
+            widget.setEnabled(True)
+
+    def handle_result(result):
+        done()
+        if on_result:
+            on_result(result)
+
+    def handle_error(error):
+        done()
+        if on_error:
+            on_error(error)
+        else:
+            print(f"⚠️ Ошибка фоновой задачи: {error}")
+
+    task.signals.finished.connect(handle_result)
+    task.signals.failed.connect(handle_error)
+    QThreadPool.globalInstance().start(task)
+    return task
+
+
+def run_db(pool, fn, *args, on_result=None, on_error=None, busy=(), **kwargs):
+    # имя функции — это и есть действие пользователя: sell_cart, authenticate, add_employee
+    def job():
+        with action(fn.__name__), pool.connection() as conn:
+            return fn(conn, *args, **kwargs)
+    return run_in_background(job, on_result=on_result, on_error=on_error, busy=busy)
+
+
+def error_reporter(parent, title):
+    def report(error):
+        if isinstance(error, StoreError):
+            QMessageBox.warning(parent, "Ошибка", str(error))
+        else:
+            QMessageBox.critical(parent, "Ошибка", f"{title}:\n{error}")
+    return report
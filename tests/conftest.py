@@ -0,0 +1,48 @@
+import pytest
+
+from db import DB_CONFIG, close_pools, get_pool
+
+# Общая база для тестов без сервера: свежий файл SQLite на каждый тест, схема — теми же
+# миграциями, что и на PostgreSQL. Миграция 1 заводит admin, для неё нужен bcrypt.
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    pytest.importorskip("bcrypt")
+    from migrations import migrate
+
+    monkeypatch.setitem(DB_CONFIG, "backend", "sqlite")
+    monkeypatch.setitem(DB_CONFIG, "sqlite_path", str(tmp_path / "shoes_store.sqlite3"))
+    close_pools()
+    migrate()
+    yield get_pool(DB_CONFIG["server"])
+    close_pools()
+
+
+@pytest.fixture
+def conn(pool):
+    with pool.connection() as conn:
+        yield conn
+
+
+@pytest.fixture
+def admin_id(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM users WHERE username = 'admin'")
+    return cur.fetchone()[0]
+
+
+@pytest.fixture
+def make_product(conn, admin_id):
+    # товар прямо в таблицу, с любым остатком и без записи в журнал
+    def make_product(name, brand="Nike", size="42", price=100, stock=10):
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO products (name, brand, size, price, stock, added_by)
+               VALUES (?, ?, ?, ?, ?, ?) RETURNING id""",
+            (name, brand, size, price, stock, admin_id)
+        )
+        product_id = cur.fetchone()[0]
+        conn.commit()
+        return product_id
+    return make_product
@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+
+import pytest
+
+from activity_log import ActivityLogWriter
+
+
+class OperationalError(Exception):
+    # как у драйверов DB-API: по имени класса db.is_connection_error узнаёт обрыв связи
+    pass
+
+
+class FakeServer:
+    # запоминает вставленные строки; down — сервер недоступен, bad — действие, которое
+    # сервер отвергнет как ошибку в данных
+    def __init__(self):
+        self.rows = []
+        self.inserts = []
+        self.down = False
+        self.bad = None
+
+    @contextmanager
+    def connection(self):
+        if self.down:
+            raise OperationalError("server closed the connection unexpectedly")
+        yield self
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        rows = [tuple(params[i:i + 3]) for i in range(0, len(params), 3)]
+        if any(action == self.bad for _, action, _ in rows):
+            raise ValueError("value too long for type character varying(255)")
+        self.inserts.append(len(rows))
+        self.rows += rows
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def server():
+    return FakeServer()
+
+
+@pytest.fixture
+def writer(server):
+    # сброс по таймеру не мешает: пачки сбрасывает сам тест
+    writer = ActivityLogWriter(server, max_queue=10, batch_size=3, flush_interval=60)
+    yield writer
+    writer.close()
+
+
+def test_events_go_in_batches(writer, server):
+    server.down = True   # фоновый поток не успеет сбросить полную пачку раньше теста
+    for n in range(7):
+        writer.log(1, f"Действие {n}")
+    server.down = False
+
+    writer.flush()
+
+    assert server.inserts == [3, 3, 1]
+    assert [action for _, action, _ in server.rows] == [f"Действие {n}" for n in range(7)]
+    assert writer.stats() == {"queued": 0, "written": 7, "dropped": 0, "failed": 0}
+
+
+def test_events_wait_out_a_lost_connection(writer, server):
+    server.down = True
+    for n in range(4):
+        writer.log(1, f"Действие {n}")
+
+    writer.flush()
+    assert writer.stats() == {"queued": 4, "written": 0, "dropped": 0, "failed": 0}
+
+    server.down = False
+    writer.flush()
+    assert [action for _, action, _ in server.rows] == [f"Действие {n}" for n in range(4)]
+    assert writer.stats()["written"] == 4
+
+
+def test_full_queue_counts_dropped_events(server):
+    # пачка больше очереди: фоновый поток не разбудят, и в очереди ровно max_queue событий
+    writer = ActivityLogWriter(server, max_queue=10, batch_size=100, flush_interval=60)
+    for n in range(13):
+        writer.log(1, f"Действие {n}")
+
+    assert writer.stats()["dropped"] == 3
+    writer.close()
+    assert writer.stats()["written"] == 10
+
+
+def test_bad_event_fails_alone(writer, server):
+    server.down, server.bad = True, "Плохое"
+    for action in ("Вход", "Плохое", "Выход"):
+        writer.log(1, action)
+    server.down = False
+
+    writer.flush()
+
+    assert [action for _, action, _ in server.rows] == ["Вход", "Выход"]
+    assert writer.stats() == {"queued": 0, "written": 2, "dropped": 0, "failed": 1}
+
+
+def test_close_flushes_what_is_left(server):
+    writer = ActivityLogWriter(server, batch_size=100, flush_interval=60)
+    writer.log(1, "Вход")
+    writer.log(1, "Выход")
+
+    writer.close()
+
+    assert len(server.rows) == 2
+    writer.log(1, "После закрытия")
+    assert writer.stats()["dropped"] == 1
+
+
+def test_close_without_connection_counts_lost_events(server):
+    writer = ActivityLogWriter(server, batch_size=100, flush_interval=60)
+    server.down = True
+    writer.log(1, "Вход")
+
+    writer.close()
+
+    assert writer.stats() == {"queued": 0, "written": 0, "dropped": 0, "failed": 1}
@@ -0,0 +1,71 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import backup
+from db import DB_CONFIG
+
+
+class FakeDump:
+    # pg_dump -F d: создаёт каталог с оглавлением и ничего не пишет в stderr
+    def __init__(self, args, **kwargs):
+        path = args[args.index("-f") + 1]
+        os.makedirs(path)
+        with open(os.path.join(path, "toc.dat"), "wb") as f:
+            f.write(b"PGDMP")
+        self.stderr = []
+        self.returncode = 0
+
+    def wait(self):
+        return self.returncode
+
+
+class Clock:
+    # у каждого запуска своё время в имени копии
+    def __init__(self):
+        self.moment = datetime(2024, 5, 1, 3, 0, 0)
+
+    def now(self):
+        self.moment += timedelta(minutes=1)
+        return self.moment
+
+
+@pytest.fixture
+def backup_dir(tmp_path, monkeypatch):
+    backup_dir = str(tmp_path / "backups")
+    monkeypatch.setitem(backup.BACKUP_CONFIG, "backup_dir", backup_dir)
+    monkeypatch.setitem(backup.BACKUP_CONFIG, "keep_last", 2)
+    monkeypatch.setitem(backup.BACKUP_CONFIG, "keep_days", 30)
+    monkeypatch.setitem(DB_CONFIG, "backend", "pyodbc")
+    monkeypatch.setattr(backup.subprocess, "Popen", FakeDump)
+    monkeypatch.setattr(backup, "datetime", Clock())
+    return backup_dir
+
+
+def old_backup(backup_dir, name):
+    path = os.path.join(backup_dir, name)
+    os.makedirs(path)
+    month_ago = time.time() - 40 * 86400
+    os.utime(path, (month_ago, month_ago))
+    return path
+
+
+def test_failed_backup_does_not_push_out_a_good_one(backup_dir, monkeypatch):
+    oldest = old_backup(backup_dir, "backup_20240101_030000")
+    good = old_backup(backup_dir, "backup_20240102_030000")
+
+    monkeypatch.setattr(backup, "verify_backup", lambda path: (False, "файл данных повреждён"))
+    with pytest.raises(RuntimeError, match="failed_20240501_030100"):
+        backup.run_backup("localhost")
+    assert backup.list_backups() == [oldest, good]
+
+    monkeypatch.setattr(backup, "verify_backup", lambda path: (True, "таблиц с данными: 1"))
+    result = backup.run_backup("localhost")
+
+    # последние две проверенные копии: вчерашняя хорошая и новая; битая в счёт не идёт
+    assert result["removed"] == [oldest]
+    assert backup.list_backups() == [good, result["path"]]
+    assert sorted(os.listdir(backup_dir)) == ["backup_20240102_030000", "backup_20240501_030200",
+                                              "failed_20240501_030100"]
@@ -0,0 +1,48 @@
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from bulk_import import import_products
+
+DELIVERY = """name;brand;size;price;stock
+Air Max;Nike;42;12 990,00;5
+Air Max;Nike;42;12 990,00;1
+Superstar;;;8990;3
+Без цены;Nike;41;;2
+"""
+
+
+def catalog(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT name, brand, size, price, stock FROM products ORDER BY name")
+    return [(name, brand, size, Decimal(str(price)), stock) for name, brand, size, price, stock in cur.fetchall()]
+
+
+def test_second_import_tops_up_stock_instead_of_duplicating(pool, conn, admin_id, tmp_path):
+    # товар с пустым брендом и размером, заведённый в окне работника с NULL вместо ''
+    cur = conn.cursor()
+    cur.execute("INSERT INTO products (name, price, stock, added_by) VALUES ('Superstar', 7990, 1, ?)",
+                (admin_id,))
+    conn.commit()
+    path = tmp_path / "delivery.csv"
+    path.write_text(DELIVERY, encoding="utf-8")
+
+    first = import_products(pool, str(path), admin_id)
+    assert (first["rows"], first["inserted"], first["updated"]) == (4, 1, 1)
+    assert first["errors"] == [(5, "цена должна быть числом")]
+
+    path.write_text(DELIVERY.replace("12 990,00", "13 490,00"), encoding="utf-8")
+    second = import_products(pool, str(path), admin_id)
+    assert (second["inserted"], second["updated"]) == (0, 2)
+
+    # одна строка на товар: остаток сложился из двух поставок, цена — из последней
+    assert catalog(conn) == [("Air Max", "Nike", "42", Decimal("13490"), 12),
+                             ("Superstar", None, None, Decimal("8990"), 7)]
+
+
+def test_identity_index_treats_empty_and_null_alike(conn, admin_id, make_product):
+    # products_identity_key (миграция 12): пустой бренд и NULL — один и тот же товар
+    make_product("Superstar", brand=None, size=None)
+    with pytest.raises(sqlite3.IntegrityError):
+        make_product("Superstar", brand="", size="")
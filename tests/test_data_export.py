@@ -0,0 +1,42 @@
+import csv
+import gzip
+from datetime import date
+
+import pytest
+
+from data_export import export_table, load_state
+
+
+def add_logs(conn, admin_id, count):
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO activity_logs (user_id, action, details) VALUES (?, ?, '')",
+        [(admin_id, f"Действие {n}") for n in range(count)]
+    )
+    conn.commit()
+
+
+def exported_ids(path):
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        return [int(row["id"]) for row in csv.DictReader(f)]
+
+
+def test_incremental_export_takes_only_new_rows(pool, conn, admin_id, tmp_path):
+    export_dir = str(tmp_path / "exports")
+    add_logs(conn, admin_id, 3)
+
+    first = export_table(pool, "activity_logs", incremental=True, export_dir=export_dir)
+    add_logs(conn, admin_id, 2)
+    second = export_table(pool, "activity_logs", incremental=True, export_dir=export_dir)
+    third = export_table(pool, "activity_logs", incremental=True, export_dir=export_dir)
+
+    assert exported_ids(first["path"]) == [1, 2, 3]
+    assert exported_ids(second["path"]) == [4, 5]
+    assert third["path"] is None and third["rows"] == 0
+    assert load_state(export_dir) == {"activity_logs": 5}
+
+
+def test_incremental_export_refuses_a_period(pool, tmp_path):
+    with pytest.raises(ValueError, match="без периода"):
+        export_table(pool, "sales", date_from=date(2024, 1, 1), incremental=True,
+                     export_dir=str(tmp_path / "exports"))
@@ -0,0 +1,191 @@
+import threading
+import time
+
+import pytest
+
+import db
+import query_metrics
+from db import ConnectionPool
+
+
+class OperationalError(Exception):
+    pass
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if not self.conn.alive:
+            raise OperationalError("server closed the connection unexpectedly")
+        self.conn.pings += sql == "SELECT 1"
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    # in_transaction — как у sqlite3; alive=False — сервер оборвал соединение
+    def __init__(self):
+        self.in_transaction = False
+        self.alive = True
+        self.closed = False
+        self.pings = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if not self.alive:
+            raise OperationalError("server closed the connection unexpectedly")
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    # connect-функция пула: запоминает выданные соединения, down — сервер недоступен
+    def __init__(self):
+        self.connections = []
+        self.down = False
+
+    def __call__(self):
+        if self.down:
+            raise OperationalError("could not connect to server")
+        conn = FakeConnection()
+        self.connections.append(conn)
+        return conn
+
+
+class Clock:
+    # вместо модуля time в db: время идёт только по команде теста
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def driver(monkeypatch):
+    # без обёртки query_metrics пул отдаёт соединения драйвера как есть
+    monkeypatch.setitem(query_metrics.METRICS_CONFIG, "enabled", False)
+    return FakeDriver()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(db, "time", clock)
+    return clock
+
+
+def make_pool(driver, **options):
+    settings = dict(min_size=0, max_size=2, idle_timeout=60, checkout_timeout=5,
+                    ping_after=30, connect_retries=0)
+    settings.update(options)
+    return ConnectionPool(driver, **settings)
+
+
+def test_checkout_times_out_when_pool_is_exhausted(driver):
+    pool = make_pool(driver, max_size=1, checkout_timeout=0.05)
+    conn = pool.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.05
+
+    pool.release(conn)
+    assert pool.acquire() is conn
+
+
+def test_waiter_gets_the_released_connection(driver):
+    pool = make_pool(driver, max_size=1)
+    conn = pool.acquire()
+    threading.Timer(0.05, pool.release, (conn,)).start()
+
+    assert pool.acquire() is conn
+    assert len(driver.connections) == 1
+
+
+def test_failed_connect_frees_its_slot(driver):
+    pool = make_pool(driver, max_size=1, checkout_timeout=0.05)
+    driver.down = True
+    with pytest.raises(OperationalError):
+        pool.acquire()
+
+    driver.down = False
+    assert pool.acquire() is driver.connections[0]
+
+
+def test_idle_connections_above_min_size_expire(driver, clock):
+    pool = make_pool(driver, min_size=1)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+
+    clock.sleep(61)
+    # самое старое закрывается, min_size соединений остаются в пуле
+    assert pool.acquire() is second
+    assert first.closed and not second.closed
+
+
+def test_connection_is_pinged_only_after_a_pause(driver, clock):
+    pool = make_pool(driver)
+    conn = pool.acquire()
+    pool.release(conn)
+
+    clock.sleep(10)
+    assert pool.acquire() is conn and conn.pings == 0
+    pool.release(conn)
+
+    clock.sleep(31)
+    assert pool.acquire() is conn and conn.pings == 1
+
+
+def test_dead_connection_is_replaced_after_ping(driver, clock):
+    pool = make_pool(driver)
+    dead = pool.acquire()
+    pool.release(dead)
+
+    dead.alive = False
+    clock.sleep(31)
+    fresh = pool.acquire()
+
+    assert fresh is not dead and dead.closed
+    assert driver.connections == [dead, fresh]
+
+
+def test_release_rolls_back_only_an_open_transaction(driver):
+    pool = make_pool(driver)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert conn.rollbacks == 0
+
+    assert pool.acquire() is conn
+    conn.in_transaction = True
+    pool.release(conn)
+    assert conn.rollbacks == 1 and not conn.closed
+    assert pool.acquire() is conn
+
+
+def test_connection_that_cannot_roll_back_is_discarded(driver):
+    pool = make_pool(driver, max_size=1)
+    conn = pool.acquire()
+    conn.in_transaction, conn.alive = True, False
+
+    pool.release(conn)
+
+    assert conn.closed
+    assert pool.acquire() is driver.connections[1]
@@ -0,0 +1,58 @@
+import pytest
+
+import employee_import
+from employee_import import import_employees
+from passwords import PASSWORD_CONFIG
+
+STAFF = """full_name;position;birth_date;phone;email;username;password;photo
+Иванов Иван;Продавец;01.02.1990;;;ivanov;secret1;
+Петров Пётр;Продавец;1991-03-04;;;petrov;secret2;
+Сидоров Сидор;Кассир;;;;sidorov;secret3;
+"""
+
+
+@pytest.fixture
+def staff_csv(tmp_path, monkeypatch):
+    # дешёвый bcrypt и один дочерний процесс: тест про вставку, а не про хеши
+    monkeypatch.setitem(PASSWORD_CONFIG, "rounds", 4)
+    monkeypatch.setitem(employee_import.EMPLOYEE_IMPORT_CONFIG, "workers", 1)
+    path = tmp_path / "staff.csv"
+    path.write_text(STAFF, encoding="utf-8")
+    return str(path)
+
+
+def staff(conn):
+    cur = conn.cursor()
+    cur.execute("""SELECT e.full_name, u.username FROM employees e
+                   JOIN users u ON u.id = e.user_id ORDER BY u.username""")
+    return cur.fetchall()
+
+
+def test_batch_links_employees_to_their_users(pool, conn, staff_csv):
+    summary = import_employees(pool, staff_csv)
+
+    assert summary == {"rows": 3, "created": 3, "errors": []}
+    assert staff(conn) == [("Иванов Иван", "ivanov"), ("Петров Пётр", "petrov"),
+                           ("Сидоров Сидор", "sidorov")]
+
+
+def test_login_taken_in_parallel_fails_only_its_row(pool, conn, staff_csv, monkeypatch):
+    # проверку занятых логинов прошли все, а petrov тем временем завели в админ-панели
+    def existing_usernames(conn, usernames):
+        cur = conn.cursor()
+        cur.execute("INSERT INTO users (username, password_hash, role) VALUES ('petrov', 'x', 'worker')")
+        conn.commit()
+        return set()
+    monkeypatch.setattr(employee_import, "_existing_usernames", existing_usernames)
+
+    summary = import_employees(pool, staff_csv)
+
+    # пачка откатилась целиком, построчный повтор завёл остальных
+    assert (summary["rows"], summary["created"]) == (3, 2)
+    assert [line_no for line_no, _ in summary["errors"]] == [3]
+    assert "UNIQUE" in summary["errors"][0][1]
+    assert staff(conn) == [("Иванов Иван", "ivanov"), ("Сидоров Сидор", "sidorov")]
+
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM users WHERE username = 'petrov'")
+    assert cur.fetchone()[0] == 1
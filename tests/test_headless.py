@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("module", ["pos_service", "bench", "loadgen", "bulk_import", "employee_import"])
+def test_module_imports_without_qt(module):
+    # сервис касс, бенчмарк, нагрузка и импорт запускаются на сервере, где PySide6 нет
+    subprocess.run([sys.executable, "-c", f"import sys; sys.modules['PySide6'] = None; import {module}"],
+                   cwd=ROOT, check=True)
@@ -0,0 +1,58 @@
+from history import activity_page, sales_page
+
+
+def add_sales(conn, admin_id, product_id, times):
+    cur = conn.cursor()
+    for sale_date in times:
+        cur.execute(
+            """INSERT INTO sales (product_id, quantity, unit_price, total_price, sold_by, sale_date)
+               VALUES (?, 1, 100, 100, ?, ?)""",
+            (product_id, admin_id, sale_date)
+        )
+    conn.commit()
+
+
+def all_pages(fetch, limit):
+    rows, after = [], None
+    while True:
+        page = fetch(after, limit)
+        rows += page
+        if len(page) < limit:
+            return rows
+        after = (page[-1][0], page[-1][1])
+
+
+def test_pages_follow_each_other_without_gaps(conn, admin_id, make_product):
+    shoes = make_product("Air Max")
+    # одинаковое время у нескольких продаж: порядок внутри секунды держит id
+    add_sales(conn, admin_id, shoes, ["2024-01-01 10:00:00"] * 3 + ["2024-01-02 09:00:00"] * 4)
+
+    rows = all_pages(lambda after, limit: sales_page(conn, {}, after, limit), 3)
+
+    assert len(rows) == 7
+    assert [(row[0], row[1]) for row in rows] == sorted(((row[0], row[1]) for row in rows), reverse=True)
+
+
+def test_product_filter_finds_sold_out_products(conn, admin_id, make_product):
+    gone = make_product("Air Max 90", stock=0)
+    other = make_product("Superstar", brand="Adidas")
+    add_sales(conn, admin_id, gone, ["2024-01-01 10:00:00"])
+    add_sales(conn, admin_id, other, ["2024-01-01 11:00:00"])
+
+    rows = sales_page(conn, {"product": "air"})
+
+    assert [row[2] for row in rows] == ["Air Max 90"]
+
+
+def test_activity_filter_by_user_and_period(conn, admin_id):
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO activity_logs (user_id, action, details, timestamp) VALUES (?, ?, '', ?)",
+        [(admin_id, "Вход", "2024-01-01 10:00:00"), (admin_id, "Вход", "2024-01-03 10:00:00"),
+         (None, "Вход", "2024-01-01 12:00:00")]
+    )
+    conn.commit()
+
+    rows = activity_page(conn, {"user": "admin", "date_from": "2024-01-01", "date_to": "2024-01-02"})
+
+    assert [(row[0], row[2]) for row in rows] == [("2024-01-01 10:00:00", "admin")]
@@ -0,0 +1,29 @@
+from backends import get_backend
+from migrations import LATEST_VERSION, apply_migrations, current_version, is_current, migrate
+
+
+def test_fresh_database_is_current(conn):
+    assert current_version(conn) == LATEST_VERSION
+    assert is_current()
+
+
+def test_second_run_applies_nothing(pool, conn):
+    assert migrate() == 0
+    assert apply_migrations(conn, get_backend("sqlite")) == 0
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM schema_version")
+    assert cur.fetchone()[0] == LATEST_VERSION
+
+
+def test_every_migration_reapplies_over_its_own_schema(conn, make_product):
+    # базы, созданные старым init_database(), не размечены: миграции ложатся поверх готовых таблиц
+    make_product("Air Max")
+    cur = conn.cursor()
+    cur.execute("DELETE FROM schema_version")
+    conn.commit()
+
+    assert apply_migrations(conn, get_backend("sqlite")) == LATEST_VERSION
+    cur.execute("SELECT COUNT(*), MIN(name) FROM products")
+    assert cur.fetchone() == (1, "Air Max")
+    cur.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'")
+    assert cur.fetchone()[0] == 1
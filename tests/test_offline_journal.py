@@ -0,0 +1,80 @@
+from decimal import Decimal
+
+import pytest
+
+import sales
+from db import DB_CONFIG
+from offline_journal import JournalSyncer, OfflineJournal, new_key, record_product, record_sale
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return OfflineJournal(str(tmp_path / "offline_journal.sqlite3"))
+
+
+@pytest.fixture
+def syncer(journal, pool):
+    return JournalSyncer(journal, DB_CONFIG["server"], pool)
+
+
+def product_row(conn, product_id):
+    cur = conn.cursor()
+    cur.execute("SELECT id, name, brand, size, price, stock, updated_at FROM products WHERE id = ?",
+                (product_id,))
+    return cur.fetchone()
+
+
+def test_offline_sale_is_replayed_once(conn, admin_id, make_product, journal, syncer):
+    shoes = make_product("Air Max", price=100, stock=5)
+    record_sale(journal, DB_CONFIG["server"], admin_id, [(product_row(conn, shoes), 2)], "Иванов")
+
+    assert syncer.sync_once() == 1
+    assert syncer.sync_once() == 0
+
+    assert product_row(conn, shoes)[5] == 3
+    cur = conn.cursor()
+    cur.execute("SELECT quantity, unit_price, customer_name FROM sales")
+    assert [(quantity, Decimal(str(price)), customer) for quantity, price, customer in cur.fetchall()] \
+        == [(2, Decimal("100"), "Иванов")]
+    cur.execute("SELECT action, details FROM activity_logs")
+    assert cur.fetchall() == [("Продан товар", "Air Max x2, Сумма: 200 руб.")]
+
+
+def test_replayed_totals_are_exact(conn, admin_id, make_product, journal, syncer):
+    # во float 1999.9 * 3 = 5999.700000000001: сумма считается в Decimal, как при продаже онлайн
+    shoes = make_product("Air Max", price=Decimal("1999.90"), stock=5)
+    record_sale(journal, DB_CONFIG["server"], admin_id, [(product_row(conn, shoes), 3)])
+
+    syncer.sync_once()
+
+    cur = conn.cursor()
+    cur.execute("SELECT unit_price, total_price FROM sales")
+    assert [tuple(Decimal(str(value)) for value in row) for row in cur.fetchall()] \
+        == [(Decimal("1999.9"), Decimal("5999.7"))]
+
+
+def test_sale_that_reached_the_server_is_not_replayed(conn, admin_id, make_product, journal, syncer):
+    # сервер закоммитил продажу, но ответ не дошёл: касса записала её в журнал с тем же ключом
+    shoes = make_product("Air Max", stock=5)
+    key = new_key()
+    sales.sell_cart(conn, admin_id, [(shoes, 1)], key=key)
+    record_sale(journal, DB_CONFIG["server"], admin_id, [(product_row(conn, shoes), 1)], key=key)
+
+    syncer.sync_once()
+
+    assert product_row(conn, shoes)[5] == 4
+    assert (syncer.applied, syncer.conflicts) == (1, 0)
+
+
+def test_bad_entry_does_not_block_the_rest(conn, admin_id, journal, syncer):
+    # испорченную запись отвергнет любая попытка: она уходит в конфликты, очередь идёт дальше
+    record_product(journal, DB_CONFIG["server"], admin_id, "Superstar", "Adidas", "42", "сто", 1)
+    record_product(journal, DB_CONFIG["server"], admin_id, "Air Max", "Nike", "42", 100, 1)
+
+    assert syncer.sync_once() == 2
+
+    assert (syncer.applied, syncer.conflicts) == (1, 1)
+    assert len(journal.conflicts(DB_CONFIG["server"])) == 1
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM products")
+    assert cur.fetchall() == [("Air Max",)]
@@ -0,0 +1,93 @@
+import asyncio
+import json
+from decimal import Decimal
+
+import pytest
+
+from activity_log import close_log_writers
+from db import DB_CONFIG
+from pos_service import SERVICE_CONFIG, PosService
+
+
+async def request(port, method, path, body=None, token=None, raw=None):
+    # (статус, заголовки, JSON-ответ, закрыл ли сервер соединение после ответа)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = raw if raw is not None else (json.dumps(body).encode() if body is not None else b"")
+    head = f"{method} {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n"
+    if token:
+        head += f"Authorization: Bearer {token}\r\n"
+    writer.write(head.encode() + b"\r\n" + data)
+    await writer.drain()
+
+    status_line, *lines = (await reader.readuntil(b"\r\n\r\n")).decode().strip().split("\r\n")
+    headers = {name.lower(): value for name, _, value in (line.partition(": ") for line in lines)}
+    payload = json.loads(await reader.readexactly(int(headers["content-length"])))
+    closed = False
+    if headers["connection"] == "close":
+        closed = await asyncio.wait_for(reader.read(), 5) == b""
+    writer.close()
+    await writer.wait_closed()
+    return int(status_line.split()[1]), headers, payload, closed
+
+
+@pytest.fixture
+def serve(pool):
+    # serve(сценарий): сервис на свободном порту, сценарий получает порт и токен admin
+    def serve(scenario):
+        service = PosService(DB_CONFIG["server"])
+
+        async def run():
+            server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                status, _, payload, _ = await request(port, "POST", "/auth",
+                                                      {"username": "admin", "password": "admin123"})
+                assert status == 200, payload
+                return await scenario(port, payload["token"])
+            finally:
+                server.close()
+                await server.wait_closed()
+        try:
+            return asyncio.run(run())
+        finally:
+            service.close()
+            close_log_writers()
+    return serve
+
+
+def test_sale_reduces_stock(serve, make_product):
+    shoes = make_product("Air Max", price=100, stock=5)
+
+    async def scenario(port, token):
+        sold = await request(port, "POST", "/sales",
+                             {"items": [{"product_id": shoes, "quantity": 2}], "customer": "Иванов"}, token)
+        left = await request(port, "GET", f"/products/{shoes}", token=token)
+        too_many = await request(port, "POST", "/sales", {"items": [{"product_id": shoes, "quantity": 9}]}, token)
+        return sold, left, too_many
+
+    sold, left, too_many = serve(scenario)
+
+    assert sold[0] == 201 and Decimal(str(sold[2]["total_price"])) == 200
+    assert sold[2]["items"][0]["product"]["stock"] == 3
+    assert left[0] == 200 and left[2]["stock"] == 3
+    assert too_many[0] == 409 and "Недостаточно товара" in too_many[2]["error"]
+
+
+def test_requests_need_a_token(serve):
+    async def scenario(port, token):
+        return await request(port, "GET", "/products/1")
+
+    status, _, _, _ = serve(scenario)
+    assert status == 401
+
+
+def test_oversized_body_closes_connection(serve, monkeypatch):
+    monkeypatch.setitem(SERVICE_CONFIG, "max_body", 100)
+
+    async def scenario(port, token):
+        return await request(port, "POST", "/products", token=token, raw=b"x" * 200)
+
+    status, headers, _, closed = serve(scenario)
+    # тело не прочитано: на том же соединении следующий запрос начался бы с его середины
+    assert status == 413
+    assert headers["connection"] == "close" and closed
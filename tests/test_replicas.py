@@ -0,0 +1,120 @@
+import os
+import time
+from contextlib import contextmanager
+
+import pytest
+
+import replicas
+from replicas import PRIMARY_LSN_SQL, ReplicaRouter, WritePool, parse_lsn
+
+# Проверка на двух настоящих экземплярах PostgreSQL (см. replicas.py), например:
+#   REPLICA_TEST_PRIMARY=localhost REPLICA_TEST_REPLICA=localhost:5433 python -m pytest tests/test_replicas.py
+PRIMARY = os.environ.get("REPLICA_TEST_PRIMARY")
+REPLICA = os.environ.get("REPLICA_TEST_REPLICA")
+
+
+class FakeServer:
+    # отвечает на запросы проверки так, как ответил бы сервер с заданными позициями WAL
+    def __init__(self, lsn, in_recovery=False, replay_age=None):
+        self.lsn = lsn
+        self.in_recovery = in_recovery
+        self.replay_age = replay_age
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.row = (self.lsn,) if sql == PRIMARY_LSN_SQL else (self.in_recovery, self.lsn, self.replay_age)
+
+    def fetchone(self):
+        return self.row
+
+    def rollback(self):
+        pass
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    servers = {}
+    monkeypatch.setattr(replicas, "get_pool", lambda host, **options: servers[host])
+    monkeypatch.setitem(replicas.REPLICA_CONFIG, "catch_up_grace", 0)
+    return servers
+
+
+def test_parse_lsn():
+    assert parse_lsn("0/0") == 0
+    assert parse_lsn("16/B374D848") == (0x16 << 32) | 0xB374D848
+    assert parse_lsn("1/0") > parse_lsn("0/FFFFFFFF")
+
+
+def test_caught_up_replica_of_idle_primary_is_healthy(servers):
+    # последняя транзакция была час назад, но реплика проиграла всё, что есть на основном
+    servers["primary"] = FakeServer("0/3000060")
+    servers["replica"] = FakeServer("0/3000060", in_recovery=True, replay_age=3600.0)
+    router = ReplicaRouter("primary", ["replica"], max_lag=5)
+    state, = router.check_all()
+    assert state.healthy and state.lag == 0
+    assert router.read_hosts()[0] == "replica"
+
+
+def test_replica_with_stopped_wal_receiver_is_not_used(servers):
+    # приёмник WAL отключён: на реплике receive_lsn = replay_lsn, но основной ушёл вперёд
+    servers["primary"] = FakeServer("0/5000000")
+    servers["replica"] = FakeServer("0/3000060", in_recovery=True, replay_age=600.0)
+    router = ReplicaRouter("primary", ["replica"], max_lag=5)
+    state, = router.check_all()
+    assert state.lag == 600.0
+    assert router.read_hosts() == ["primary"]
+
+
+def test_write_after_primary_sample_is_not_counted_as_replayed(servers):
+    # запись закоммичена после того, как сняли позицию основного, но до опроса реплики:
+    # реплика догнала снятую позицию, а этой записи у неё может и не быть
+    servers["primary"] = FakeServer("0/100")
+    servers["replica"] = FakeServer("0/100", in_recovery=True, replay_age=0.0)
+    router = ReplicaRouter("primary", ["replica"], max_lag=5)
+    state = router.replicas[0]
+
+    primary = router.primary_lsn()
+    time.sleep(0.01)
+    router.note_write("t")
+    servers["primary"].lsn = "0/200"
+    router.check(state, primary)
+
+    assert state.healthy and state.lag == 0
+    assert router.read_hosts("t") == ["primary"]
+
+
+def test_promoted_replica_is_not_used(servers):
+    servers["primary"] = FakeServer("0/3000060")
+    servers["replica"] = FakeServer("0/3000060", in_recovery=False)
+    router = ReplicaRouter("primary", ["replica"])
+    state, = router.check_all()
+    assert not state.healthy
+    assert router.read_hosts() == ["primary"]
+
+
+@pytest.mark.skipif(not (PRIMARY and REPLICA), reason="нужны REPLICA_TEST_PRIMARY и REPLICA_TEST_REPLICA")
+def test_live_replica_serves_reads_after_it_replays_a_write():
+    router = ReplicaRouter(PRIMARY, [REPLICA], max_lag=5, check_interval=1)
+    state, = router.check_all()
+    assert state.healthy, state.error
+    assert state.lag <= router.max_lag
+
+    with WritePool(router, session="test").connection() as conn:
+        cur = conn.cursor()
+        # запись в каталог попадает в WAL и не оставляет следов в таблицах магазина
+        cur.execute("CREATE TEMP TABLE replica_test_ping (id INTEGER)")
+        conn.commit()
+    # своя запись читается с основного, пока проверка не увидит её на реплике
+    assert router.read_hosts("test") == [PRIMARY]
+
+    deadline = time.monotonic() + 10
+    while router.read_hosts("test")[0] != REPLICA:
+        assert time.monotonic() < deadline, router.status()
+        time.sleep(0.2)
+        router.check_all()
@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+
+import db
+import rollups
+
+
+class FakeSnapshotServer:
+    # PostgreSQL глазами committed_high_id: MAX(id) со снимком, потом опросы «сколько ещё идёт»
+    def __init__(self, high_id, running):
+        self.high_id = high_id
+        self.running = list(running)   # ответы на опросы по очереди
+        self.polls = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        if "pg_current_snapshot" in sql:
+            self.row = (self.high_id, "10:12:10,11")
+        else:
+            self.polls += 1
+            self.row = (self.running.pop(0),)
+
+    def fetchone(self):
+        return self.row
+
+    def rollback(self):
+        pass
+
+
+def add_sale(conn, admin_id, product_id, sale_date, sale_id=None):
+    cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO sales (id, product_id, quantity, unit_price, total_price, sold_by, sale_date)
+           VALUES (?, ?, 1, 100, 100, ?, ?)""",
+        (sale_id, product_id, admin_id, sale_date)
+    )
+    conn.commit()
+
+
+def test_boundary_waits_for_transactions_from_the_snapshot(monkeypatch):
+    monkeypatch.setattr(db.time, "sleep", lambda seconds: None)
+    server = FakeSnapshotServer(high_id=41, running=[2, 1, 0])
+    # строки, закоммиченные за время ожидания с id выше 41, ждут следующей пачки
+    assert db.committed_high_id(server, "sales", settle_timeout=60) == 41
+    assert server.polls == 3
+
+
+def test_boundary_gives_up_on_a_long_transaction(monkeypatch):
+    monkeypatch.setattr(db.time, "sleep", lambda seconds: None)
+    with pytest.raises(RuntimeError, match="долгих транзакций"):
+        db.committed_high_id(FakeSnapshotServer(high_id=41, running=[1, 1]), "sales", settle_timeout=0)
+
+
+def test_out_of_order_commit_is_counted_once(conn, admin_id, make_product, monkeypatch):
+    shoes = make_product("Air Max")
+    add_sale(conn, admin_id, shoes, "2024-03-01 10:00:00")
+    add_sale(conn, admin_id, shoes, "2024-03-01 11:00:00")
+    # касса взяла id 3 и ещё не закоммитила, а перенос из офлайн-журнала уже записал
+    # продажу задним числом под id 4: по времени она «давняя», но граница — только 2
+    add_sale(conn, admin_id, shoes, "2024-02-01 09:00:00", sale_id=4)
+    real_boundary = rollups.committed_high_id
+    monkeypatch.setattr(rollups, "committed_high_id", lambda conn, table, timeout: 2)
+
+    assert rollups.refresh_rollups(conn) == 2
+
+    add_sale(conn, admin_id, shoes, "2024-03-01 12:00:00", sale_id=3)
+    monkeypatch.setattr(rollups, "committed_high_id", real_boundary)
+    assert rollups.refresh_rollups(conn) == 2
+    assert rollups.refresh_rollups(conn) == 0
+
+    totals = rollups.daily_totals(conn, date(2024, 2, 1), date(2024, 3, 31))
+    assert [(str(day), quantity, sales_count) for day, quantity, _, sales_count in totals] \
+        == [("2024-02-01", 1, 1), ("2024-03-01", 3, 3)]
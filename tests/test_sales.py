@@ -0,0 +1,53 @@
+import pytest
+
+import sales
+from offline_journal import new_key
+from store import StoreError
+
+
+def stock_of(conn, product_id):
+    cur = conn.cursor()
+    cur.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+    return cur.fetchone()[0]
+
+
+def sales_count(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM sales")
+    return cur.fetchone()[0]
+
+
+def test_cart_sells_every_line(conn, admin_id, make_product):
+    shoes = make_product("Air Max", price=100, stock=5)
+    boots = make_product("Timberland", brand="Timberland", price=250, stock=2)
+
+    sale = sales.sell_cart(conn, admin_id, [(shoes, 2), (boots, 1), (shoes, 1)], "Иванов")
+
+    assert [(line["product_id"], line["quantity"]) for line in sale["items"]] == [(shoes, 3), (boots, 1)]
+    assert sale["total_price"] == 550
+    assert stock_of(conn, shoes) == 2 and stock_of(conn, boots) == 1
+    assert sales_count(conn) == 2
+
+
+def test_shortage_sells_nothing(conn, admin_id, make_product):
+    shoes = make_product("Air Max", stock=5)
+    boots = make_product("Timberland", stock=1)
+
+    with pytest.raises(StoreError, match="Недостаточно товара «Timberland»"):
+        sales.sell_cart(conn, admin_id, [(shoes, 1), (boots, 2)])
+
+    assert stock_of(conn, shoes) == 5 and stock_of(conn, boots) == 1
+    assert sales_count(conn) == 0
+
+
+def test_repeated_key_does_not_sell_twice(conn, admin_id, make_product):
+    # ответ сервера потерялся, касса повторяет продажу с тем же ключом
+    shoes = make_product("Air Max", stock=5)
+    key = new_key()
+    sales.sell_cart(conn, admin_id, [(shoes, 1)], key=key)
+
+    with pytest.raises(StoreError, match=sales.DUPLICATE_SALE):
+        sales.sell_cart(conn, admin_id, [(shoes, 1)], key=key)
+
+    assert stock_of(conn, shoes) == 4
+    assert sales_count(conn) == 1
@@ -0,0 +1,45 @@
+from sales_backfill import backfill_batch, restart, run_backfill
+
+
+def legacy_sale(conn, admin_id, name, brand, size):
+    # продажа в старом виде — с названием вместо ссылки на товар
+    cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO sales (product_name, brand, size, quantity, unit_price, total_price, sold_by)
+           VALUES (?, ?, ?, 1, 100, 100, ?) RETURNING id""",
+        (name, brand, size, admin_id)
+    )
+    sale_id = cur.fetchone()[0]
+    conn.commit()
+    return sale_id
+
+
+def sale_row(conn, sale_id):
+    cur = conn.cursor()
+    cur.execute("SELECT product_id, label_id, product_name FROM sales WHERE id = ?", (sale_id,))
+    return cur.fetchone()
+
+
+def test_legacy_sales_point_to_products_or_labels(pool, conn, admin_id, make_product):
+    shoes = make_product("Air Max", brand="Nike", size="")
+    known = legacy_sale(conn, admin_id, "Air Max", "Nike", None)
+    gone = legacy_sale(conn, admin_id, "Старая модель", None, "40")
+    again = legacy_sale(conn, admin_id, "Старая модель", "", "40")
+
+    summary = run_backfill(pool, batch_size=2, pause=0)
+
+    assert summary == {"scanned": 3, "encoded": 3, "last_id": again}
+    assert sale_row(conn, known) == (shoes, None, None)
+    product_id, label_id, name = sale_row(conn, gone)
+    assert product_id is None and label_id is not None and name is None
+    assert sale_row(conn, again) == (None, label_id, None)
+
+
+def test_rerun_rewrites_nothing(pool, conn, admin_id, make_product):
+    make_product("Air Max")
+    legacy_sale(conn, admin_id, "Air Max", "Nike", "42")
+    run_backfill(pool, pause=0)
+
+    assert backfill_batch(conn, {})[:2] == (0, 0)
+    restart(conn)
+    assert backfill_batch(conn, {})[:2] == (1, 0)
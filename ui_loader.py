@@ -0,0 +1,61 @@
+import importlib
+import os
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+
+# Form.ui -> ui_form.py (класс Ui_MainWindow), Admin.ui -> ui_admin.py (Ui_admin_window).
+# Модули собирает build_ui.py через pyside6-uic; пока их нет или .ui новее,
+# работает QUiLoader, а XML читается с диска один раз.
+UI_MODULES = {
+    "Form.ui": ("ui_form", "Ui_MainWindow"),
+    "Admin.ui": ("ui_admin", "Ui_admin_window"),
+}
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_xml_cache = {}
+_loader = None
+
+
+def _compiled_class(ui_name):
+    module_name, class_name = UI_MODULES.get(ui_name, (None, None))
+    if not module_name:
+        return None
+    ui_path = os.path.join(_BASE_DIR, ui_name)
+    py_path = os.path.join(_BASE_DIR, f"{module_name}.py")
+    if not os.path.exists(py_path):
+        return None
+    if os.path.exists(ui_path) and os.path.getmtime(ui_path) > os.path.getmtime(py_path):
+        return None
+    return getattr(importlib.import_module(module_name), class_name, None)
+
+
+def _load_with_uiloader(ui_name):
+    global _loader
+    from PySide6.QtUiTools import QUiLoader
+
+    if ui_name not in _xml_cache:
+        with open(os.path.join(_BASE_DIR, ui_name), "rb") as f:
+            _xml_cache[ui_name] = QByteArray(f.read())
+    if _loader is None:
+        _loader = QUiLoader()
+
+    buffer = QBuffer(_xml_cache[ui_name])
+    buffer.open(QIODevice.ReadOnly)
+    widget = _loader.load(buffer)
+    buffer.close()
+    return widget
+
+
+def load_ui(ui_name, base_class):
+    # base_class — класс корневого виджета формы (QMainWindow, QWidget);
+    # дочерние виджеты в обоих режимах доступны как атрибуты окна
+    compiled = _compiled_class(ui_name)
+    if compiled is None:
+        return _load_with_uiloader(ui_name)
+
+    widget = base_class()
+    ui = compiled()
+    ui.setupUi(widget)
+    for name, child in vars(ui).items():
+        setattr(widget, name, child)
+    return widget